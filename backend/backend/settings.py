@@ -84,9 +84,52 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "mypassword"),
         "HOST": os.environ.get("POSTGRES_HOST", "127.0.0.1"),
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # keep connections open between requests instead of connecting for every request
+        "CONN_MAX_AGE": int(os.environ.get("CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# A local SQLite database instead of PostgreSQL, e.g. to run the benchmarks
+if os.environ.get("DATABASE_ENGINE") == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("SQLITE_PATH", str(BASE_DIR / "db.sqlite3")),
+    }
+
+# Number of threads, each holding one persistent connection, the async views
+# run their database work on
+DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", "10"))
+
+
+# Cache
+# Back test results are cached in process, or in a Redis compatible server
+# shared by all the workers when BACKTEST_CACHE_URL is set (needs the redis package)
+
+BACKTEST_CACHE_URL = os.environ.get("BACKTEST_CACHE_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "backtest": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": BACKTEST_CACHE_URL,
+    } if BACKTEST_CACHE_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "backtest",
+        "OPTIONS": {"MAX_ENTRIES": 1024},
+    },
+    # the benchmarks cache their back tests apart, clearing it never touches the shared results
+    "benchmark": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    },
+}
+
+# Seconds a back test result is kept, results of older data versions are never served anyway
+BACKTEST_CACHE_TIMEOUT = int(os.environ.get("BACKTEST_CACHE_TIMEOUT", 24 * 60 * 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -128,3 +171,71 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Price series cache
+# Upper bound for the memory used by the in-process cache of price arrays
+
+PRICE_CACHE_MEMORY_BUDGET = int(os.environ.get('PRICE_CACHE_MEMORY_BUDGET', 256 * 1024 * 1024))
+
+# Where the price history is read from, 'database' or 'snapshot' to serve the
+# exported columnar snapshots without a database connection
+PRICE_SOURCE = os.environ.get('PRICE_SOURCE', 'database')
+
+
+# Market data
+# Symbols kept up to date by the ingest and the Alpha Vantage request quota
+
+STOCK_SYMBOLS = [symbol.strip().upper() for symbol in os.environ.get('STOCK_SYMBOLS', 'AAPL').split(',') if symbol.strip()]
+
+ALPHA_VANTAGE_REQUESTS_PER_MINUTE = int(os.environ.get('ALPHA_VANTAGE_REQUESTS_PER_MINUTE', 5))
+
+ALPHA_VANTAGE_MAX_WORKERS = int(os.environ.get('ALPHA_VANTAGE_MAX_WORKERS', 4))
+
+# The daily quota of the plan (0 when it has none), how many calls may start at
+# once, and how long in seconds a call may wait for the daily quota before it
+# fails instead
+ALPHA_VANTAGE_REQUESTS_PER_DAY = int(os.environ.get('ALPHA_VANTAGE_REQUESTS_PER_DAY', 0))
+
+ALPHA_VANTAGE_BURST = int(os.environ.get('ALPHA_VANTAGE_BURST', 1))
+
+ALPHA_VANTAGE_MAX_WAIT = float(os.environ.get('ALPHA_VANTAGE_MAX_WAIT', 60))
+
+# Timeouts in seconds, and the retries of failed or throttled calls, waiting
+# ALPHA_VANTAGE_BACKOFF seconds doubled at every attempt, up to ALPHA_VANTAGE_BACKOFF_MAX
+ALPHA_VANTAGE_CONNECT_TIMEOUT = float(os.environ.get('ALPHA_VANTAGE_CONNECT_TIMEOUT', 5))
+
+ALPHA_VANTAGE_READ_TIMEOUT = float(os.environ.get('ALPHA_VANTAGE_READ_TIMEOUT', 30))
+
+ALPHA_VANTAGE_RETRIES = int(os.environ.get('ALPHA_VANTAGE_RETRIES', 3))
+
+ALPHA_VANTAGE_BACKOFF = float(os.environ.get('ALPHA_VANTAGE_BACKOFF', 2))
+
+ALPHA_VANTAGE_BACKOFF_MAX = float(os.environ.get('ALPHA_VANTAGE_BACKOFF_MAX', 60))
+
+# How long in seconds a response cached on disk is used without asking again
+ALPHA_VANTAGE_CACHE_SECONDS = int(os.environ.get('ALPHA_VANTAGE_CACHE_SECONDS', 3600))
+
+
+# Training
+# Number of processes the per symbol models are trained on
+
+TRAINING_MAX_WORKERS = int(os.environ.get('TRAINING_MAX_WORKERS', os.cpu_count() or 1))
+
+
+# Parameter sweep
+# Number of processes a sweep is scored on, only one sweep of a web process uses them at a time
+
+SWEEP_MAX_WORKERS = int(os.environ.get('SWEEP_MAX_WORKERS', min(4, os.cpu_count() or 1)))
+
+
+# Jobs
+# When the job worker (`python manage.py run_jobs`) ingests the latest data and
+# retrains the models, as a crontab expression in JOB_TIMEZONE, and how late
+# in seconds a missed run may still start
+
+JOB_SCHEDULE = os.environ.get('JOB_SCHEDULE', '0 0 * * *')
+
+JOB_TIMEZONE = os.environ.get('JOB_TIMEZONE', TIME_ZONE)
+
+JOB_MISFIRE_GRACE_TIME = int(os.environ.get('JOB_MISFIRE_GRACE_TIME', 6 * 60 * 60))
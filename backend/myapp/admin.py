@@ -1,3 +1,10 @@
 from django.contrib import admin
+from myapp.models import JobRun
 
 # Register your models here.
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'started_at', 'seconds')
+    list_filter = ('name', 'status')
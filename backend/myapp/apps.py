@@ -1,14 +1,39 @@
 from django.apps import AppConfig
+import os
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
     linearRegressionModelFilepath="myapp/linear_regression_model.pkl"
-    
-    def ready(self):
-        from myapp import background_task
-        background_task.start()
+    symbolModelDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbol_models")
+    dataVersionDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_versions")
+    regressionStatisticsDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "regression_statistics")
+    snapshotDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+    reportCacheDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+    jobLockDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "locks")
+    marketDataCacheDirpath=os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_data_cache")
 
 def get_linear_regression_model_filepath():
-    return MyappConfig.linearRegressionModelFilepath
\ No newline at end of file
+    return MyappConfig.linearRegressionModelFilepath
+
+def get_data_version_dirpath():
+    return MyappConfig.dataVersionDirpath
+
+def get_report_cache_dirpath():
+    return MyappConfig.reportCacheDirpath
+
+def get_regression_statistics_dirpath():
+    return MyappConfig.regressionStatisticsDirpath
+
+def get_symbol_model_dirpath():
+    return MyappConfig.symbolModelDirpath
+
+def get_snapshot_dirpath():
+    return MyappConfig.snapshotDirpath
+
+def get_job_lock_dirpath():
+    return MyappConfig.jobLockDirpath
+
+def get_market_data_cache_dirpath():
+    return MyappConfig.marketDataCacheDirpath
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from functools import partial
+import asyncio
+
+# The async views run their database work on this fixed set of threads. Every
+# thread keeps its own persistent connection (CONN_MAX_AGE), so together they
+# form a pool of DATABASE_POOL_SIZE connections shared by all the requests of
+# a worker, and no request pays for opening a connection.
+database_executor = ThreadPoolExecutor(max_workers=settings.DATABASE_POOL_SIZE, thread_name_prefix='database')
+
+
+def _call(func, args, kwargs):
+    # drop the connection of this thread when it is broken or older than
+    # CONN_MAX_AGE, like django does at the start of every synchronous request
+    close_old_connections()
+    return func(*args, **kwargs)
+
+
+async def run_with_connection(func, *args, **kwargs):
+    """
+    Runs the synchronous func on one of the pooled database threads and returns its result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(database_executor, partial(_call, func, args, kwargs))
+
+
+async def iterate_with_connection(iterator, batch_size: int = 256):
+    """
+    Consumes a synchronous iterator on the pooled database threads, a batch
+    at a time, as an async iterator
+    """
+    def next_batch():
+        batch = []
+        for item in iterator:
+            batch.append(item)
+            if len(batch) == batch_size:
+                break
+        return batch
+
+    while True:
+        batch = await run_with_connection(next_batch)
+        if not batch:
+            return
+        for item in batch:
+            yield item
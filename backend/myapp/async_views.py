@@ -0,0 +1,64 @@
+from django.http import HttpResponseBadRequest, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
+from myapp.async_db import iterate_with_connection, run_with_connection
+from myapp.backtest_cache import get_backtest_result
+from myapp.backtest_engine import iter_backtest_events
+from myapp.price_cache import get_price_series_with_warmup
+from myapp.views import (
+    get_prediction_response_data, get_report_response, iter_ndjson, parse_back_test_params, parse_predict_params,
+    parse_symbol,
+)
+from rest_framework.utils.encoders import JSONEncoder
+
+# Async variants of the read endpoints, served under ASGI. They validate the
+# request like their synchronous counterparts and run the database work on the
+# pooled database threads, so a single worker keeps serving other requests
+# while one waits for the database.
+
+
+async def back_test(request):
+    """
+    This function is used to back test the trading strategy
+    """
+    params = parse_back_test_params(request.GET)
+    if params is None:
+        return HttpResponseBadRequest()
+    symbol, investing_amount, buy_period, sell_period, start, end, strategy, stream = params
+
+    if stream == 'ndjson':
+        series, first_row = await run_with_connection(get_price_series_with_warmup, symbol, start, end, max(buy_period, sell_period))
+        events = iter_backtest_events(series, investing_amount, buy_period, sell_period, first_row, strategy)
+        return StreamingHttpResponse(iterate_with_connection(iter_ndjson(events)), content_type='application/x-ndjson')
+
+    response_data = await run_with_connection(get_backtest_result, symbol, investing_amount, buy_period, sell_period, start, end, strategy)
+
+    return JsonResponse(response_data, encoder=JSONEncoder)
+
+
+async def predict_data(request):
+    """
+    This function is used to predict the stock data for the next trading days
+    """
+    params = parse_predict_params(request.GET)
+    if params is None:
+        return HttpResponseBadRequest()
+
+    prediction_response = await run_with_connection(get_prediction_response_data, *params)
+    if prediction_response is None:
+        return HttpResponseNotFound()
+
+    return JsonResponse(prediction_response)
+
+
+async def get_report_for_prediction(request):
+    """
+    This function is used to get the report for the prediction
+    """
+    symbol = parse_symbol(request.GET)
+    if symbol is None:
+        return HttpResponseBadRequest()
+
+    response = await run_with_connection(get_report_response, symbol, request.headers.get('If-None-Match'))
+    if response is None:
+        return HttpResponseNotFound()
+
+    return response
@@ -1,13 +1,159 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.utils import timezone
+from myapp.apps import get_job_lock_dirpath
+from myapp.models import JobRun
 from myapp.tasks import update_latest_stock_data, train_linear_regression_model
-from datetime import datetime
+from time import perf_counter
+import fcntl
 import logging
+import os
+import re
+import zlib
+
+# The jobs run in a dedicated worker process (`python manage.py run_jobs`),
+# never in the web workers. Every run takes a lock named after its job, so
+# when several workers are started only one of them runs a given job, and
+# its outcome and duration are recorded as a JobRun.
+
+JOBS = {
+    'ingest': update_latest_stock_data,
+    'train': train_linear_regression_model,
+}
+
+
+@contextmanager
+def job_lock(name: str):
+    """
+    Tries to take the lock of the job without waiting and yields whether it was taken
+    """
+    if connection.vendor == 'postgresql':
+        # a session advisory lock on a connection of its own, which the training
+        # pool does not close, and which is released if the worker dies
+        lock_connection = connections.create_connection('default')
+        try:
+            with lock_connection.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [zlib.crc32(f"myapp.jobs.{name}".encode())])
+                yield cursor.fetchone()[0]
+        finally:
+            lock_connection.close()
+        return
+
+    # other databases are only used on a single host, where a file lock does
+    os.makedirs(get_job_lock_dirpath(), exist_ok=True)
+    with open(os.path.join(get_job_lock_dirpath(), f"{name}.lock"), 'w') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def run_job(name: str) -> JobRun:
+    """
+    Runs the job unless another worker is running it and records the run
+    """
+    # the worker lives for days, do not reuse a connection the database dropped
+    close_old_connections()
+    started_at = timezone.now()
+    started = perf_counter()
+    with job_lock(name) as acquired:
+        if not acquired:
+            logging.info(f"Job {name} is already running in another worker, skipping")
+            return JobRun.objects.create(name=name, status=JobRun.SKIPPED, started_at=started_at, seconds=0.0)
+
+        try:
+            details = JOBS[name]()
+            status, error = JobRun.SUCCEEDED, ''
+        except Exception as e:
+            logging.exception(f"Job {name} failed with error: {e}")
+            details, status, error = None, JobRun.FAILED, str(e)
+
+    seconds = perf_counter() - started
+    logging.info(f"Job {name} {status} in {seconds:.2f}s")
+    return JobRun.objects.create(
+        name=name,
+        status=status,
+        started_at=started_at,
+        seconds=seconds,
+        error=error,
+        details=details if isinstance(details, dict) else None,
+    )
+
+
+def run_daily_jobs():
+    """
+    Ingests the latest stock data and then retrains the models on it
+    """
+    ingest = run_job('ingest')
+    if ingest.status != JobRun.SUCCEEDED:
+        logging.info(f"Not retraining the models, the ingest {ingest.status}")
+        return [ingest]
+    return [ingest, run_job('train')]
+
+
+DAY_NAMES = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def day_of_week_names(field: str) -> str:
+    """
+    Converts the numeric parts of a crontab day of week field, with sunday as
+    0 or 7, to the explicit list of the days they select by name. Steps are
+    applied to the crontab numbers, so '*/2' stays sunday, tuesday, thursday
+    and saturday. Parts already given by name are kept.
+    """
+    names = []
+    for part in field.split(','):
+        base, _, step = part.partition('/')
+        if base == '*' and not step or not re.fullmatch(r'\*|\d+(-\d+)?', base):
+            names.append(part)
+            continue
+
+        if base == '*':
+            first, last = 0, 6
+        else:
+            first, _, last = base.partition('-')
+            first = int(first)
+            # a single day with a step runs up to the end of the week, like in crontab
+            last = int(last) if last else (6 if step else first)
+        if not 0 <= first <= last <= 7 or step and int(step) < 1:
+            raise ValueError(f"Invalid day of week '{part}'")
+        names.extend(DAY_NAMES[number] for number in range(first, last + 1, int(step or 1)))
+    return ','.join(dict.fromkeys(names))
+
+
+def cron_trigger(expression: str, timezone: str) -> CronTrigger:
+    """
+    Builds the trigger of a standard crontab expression. apscheduler numbers
+    the days of the week from monday, so the numbers are given as names.
+    """
+    minute, hour, day, month, day_of_week = expression.split()
+    day_of_week = day_of_week_names(day_of_week)
+    return CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week, timezone=timezone)
+
+
+def create_scheduler() -> BlockingScheduler:
+    scheduler = BlockingScheduler(timezone=settings.JOB_TIMEZONE)
+    scheduler.add_job(
+        run_daily_jobs,
+        cron_trigger(settings.JOB_SCHEDULE, settings.JOB_TIMEZONE),
+        id='daily',
+        # a run missed while the worker was down is run once when it comes back
+        coalesce=True,
+        max_instances=1,
+        misfire_grace_time=settings.JOB_MISFIRE_GRACE_TIME,
+    )
+    return scheduler
+
 
 def start():
-    scheduler = BackgroundScheduler()
-    date_string = '2024-10-19 09:56:00'
-    run_date = datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
-    scheduler.add_job(update_latest_stock_data, 'cron', hour=0, minute=0) # run every day at midnight
-    scheduler.add_job(train_linear_regression_model, 'date', run_date=run_date) # run every day at 1 am
+    scheduler = create_scheduler()
+    logging.info(f"Scheduler started, running the daily jobs at '{settings.JOB_SCHEDULE}' ({settings.JOB_TIMEZONE})")
     scheduler.start()
-    logging.info("Scheduler started")
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import caches
+from myapp.backtest_engine import run_backtest
+from myapp.data_version import get_data_version
+from myapp.price_cache import get_price_series_with_warmup
+from myapp.strategies import DEFAULT_STRATEGY
+import hashlib
+import json
+
+# Results of the back tests are cached by their parameters and the data
+# version of their symbol. An ingest bumps the data version, so a cached
+# result is never served once new rows were written, and repeated queries
+# are answered from the cache without loading the series or running the engine.
+# The hit and miss counters live in the cache too, so with a shared backend
+# (BACKTEST_CACHE_URL) they count the requests of every worker.
+
+HITS_KEY = 'backtest:hits'
+MISSES_KEY = 'backtest:misses'
+
+# the cache alias of the results, the benchmarks point it to a cache of their own
+CACHE_ALIAS = 'backtest'
+
+
+def get_backtest_cache():
+    return caches[CACHE_ALIAS]
+
+
+def get_backtest_cache_key(symbol: str, data_version: int, params: dict) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"backtest:{symbol}:{data_version}:{digest}"
+
+
+def count(key: str):
+    cache = get_backtest_cache()
+    # add is a no-op when the counter exists, incr is atomic on shared backends
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter was evicted in between
+        cache.set(key, 1, timeout=None)
+
+
+def get_backtest_result(symbol: str, investing_amount: int, buy_period: int, sell_period: int, start=None, end=None, strategy: str = DEFAULT_STRATEGY) -> dict:
+    """
+    Returns the result of the back test of the strategy between start and end,
+    from the cache when the same back test already ran on the current data of
+    the symbol
+    """
+    cache = get_backtest_cache()
+    params = {
+        'investing_amount': investing_amount,
+        'buy_period': buy_period,
+        'sell_period': sell_period,
+        'start': start,
+        'end': end,
+        'strategy': strategy,
+    }
+    key = get_backtest_cache_key(symbol, get_data_version(symbol), params)
+
+    result = cache.get(key)
+    if result is not None:
+        count(HITS_KEY)
+        return result
+    count(MISSES_KEY)
+
+    # the indicators at start need the rows of the longest period before it
+    series, first_row = get_price_series_with_warmup(symbol, start, end, max(buy_period, sell_period))
+    result = run_backtest(series, investing_amount, buy_period, sell_period, first_row, strategy)
+    cache.set(key, result, timeout=settings.BACKTEST_CACHE_TIMEOUT)
+    return result
+
+
+def get_backtest_cache_stats() -> dict:
+    cache = get_backtest_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {
+        'backend': settings.CACHES[CACHE_ALIAS]['BACKEND'],
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
@@ -0,0 +1,171 @@
+from decimal import Decimal
+from myapp.indicators import Indicators
+from myapp.price_series import PriceSeries
+from myapp.strategies import DEFAULT_STRATEGY, STRATEGIES
+import numpy as np
+
+# prices are stored with four decimal places, so the engine works on integer
+# ticks of 1/10000 to reproduce the exact Decimal arithmetic of the database
+PRICE_SCALE = 10000
+
+
+def to_ticks(prices: np.ndarray) -> np.ndarray:
+    return np.rint(prices * PRICE_SCALE).astype(np.int64)
+
+
+def ticks_to_decimal(ticks: int) -> Decimal:
+    return Decimal(int(ticks)).scaleb(-4)
+
+
+def trade_rows(buy_signal, sell_signal):
+    """
+    Walks the signals and returns the rows at which the strategy buys and sells.
+
+    The jumps to the next buy and sell signal are precomputed for every row, so
+    the loop only visits the transitions. The last sell row is -1 when the
+    position is still open at the end of the series.
+    """
+    length = len(buy_signal)
+    rows = np.arange(length)
+    buy_rows = np.flatnonzero(buy_signal)
+    sell_rows = np.flatnonzero(sell_signal)
+    # next_buy[i] is the first buy signal at or after row i, next_sell[i] the first sell signal after row i
+    next_buy = np.append(buy_rows, length)[np.searchsorted(buy_rows, rows)].tolist()
+    next_sell = np.append(sell_rows, length)[np.searchsorted(sell_rows, rows, side='right')].tolist()
+
+    bought = []
+    sold = []
+    position = 0
+    while position < length:
+        buy_row = next_buy[position]
+        if buy_row == length:
+            break
+        bought.append(buy_row)
+
+        sell_row = next_sell[buy_row]
+        if sell_row == length:
+            sold.append(-1)
+            break
+        sold.append(sell_row)
+        position = sell_row + 1
+
+    return np.array(bought, dtype=np.int64), np.array(sold, dtype=np.int64)
+
+
+def iter_trades(open_ticks, close_ticks, buy_signal, sell_signal, investing_amount: int):
+    """
+    Runs the buy/sell state machine over the trade rows and yields every trade
+    as (side, row, stocks, price, cash), with the price and the cash left after
+    the trade in ticks
+    """
+    bought, sold = trade_rows(buy_signal, sell_signal)
+    last_row = len(open_ticks) - 1
+    # an open position is sold at the last close price
+    sold_or_last = np.where(sold < 0, last_row, sold)
+    buy_prices = open_ticks[bought].tolist()
+    sell_prices = close_ticks[sold_or_last].tolist()
+
+    cash = int(investing_amount) * PRICE_SCALE
+    for buy_row, sell_row, open_price, close_price in zip(bought.tolist(), sold.tolist(), buy_prices, sell_prices):
+        # only whole dollars are reinvested, the cents stay aside
+        cash = cash // PRICE_SCALE * PRICE_SCALE
+        stocks_held = cash // open_price
+        cash = cash % open_price
+        yield 'buy', buy_row, stocks_held, open_price, cash
+
+        # a position that is still open at the end is only closed if it holds stocks
+        if sell_row < 0:
+            if stocks_held == 0:
+                break
+            sell_row = last_row
+
+        # the proceeds of a sale are truncated to whole dollars
+        cash += stocks_held * close_price // PRICE_SCALE * PRICE_SCALE
+        yield 'sell', sell_row, stocks_held, close_price, cash
+
+
+def format_event(series: PriceSeries, side: str, row: int, stocks: int, price: int) -> str:
+    action = 'Bought' if side == 'buy' else 'Sold'
+    return f"{action} {stocks} stocks on {series.datetime_at(row)} for {ticks_to_decimal(price)}"
+
+
+def simulate(series: PriceSeries, open_ticks, close_ticks, buy_signal, sell_signal, investing_amount: int, record_events=True):
+    """
+    Runs the buy/sell state machine over the trade rows.
+
+    Returns the remaining cash in ticks, the number of trades and the list of events.
+    """
+    cash = int(investing_amount) * PRICE_SCALE
+    trades = 0
+    events = []
+    for side, row, stocks, price, cash in iter_trades(open_ticks, close_ticks, buy_signal, sell_signal, investing_amount):
+        trades += 1
+        if record_events:
+            events.append(format_event(series, side, row, stocks, price))
+
+    return cash, trades, events
+
+
+def get_indicators(series: PriceSeries) -> Indicators:
+    return Indicators(to_ticks(series.open_price), to_ticks(series.high_price), to_ticks(series.low_price), to_ticks(series.close_price))
+
+
+def range_signals(indicators: Indicators, buy_period: int, sell_period: int, first_row: int = 0, strategy: str = DEFAULT_STRATEGY):
+    """
+    Computes the signals of every row with the strategy, but the strategy only
+    starts buying at first_row. The rows before it only warm up the indicators.
+    """
+    buy_signal, sell_signal = STRATEGIES[strategy](indicators, buy_period, sell_period)
+    buy_signal = np.array(buy_signal, dtype=bool)
+    buy_signal[:first_row] = False
+    return buy_signal, sell_signal
+
+
+def run_backtest(series: PriceSeries, investing_amount: int, buy_period: int, sell_period: int, first_row: int = 0, strategy: str = DEFAULT_STRATEGY):
+    """
+    Back tests the strategy, the moving average one by default, on the given
+    price series from first_row onwards and returns the profit and the list of events
+    """
+    if investing_amount == 0 or len(series) <= first_row:
+        return {'profit': 0, 'events': []}
+
+    indicators = get_indicators(series)
+    buy_signal, sell_signal = range_signals(indicators, buy_period, sell_period, first_row, strategy)
+    cash, trades, events = simulate(series, indicators.open_ticks, indicators.close_ticks, buy_signal, sell_signal, investing_amount)
+
+    if trades == 0:
+        return {'profit': 0, 'events': []}
+
+    return {
+        'profit': ticks_to_decimal(cash) - int(investing_amount),
+        'events': events,
+    }
+
+
+def iter_backtest_events(series: PriceSeries, investing_amount: int, buy_period: int, sell_period: int, first_row: int = 0, strategy: str = DEFAULT_STRATEGY):
+    """
+    Back tests the strategy like run_backtest, but yields every trade as a
+    structured event while the engine produces it and finishes with a summary
+    event holding the profit
+    """
+    trades = 0
+    cash = int(investing_amount) * PRICE_SCALE
+    if investing_amount != 0 and len(series) > first_row:
+        indicators = get_indicators(series)
+        buy_signal, sell_signal = range_signals(indicators, buy_period, sell_period, first_row, strategy)
+        for side, row, stocks, price, cash in iter_trades(indicators.open_ticks, indicators.close_ticks, buy_signal, sell_signal, investing_amount):
+            trades += 1
+            yield {
+                'type': side,
+                'date': series.datetime_at(row).isoformat(),
+                'qty': stocks,
+                'price': price / PRICE_SCALE,
+                'cash': cash / PRICE_SCALE,
+            }
+
+    profit = ticks_to_decimal(cash) - int(investing_amount) if trades > 0 else 0
+    yield {
+        'type': 'summary',
+        'trades': trades,
+        'profit': float(profit),
+    }
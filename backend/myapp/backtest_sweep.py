@@ -0,0 +1,109 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from itertools import product
+from myapp.backtest_engine import simulate, ticks_to_decimal, to_ticks
+from myapp.indicators import Indicators
+from myapp.price_series import PriceSeries
+from myapp.strategies import DEFAULT_STRATEGY, STRATEGIES
+import logging
+import math
+import threading
+
+# grids smaller than this are scored in the calling process, the pool start up
+# costs more than it saves for them
+PARALLEL_THRESHOLD = 64
+
+# held by the sweep scoring on a pool, the sweeps started meanwhile are scored
+# in their calling process so concurrent requests never multiply the workers
+_pool_slot = threading.Lock()
+
+# the indicators and the strategy shared with every worker of the pool, set once by the initializer
+_worker_state = {}
+
+
+def _init_worker(open_ticks, high_ticks, low_ticks, close_ticks, strategy):
+    # every worker keeps its own indicators, so an average is computed once per period and worker
+    _worker_state['indicators'] = Indicators(open_ticks, high_ticks, low_ticks, close_ticks)
+    _worker_state['strategy'] = STRATEGIES[strategy]
+
+
+def _score_chunk(chunk):
+    """
+    Scores a chunk of (buy_period, sell_period) pairs for every investing amount
+    with the indicators and the strategy of the worker
+    """
+    pairs, investing_amounts = chunk
+    return _score(pairs, investing_amounts, _worker_state['indicators'], _worker_state['strategy'])
+
+
+def _score(pairs, investing_amounts, indicators: Indicators, strategy):
+    scores = []
+    for buy_period, sell_period in pairs:
+        buy_signal, sell_signal = strategy(indicators, buy_period, sell_period)
+        for investing_amount in investing_amounts:
+            if investing_amount == 0:
+                scores.append((investing_amount, buy_period, sell_period, 0, 0))
+                continue
+            cash, trades, _ = simulate(None, indicators.open_ticks, indicators.close_ticks, buy_signal, sell_signal, investing_amount, record_events=False)
+            scores.append((investing_amount, buy_period, sell_period, cash, trades))
+    return scores
+
+
+def _split(pairs, chunks: int):
+    size = math.ceil(len(pairs) / chunks)
+    return [pairs[i:i + size] for i in range(0, len(pairs), size)]
+
+
+def run_parameter_sweep(series: PriceSeries, investing_amounts, buy_periods, sell_periods, max_workers=None, strategy: str = DEFAULT_STRATEGY):
+    """
+    Back tests the strategy, the moving average one by default, with every
+    combination of investing amount, buy period and sell period on the same
+    price series and returns the results ranked by profit.
+
+    The series is converted to ticks once, and the combinations are spread
+    across a process pool of at most SWEEP_MAX_WORKERS processes, unless
+    another sweep of the process holds the pool already.
+    """
+    investing_amounts = sorted(set(int(amount) for amount in investing_amounts))
+    pairs = list(product(sorted(set(buy_periods)), sorted(set(sell_periods))))
+    if not pairs or not investing_amounts:
+        return []
+
+    if len(series) == 0:
+        scores = [(amount, buy, sell, 0, 0) for buy, sell in pairs for amount in investing_amounts]
+    else:
+        ticks = (to_ticks(series.open_price), to_ticks(series.high_price), to_ticks(series.low_price), to_ticks(series.close_price))
+
+        combinations = len(pairs) * len(investing_amounts)
+        workers = max_workers or settings.SWEEP_MAX_WORKERS
+        if workers == 1 or combinations < PARALLEL_THRESHOLD or not _pool_slot.acquire(blocking=False):
+            # indicators of its own, another thread of the process may be sweeping too
+            scores = _score(pairs, investing_amounts, Indicators(*ticks), STRATEGIES[strategy])
+        else:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(*ticks, strategy)) as executor:
+                    # a few chunks per worker keeps the pool busy when chunks take uneven time
+                    chunks = _split(pairs, workers * 4)
+                    scores = []
+                    for chunk_scores in executor.map(_score_chunk, [(chunk, investing_amounts) for chunk in chunks]):
+                        scores.extend(chunk_scores)
+            finally:
+                _pool_slot.release()
+
+        logging.info(f"Scored {combinations} backtest combinations over {len(series)} rows")
+
+    results = []
+    for investing_amount, buy_period, sell_period, cash, trades in scores:
+        profit = ticks_to_decimal(cash) - investing_amount if trades > 0 else 0
+        results.append({
+            'investing_amount': investing_amount,
+            'buy_period': buy_period,
+            'sell_period': sell_period,
+            'profit': profit,
+            'trades': trades,
+        })
+
+    results.sort(key=lambda result: result['profit'], reverse=True)
+    for rank, result in enumerate(results, start=1):
+        result['rank'] = rank
+    return results
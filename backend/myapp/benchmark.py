@@ -0,0 +1,328 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from django.db import connection
+from myapp import backtest_cache, views
+from myapp.apps import MyappConfig, get_report_cache_dirpath
+from myapp.backtest_engine import run_backtest
+from myapp.forecasting import DEFAULT_HORIZON, forecast, forecast_cache
+from myapp.ingest import ingest_stock_data
+from myapp.models import StockData
+from myapp.price_cache import get_latest_price_series, get_price_series, price_cache
+from myapp.reports import PREDICTION_DAYS, render_prediction_report, report_cache
+from myapp.tasks import train_linear_regression_model, update_latest_stock_data
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from time import perf_counter
+import django
+import json
+import logging
+import numpy as np
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+
+# The benchmarks run every hot path of the API end to end and stage by stage
+# on synthetic histories written to the configured database under symbols of
+# their own, with the models, statistics, reports and data versions kept in a
+# temporary directory, so they can run next to real data.
+
+SYMBOL_PREFIX = 'BENCH'
+
+# the cache alias the back test results go to while benchmarking
+BENCHMARK_CACHE_ALIAS = 'benchmark'
+
+PATHS = ['update_latest_stock_data', 'train_linear_regression_model', 'back_test', 'predict_data', 'get_report_for_prediction']
+
+# rows generated and written at a time, so memory stays flat for long histories
+CHUNK_SIZE = 100000
+
+# histories longer than this are spaced by minutes instead of days, to stay within the calendar
+MAX_DAILY_ROWS = 36500
+
+# the parameters of the benchmarked back tests
+INVESTING_AMOUNT = 10000
+BUY_PERIOD = 20
+SELL_PERIOD = 5
+
+# days added per symbol by every run of the update
+UPDATE_DAYS = 5
+
+
+class StageTimer:
+    """
+    Collects the durations of the stages of the benchmarked paths
+    """
+
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, path: str, name: str):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.setdefault(path, {}).setdefault(name, []).append(perf_counter() - started)
+
+    def summary(self) -> dict:
+        return {
+            path: {
+                name: {
+                    'runs': len(durations),
+                    'min': min(durations),
+                    'median': statistics.median(durations),
+                    'max': max(durations),
+                    'total': sum(durations),
+                }
+                for name, durations in stages.items()
+            }
+            for path, stages in self.durations.items()
+        }
+
+
+def get_benchmark_symbols(count: int):
+    return [f"{SYMBOL_PREFIX}{index}" for index in range(count)]
+
+
+def get_bar_interval(rows: int) -> timedelta:
+    return timedelta(days=1) if rows <= MAX_DAILY_ROWS else timedelta(minutes=1)
+
+
+def generate_bars(rows: int, seed: int, start: datetime, interval: timedelta, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields chunks of synthetic (time, open, high, low, close, volume) rows
+    following a geometric random walk
+    """
+    generator = np.random.default_rng(seed)
+    close = 100.0
+    for offset in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - offset)
+        closes = close * np.exp(np.cumsum(generator.normal(0.0002, 0.015, count)))
+        opens = np.r_[close, closes[:-1]] * (1 + generator.normal(0, 0.003, count))
+        highs = np.maximum(opens, closes) * (1 + np.abs(generator.normal(0, 0.005, count)))
+        lows = np.minimum(opens, closes) * (1 - np.abs(generator.normal(0, 0.005, count)))
+        volumes = generator.integers(100000, 10000000, count)
+        close = float(closes[-1])
+        yield [
+            (start + (offset + row) * interval, f"{opens[row]:.4f}", f"{highs[row]:.4f}", f"{lows[row]:.4f}", f"{closes[row]:.4f}", str(volumes[row]))
+            for row in range(count)
+        ]
+
+
+def delete_benchmark_data(symbols):
+    StockData.objects.filter(symbol__in=symbols).delete()
+
+
+@contextmanager
+def temporary_state():
+    """
+    Points the files written by the app (models, statistics, snapshots,
+    reports, data versions) to a temporary directory
+    """
+    attributes = {
+        'linearRegressionModelFilepath': 'linear_regression_model.pkl',
+        'symbolModelDirpath': 'symbol_models',
+        'dataVersionDirpath': 'data_versions',
+        'regressionStatisticsDirpath': 'regression_statistics',
+        'snapshotDirpath': 'snapshots',
+        'reportCacheDirpath': 'reports',
+        'jobLockDirpath': 'locks',
+        'marketDataCacheDirpath': 'market_data_cache',
+    }
+    previous = {attribute: getattr(MyappConfig, attribute) for attribute in attributes}
+    with tempfile.TemporaryDirectory() as directory:
+        for attribute, name in attributes.items():
+            setattr(MyappConfig, attribute, os.path.join(directory, name))
+        try:
+            yield directory
+        finally:
+            for attribute, value in previous.items():
+                setattr(MyappConfig, attribute, value)
+
+
+@contextmanager
+def separate_backtest_cache():
+    """
+    Points the back test results to the benchmark cache alias, so the
+    benchmarks clear their results without flushing the shared cache of the API
+    """
+    previous = backtest_cache.CACHE_ALIAS
+    backtest_cache.CACHE_ALIAS = BENCHMARK_CACHE_ALIAS
+    try:
+        yield
+    finally:
+        backtest_cache.CACHE_ALIAS = previous
+
+
+def clear_caches():
+    price_cache.clear()
+    forecast_cache.clear()
+    report_cache.clear()
+    backtest_cache.get_backtest_cache().clear()
+
+
+def render(response) -> bytes:
+    if hasattr(response, 'render'):
+        response.render()
+    return response.content
+
+
+def benchmark_load(timer: StageTimer, symbols, rows: int):
+    interval = get_bar_interval(rows)
+    start = datetime(2000, 1, 3, tzinfo=timezone.utc)
+    for index, symbol in enumerate(symbols):
+        with timer.stage('load', 'ingest_history'):
+            for chunk in generate_bars(rows, index, start, interval):
+                ingest_stock_data(symbol, chunk)
+
+
+def benchmark_update(timer: StageTimer, symbols, repeat: int):
+    """
+    Runs the daily update with the market data of the next days of every
+    symbol generated instead of fetched, so only the ingest is measured
+    """
+    for run in range(repeat):
+        payloads = {}
+        for index, symbol in enumerate(symbols):
+            latest_time = StockData.objects.filter(symbol=symbol).order_by('-time').values_list('time', flat=True).first()
+            start = datetime.combine(latest_time.date(), datetime.min.time(), timezone.utc) + timedelta(days=1)
+            bars = next(generate_bars(UPDATE_DAYS, 1000 * run + index, start, timedelta(days=1)))
+            payloads[symbol] = {
+                time.strftime('%Y-%m-%d'): {'1. open': open_price, '2. high': high_price, '3. low': low_price, '4. close': close_price, '5. volume': volume}
+                for time, open_price, high_price, low_price, close_price, volume in bars
+            }
+
+        with timer.stage('update_latest_stock_data', 'end_to_end'):
+            update_latest_stock_data(symbols, fetch=lambda requests_by_symbol: payloads)
+
+
+def benchmark_train(timer: StageTimer, symbols, repeat: int):
+    for run in range(repeat):
+        with timer.stage('train_linear_regression_model', 'full'):
+            train_linear_regression_model(full=True, symbols=symbols)
+        with timer.stage('train_linear_regression_model', 'incremental'):
+            train_linear_regression_model(symbols=symbols)
+
+
+def benchmark_back_test(timer: StageTimer, symbols, repeat: int):
+    factory = APIRequestFactory()
+    params = {'investing_amount': INVESTING_AMOUNT, 'buy_period': BUY_PERIOD, 'sell_period': SELL_PERIOD}
+    for run in range(repeat):
+        for symbol in symbols:
+            clear_caches()
+            with timer.stage('back_test', 'query'):
+                series = get_price_series(symbol)
+            with timer.stage('back_test', 'compute'):
+                result = run_backtest(series, INVESTING_AMOUNT, BUY_PERIOD, SELL_PERIOD)
+            with timer.stage('back_test', 'serialize'):
+                JSONRenderer().render(result)
+
+            clear_caches()
+            with timer.stage('back_test', 'end_to_end'):
+                render(views.back_test(factory.get('/api/backtest/', {**params, 'symbol': symbol})))
+            with timer.stage('back_test', 'end_to_end_cached'):
+                render(views.back_test(factory.get('/api/backtest/', {**params, 'symbol': symbol})))
+
+
+def benchmark_predict(timer: StageTimer, symbols, repeat: int):
+    factory = APIRequestFactory()
+    for run in range(repeat):
+        for symbol in symbols:
+            clear_caches()
+            with timer.stage('predict_data', 'query'):
+                get_latest_price_series(symbol, 1)
+            with timer.stage('predict_data', 'compute'):
+                result = forecast([symbol], DEFAULT_HORIZON)[symbol]
+            with timer.stage('predict_data', 'serialize'):
+                json.dumps(views.format_forecast(result))
+
+            clear_caches()
+            with timer.stage('predict_data', 'end_to_end'):
+                render(views.predict_data(factory.get('/api/predict-data', {'symbol': symbol})))
+
+        # all the symbols at once, as far as a single request may ask for
+        clear_caches()
+        with timer.stage('predict_data', 'end_to_end_many'):
+            render(views.predict_data(factory.get('/api/predict-data', {'symbols': ','.join(symbols[:views.MAX_FORECAST_SYMBOLS])})))
+
+
+def benchmark_report(timer: StageTimer, symbols, repeat: int):
+    factory = APIRequestFactory()
+    for run in range(repeat):
+        for symbol in symbols:
+            clear_caches()
+            with timer.stage('get_report_for_prediction', 'query'):
+                series = get_latest_price_series(symbol, PREDICTION_DAYS)
+            with timer.stage('get_report_for_prediction', 'compute'):
+                result = forecast([symbol], PREDICTION_DAYS)[symbol]
+            with timer.stage('get_report_for_prediction', 'render'):
+                render_prediction_report(symbol, series, result)
+
+            # the reports pre-rendered by the training are dropped, to measure a cold request
+            clear_caches()
+            shutil.rmtree(os.path.join(get_report_cache_dirpath(), symbol), ignore_errors=True)
+            with timer.stage('get_report_for_prediction', 'end_to_end'):
+                render(views.get_report_for_prediction(factory.get('/api/reports/prediction-data', {'symbol': symbol})))
+            with timer.stage('get_report_for_prediction', 'end_to_end_cached'):
+                render(views.get_report_for_prediction(factory.get('/api/reports/prediction-data', {'symbol': symbol})))
+
+
+def run_benchmarks(rows: int, symbol_count: int, repeat: int = 3, paths=None, keep: bool = False) -> dict:
+    """
+    Writes rows bars of synthetic history for symbol_count symbols, times the
+    given paths (all of them by default) repeat times and returns the results
+    """
+    paths = paths or PATHS
+    symbols = get_benchmark_symbols(symbol_count)
+    timer = StageTimer()
+    started_at = datetime.now(timezone.utc)
+
+    with temporary_state(), separate_backtest_cache():
+        # the rows of an interrupted run are still there
+        delete_benchmark_data(symbols)
+        clear_caches()
+        try:
+            benchmark_load(timer, symbols, rows)
+            logging.info(f"Wrote {rows} bars for {symbol_count} symbols")
+
+            # the models are trained first, the prediction and the report need them
+            if 'train_linear_regression_model' in paths:
+                benchmark_train(timer, symbols, repeat)
+            elif 'predict_data' in paths or 'get_report_for_prediction' in paths:
+                train_linear_regression_model(full=True, symbols=symbols)
+
+            if 'back_test' in paths:
+                benchmark_back_test(timer, symbols, repeat)
+            if 'predict_data' in paths:
+                benchmark_predict(timer, symbols, repeat)
+            if 'get_report_for_prediction' in paths:
+                benchmark_report(timer, symbols, repeat)
+
+            # the update runs last, it adds rows to the histories
+            if 'update_latest_stock_data' in paths:
+                benchmark_update(timer, symbols, repeat)
+        finally:
+            clear_caches()
+            if not keep:
+                delete_benchmark_data(symbols)
+
+    return {
+        'started_at': started_at.isoformat(),
+        'environment': {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'rows': rows,
+            'symbols': symbol_count,
+            'repeat': repeat,
+            'interval_seconds': get_bar_interval(rows).total_seconds(),
+            'paths': paths,
+        },
+        'results': timer.summary(),
+    }
@@ -0,0 +1,37 @@
+from myapp.apps import get_data_version_dirpath
+import os
+import time
+
+# The data version of a symbol is the modification time of a stamp file, so
+# every process (web workers, scheduler, backfill script) can see that new rows
+# were written with a single stat call and without querying the database.
+
+
+def get_data_version_filepath(symbol: str) -> str:
+    return os.path.join(get_data_version_dirpath(), symbol)
+
+
+def get_data_version(symbol: str) -> int:
+    """
+    Returns the current data version of the symbol, 0 when it was never bumped
+    """
+    try:
+        return os.stat(get_data_version_filepath(symbol)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def bump_data_version(symbol: str) -> int:
+    """
+    Marks that new rows were written for the symbol and returns the new version
+    """
+    filepath = get_data_version_filepath(symbol)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+    # the version must always move forward, even when two bumps happen within
+    # the resolution of the clock
+    version = max(time.time_ns(), get_data_version(symbol) + 1)
+    with open(filepath, 'a'):
+        pass
+    os.utime(filepath, ns=(version, version))
+    return version
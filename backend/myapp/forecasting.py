@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from datetime import datetime
+from myapp.data_version import get_data_version
+from myapp.model_registry import get_model
+from myapp.price_cache import get_latest_price_series
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr, USMemorialDay,
+    USPresidentsDay, USThanksgivingDay, nearest_workday, sunday_to_monday,
+)
+from pandas.tseries.offsets import CustomBusinessDay
+import numpy as np
+import pandas as pd
+import threading
+
+# number of forecasts kept in memory
+MAX_FORECASTS = 1024
+
+# number of trading days forecast by default and at most, a year of trading
+DEFAULT_HORIZON = 30
+MAX_HORIZON = 252
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """
+    The full day holidays of the New York Stock Exchange
+    """
+    rules = [
+        Holiday('New Year\'s Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas Day', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+TRADING_DAY = CustomBusinessDay(calendar=NYSEHolidayCalendar())
+
+
+def next_trading_days(last_date: datetime, count: int):
+    """
+    Returns the dates of the count trading days following last_date
+    """
+    start = pd.Timestamp(last_date.date()) + TRADING_DAY
+    return [timestamp.date() for timestamp in pd.date_range(start, periods=count, freq=TRADING_DAY)]
+
+
+def roll_forecast(windows: np.ndarray, coefficients: np.ndarray, intercepts: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    Forecasts horizon steps for many series at once by feeding every prediction
+    back as the newest lag of the next step.
+
+    windows holds the last lags of every series oldest first, one row per series,
+    and coefficients holds the matching weights of the model of every series.
+    Every step is a single matrix operation over all the series. Returns one
+    row of horizon predictions per series.
+    """
+    windows = np.array(windows, dtype=np.float64)
+    forecasts = np.empty((windows.shape[0], horizon), dtype=np.float64)
+    for step in range(horizon):
+        prediction = np.einsum('ij,ij->i', windows, coefficients) + intercepts
+        forecasts[:, step] = prediction
+        windows[:, :-1] = windows[:, 1:]
+        windows[:, -1] = prediction
+    return forecasts
+
+
+class Forecast:
+
+    def __init__(self, dates, prices: np.ndarray, model_version: str):
+        self.dates = dates
+        self.prices = prices
+        self.model_version = model_version
+
+
+forecast_cache = OrderedDict()
+forecast_cache_lock = threading.Lock()
+
+
+def get_coefficients(model):
+    """
+    Returns the coefficients and the intercept of a fitted linear model
+    """
+    coefficients = np.atleast_1d(np.asarray(model.coef_, dtype=np.float64)).ravel()
+    intercept = float(np.asarray(model.intercept_).ravel()[0])
+    return coefficients, intercept
+
+
+def forecast(symbols, horizon: int, model_version: str = None, model=None):
+    """
+    Returns a dict of symbol to the Forecast of its closes over the next horizon
+    trading days, with None for the symbols without a model or enough history.
+
+    Every symbol is forecast with its own model unless a model is given for
+    all of them. Forecasts are cached by (symbol, model version, data version,
+    horizon) and all the symbols missing from the cache are rolled forward
+    together, with the coefficients of their models stacked.
+    """
+    if model is not None:
+        models = {symbol: (model_version, model) for symbol in symbols}
+    else:
+        models = {symbol: get_model(symbol) for symbol in symbols}
+
+    results = {}
+    keys = {}
+    versions = {symbol: get_data_version(symbol) for symbol in symbols}
+    with forecast_cache_lock:
+        for symbol in symbols:
+            if models[symbol] is None:
+                # no model was trained for the symbol, nothing to forecast with
+                results[symbol] = None
+                continue
+            key = (symbol, models[symbol][0], versions[symbol], horizon)
+            cached = forecast_cache.get(key)
+            if cached is not None:
+                forecast_cache.move_to_end(key)
+                results[symbol] = cached
+            else:
+                keys[symbol] = key
+
+    # read the last lags of every symbol that still has to be forecast,
+    # grouped by the number of lags of their model so every group is one matrix
+    groups = {}
+    for symbol in keys:
+        coefficients, intercept = get_coefficients(models[symbol][1])
+        series = get_latest_price_series(symbol, len(coefficients))
+        if len(series) < len(coefficients):
+            results[symbol] = None
+            continue
+        groups.setdefault(len(coefficients), []).append((symbol, series, coefficients, intercept))
+
+    for group in groups.values():
+        predictions = roll_forecast(
+            np.vstack([series.close_price for symbol, series, coefficients, intercept in group]),
+            np.vstack([coefficients for symbol, series, coefficients, intercept in group]),
+            np.array([intercept for symbol, series, coefficients, intercept in group]),
+            horizon,
+        )
+        with forecast_cache_lock:
+            for (symbol, series, coefficients, intercept), prices in zip(group, predictions):
+                result = Forecast(next_trading_days(series.datetime_at(-1), horizon), prices, models[symbol][0])
+                results[symbol] = result
+                forecast_cache[keys[symbol]] = result
+            while len(forecast_cache) > MAX_FORECASTS:
+                forecast_cache.popitem(last=False)
+
+    return {symbol: results[symbol] for symbol in symbols}
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+
+def rolling_sum(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    Sum of the current row and the `period` preceding rows, which matches
+    `ROWS BETWEEN period PRECEDING AND CURRENT ROW` in SQL
+    """
+    return window_sum(np.cumsum(values), period)
+
+
+def window_sum(cumulative: np.ndarray, period: int) -> np.ndarray:
+    """
+    Same as rolling_sum but reuses an already computed cumulative sum, so that
+    many periods can be derived from a single pass over the data
+    """
+    window = period + 1
+    sums = cumulative.copy()
+    sums[window:] -= cumulative[:-window]
+    return sums
+
+
+def rolling_count(length: int, period: int) -> np.ndarray:
+    """
+    Number of rows in each window, which is smaller at the start of the series
+    """
+    return np.minimum(np.arange(1, length + 1, dtype=np.int64), period + 1)
+
+
+class Indicators:
+    """
+    Indicators of a price series in integer ticks, computed on demand with
+    vectorized rolling kernels and kept, so that strategies asking for the
+    same indicator share it and the close prices are summed only once.
+
+    Like the SQL moving averages, the window of a period covers the current
+    row and the `period` preceding rows.
+    """
+
+    def __init__(self, open_ticks: np.ndarray, high_ticks: np.ndarray, low_ticks: np.ndarray, close_ticks: np.ndarray):
+        self.open_ticks = open_ticks
+        self.high_ticks = high_ticks
+        self.low_ticks = low_ticks
+        self.close_ticks = close_ticks
+        self.computed = {}
+
+    def __len__(self):
+        return len(self.close_ticks)
+
+    def get(self, key, compute):
+        if key not in self.computed:
+            self.computed[key] = compute()
+        return self.computed[key]
+
+    def close_cumulative(self) -> np.ndarray:
+        return self.get('close_cumulative', lambda: np.cumsum(self.close_ticks))
+
+    def close_sum(self, period: int) -> np.ndarray:
+        return self.get(('close_sum', period), lambda: window_sum(self.close_cumulative(), period))
+
+    def count(self, period: int) -> np.ndarray:
+        return self.get(('count', period), lambda: rolling_count(len(self), period))
+
+    def sma(self, period: int) -> np.ndarray:
+        return self.get(('sma', period), lambda: self.close_sum(period) / self.count(period))
+
+    def ema(self, period: int) -> np.ndarray:
+        """
+        Exponential moving average of the close with the span of the window of the period
+        """
+        return self.get(('ema', period), lambda: pd.Series(self.close_ticks, dtype=np.float64).ewm(span=period + 1, adjust=False).mean().to_numpy())
+
+    def highest_high(self, period: int) -> np.ndarray:
+        """
+        Highest high of the `period` rows before the current one, NaN on the first row
+        """
+        return self.get(('highest_high', period), lambda: pd.Series(self.high_ticks, dtype=np.float64).rolling(period, min_periods=1).max().shift(1).to_numpy())
+
+    def lowest_low(self, period: int) -> np.ndarray:
+        """
+        Lowest low of the `period` rows before the current one, NaN on the first row
+        """
+        return self.get(('lowest_low', period), lambda: pd.Series(self.low_ticks, dtype=np.float64).rolling(period, min_periods=1).min().shift(1).to_numpy())
@@ -0,0 +1,145 @@
+from datetime import datetime, timezone
+from django.db import connection, transaction
+from myapp.models import StockData
+from myapp.price_cache import price_cache
+from myapp.price_series import PriceSeries
+from myapp.training import mark_statistics_stale
+from time import perf_counter
+import io
+import logging
+
+# number of rows sent to the database per statement
+BATCH_SIZE = 5000
+
+# batches at least this large are streamed with COPY on postgres
+COPY_THRESHOLD = 1000
+
+PRICE_FIELDS = ['open_price', 'close_price', 'high_price', 'low_price', 'volume']
+
+
+def parse_daily_time_series(daily_data: dict, since: datetime = None):
+    """
+    Converts the 'Time Series (Daily)' payload of Alpha Vantage into
+    (time, open, high, low, close, volume) rows ordered by time, keeping only
+    the days after since when it is given
+    """
+    rows = []
+    for date, values in daily_data.items():
+        time = date if isinstance(date, datetime) else datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        if since is not None and time <= since:
+            continue
+        rows.append((
+            time,
+            values.get('1. open'),
+            values.get('2. high'),
+            values.get('3. low'),
+            values.get('4. close'),
+            values.get('5. volume'),
+        ))
+
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def ingest_stock_data(symbol: str, rows):
+    """
+    Writes the rows of the symbol to the stock data table and updates the
+    cached price series.
+
+    Rows that already exist for the same symbol and time are updated, so running the
+    ingest again never fails on duplicates. Returns the number of rows written,
+    the time it took and the throughput.
+    """
+    # keep the last row of every time, a single upsert can not touch the same row twice
+    rows = sorted({row[0]: row for row in rows}.values(), key=lambda row: row[0])
+
+    started = perf_counter()
+    if rows:
+        if connection.vendor == 'postgresql' and len(rows) >= COPY_THRESHOLD:
+            copy_upsert(symbol, rows)
+        else:
+            bulk_upsert(symbol, rows)
+
+        # bump the data version as soon as the rows are committed
+        price_cache.extend(symbol, PriceSeries.from_rows(rows))
+
+        # rows rewritten within the regression statistics make the next training refit them
+        mark_statistics_stale(symbol, rows[0][0])
+
+    seconds = perf_counter() - started
+    rows_per_second = len(rows) / seconds if seconds > 0 else 0.0
+    logging.info(f"Ingested {len(rows)} rows of {symbol} in {seconds:.3f}s ({rows_per_second:.0f} rows/sec)")
+
+    return {
+        'symbol': symbol,
+        'rows': len(rows),
+        'seconds': seconds,
+        'rows_per_second': rows_per_second,
+    }
+
+
+def bulk_upsert(symbol: str, rows):
+    stock_data_list = [
+        StockData(
+            symbol=symbol,
+            time=time,
+            open_price=open_price,
+            close_price=close_price,
+            high_price=high_price,
+            low_price=low_price,
+            volume=volume,
+        )
+        for time, open_price, high_price, low_price, close_price, volume in rows
+    ]
+    StockData.objects.bulk_create(
+        stock_data_list,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['symbol', 'time'],
+        update_fields=PRICE_FIELDS,
+    )
+
+
+def copy_upsert(symbol: str, rows):
+    """
+    Streams the rows into a temporary table with COPY and merges them into the
+    stock data table with a single upsert
+    """
+    table = StockData._meta.db_table
+    buffer = io.StringIO()
+    for time, open_price, high_price, low_price, close_price, volume in rows:
+        buffer.write(f"{symbol}\t{time.isoformat()}\t{open_price}\t{close_price}\t{high_price}\t{low_price}\t{volume}\n")
+    buffer.seek(0)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if not hasattr(raw_cursor, 'copy_expert'):
+            # the driver has no COPY support, fall back to batched inserts
+            bulk_upsert(symbol, rows)
+            return
+
+        cursor.execute("""
+            CREATE TEMPORARY TABLE ingest_stock_data (
+                symbol VARCHAR(16),
+                time TIMESTAMPTZ,
+                open_price NUMERIC(20, 4),
+                close_price NUMERIC(20, 4),
+                high_price NUMERIC(20, 4),
+                low_price NUMERIC(20, 4),
+                volume NUMERIC(20, 4)
+            ) ON COMMIT DROP
+        """)
+        raw_cursor.copy_expert(
+            "COPY ingest_stock_data (symbol, time, open_price, close_price, high_price, low_price, volume) FROM STDIN",
+            buffer,
+        )
+        cursor.execute(f"""
+            INSERT INTO {table} (symbol, time, open_price, close_price, high_price, low_price, volume)
+            SELECT symbol, time, open_price, close_price, high_price, low_price, volume FROM ingest_stock_data
+            ON CONFLICT (symbol, time) DO UPDATE SET
+                open_price = EXCLUDED.open_price,
+                close_price = EXCLUDED.close_price,
+                high_price = EXCLUDED.high_price,
+                low_price = EXCLUDED.low_price,
+                volume = EXCLUDED.volume
+        """)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from myapp.benchmark import PATHS, run_benchmarks
+import json
+
+
+class Command(BaseCommand):
+    help = "Times the hot paths of the API end to end and per stage on synthetic histories and writes the results as json"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="bars of history per symbol, from 1000 to 10000000")
+        parser.add_argument('--symbols', type=int, default=1, help="number of symbols, from 1 to 1000")
+        parser.add_argument('--repeat', type=int, default=3, help="number of runs of every path")
+        parser.add_argument('--paths', nargs='+', choices=PATHS, help="the paths to time, all of them by default")
+        parser.add_argument('--output', default='benchmark.json', help="the json file the results are written to")
+        parser.add_argument('--keep', action='store_true', help="keep the synthetic rows in the database")
+
+    def handle(self, *args, **options):
+        if not 1 <= options['symbols'] <= 1000:
+            raise CommandError("--symbols must be between 1 and 1000")
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError("--rows and --repeat must be positive")
+
+        report = run_benchmarks(options['rows'], options['symbols'], options['repeat'], options['paths'], options['keep'])
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2)
+
+        for path, stages in report['results'].items():
+            for stage, timing in stages.items():
+                self.stdout.write(f"{path:32} {stage:20} median {timing['median'] * 1000:10.2f} ms over {timing['runs']} runs")
+        self.stdout.write(f"Wrote the results to {options['output']}")
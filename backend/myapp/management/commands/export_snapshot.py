@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from myapp.snapshot import export_snapshot
+
+
+class Command(BaseCommand):
+    help = "Exports the price history of the symbols to columnar snapshots that workers can serve without a database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="the symbols to export, all the tracked symbols by default")
+
+    def handle(self, *args, **options):
+        symbols = [symbol.upper() for symbol in options['symbols']] or settings.STOCK_SYMBOLS
+        for symbol in symbols:
+            meta = export_snapshot(symbol)
+            self.stdout.write(f"{symbol}: exported {meta['rows']} rows")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from myapp import background_task
+
+
+class Command(BaseCommand):
+    help = "Runs the scheduled ingest and training jobs, or a single job now with --once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', choices=['daily'] + list(background_task.JOBS), help="run this job now and exit")
+
+    def handle(self, *args, **options):
+        if options['once'] is None:
+            background_task.start()
+            return
+
+        if options['once'] == 'daily':
+            runs = background_task.run_daily_jobs()
+        else:
+            runs = [background_task.run_job(options['once'])]
+        for run in runs:
+            if run.error:
+                self.stdout.write(f"{run.name}: {run.status} in {run.seconds:.2f}s with error: {run.error}")
+            else:
+                self.stdout.write(f"{run.name}: {run.status} in {run.seconds:.2f}s")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from myapp.tasks import train_linear_regression_model
+
+
+class Command(BaseCommand):
+    help = "Trains a new version of the linear regression model of every tracked symbol"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="refit on the whole history instead of only the new rows")
+
+    def handle(self, *args, **options):
+        summary = train_linear_regression_model(full=options['full'])
+        for result in summary['results']:
+            if 'error' in result:
+                self.stdout.write(f"{result['symbol']}: failed with error: {result['error']}")
+            else:
+                self.stdout.write(f"{result['symbol']}: saved model version {result['version']} trained on {result['rows']} rows in {result['seconds']:.2f}s")
+        self.stdout.write(f"Trained {summary['trained']} of {summary['symbols']} models in {summary['seconds']:.2f}s")
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from myapp.strategies import DEFAULT_STRATEGY, STRATEGIES
+from myapp.walk_forward import DEFAULT_TEST_SIZE, DEFAULT_TRAIN_SIZE, walk_forward
+import json
+
+
+class Command(BaseCommand):
+    help = "Evaluates the model and a back test strategy on train and test windows sliding over the history of a symbol"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbol', help="the symbol to evaluate")
+        parser.add_argument('--train-size', type=int, default=DEFAULT_TRAIN_SIZE, help="rows of every train window")
+        parser.add_argument('--test-size', type=int, default=DEFAULT_TEST_SIZE, help="rows of every test window")
+        parser.add_argument('--expanding', action='store_true', help="grow the train window from the first row instead of rolling it")
+        parser.add_argument('--investing-amount', type=int, default=10000, help="amount traded in every test window")
+        parser.add_argument('--buy-period', type=int, default=20, help="buy period of the strategy")
+        parser.add_argument('--sell-period', type=int, default=5, help="sell period of the strategy")
+        parser.add_argument('--strategy', choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY, help="the back test strategy")
+        parser.add_argument('--workers', type=int, help="processes evaluating the folds, one per core by default")
+        parser.add_argument('--output', help="a json file the folds are written to")
+
+    def handle(self, *args, **options):
+        if options['train_size'] < 2 or options['test_size'] < 1:
+            raise CommandError("--train-size must be at least 2 and --test-size positive")
+        if options['buy_period'] < 1 or options['sell_period'] < 1 or options['investing_amount'] < 0:
+            raise CommandError("--buy-period and --sell-period must be positive and --investing-amount not negative")
+
+        result = walk_forward(
+            options['symbol'].upper(), options['investing_amount'], options['buy_period'], options['sell_period'],
+            train_size=options['train_size'], test_size=options['test_size'], expanding=options['expanding'],
+            strategy=options['strategy'], max_workers=options['workers'],
+        )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, indent=2)
+
+        strategy = options['strategy']
+        for fold in result['folds']:
+            self.stdout.write(
+                f"{fold['fold']:4} {fold['test_start'][:10]} to {fold['test_end'][:10]}"
+                f"  rmse {fold['test']['rmse']:10.4f}  direction {fold['test']['direction_accuracy']:6.1%}"
+                f"  {strategy} {fold['profit'][strategy]:12.2f}  model {fold['profit']['model']:12.2f}"
+                f"  hold {fold['profit']['buy_and_hold']:12.2f}"
+            )
+
+        summary = result['summary']
+        if summary['folds'] == 0:
+            self.stdout.write("The history is too short for a single fold")
+            return
+        profits = ', '.join(f"{name} {profit:.2f}" for name, profit in summary['profit'].items())
+        self.stdout.write(f"{summary['folds']} folds, mean test rmse {summary['test_rmse']:.4f}, mean direction accuracy {summary['direction_accuracy']:.1%}, profit {profits}")
@@ -0,0 +1,264 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from myapp.apps import get_market_data_cache_dirpath
+from requests.adapters import HTTPAdapter
+import json
+import logging
+import os
+import random
+import requests
+import threading
+import time
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+
+# statuses worth another try, the provider or a proxy in front of it is overloaded or restarting
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# keys of the body Alpha Vantage answers with, still with a 200, when a call is throttled
+THROTTLE_KEYS = ('Note', 'Information')
+
+TIME_SERIES_KEY = 'Time Series (Daily)'
+
+
+class QuotaExhausted(requests.RequestException):
+    """
+    Raised when the next call could only start after waiting longer than allowed
+    """
+
+
+class TokenBucket:
+    """
+    Holds up to capacity tokens and refills them at rate tokens per second.
+    A call takes a token, and when none is left it books the next one to come,
+    so the calls keep their order whichever thread makes them.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """
+        Returns how long a call made now waits for its token
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that they stay within a per minute quota, letting
+    burst of them start at once, and within an optional per day quota. A call
+    that would wait longer than max_wait for the daily quota raises
+    QuotaExhausted instead of blocking the worker for hours.
+    """
+
+    def __init__(self, requests_per_minute: int, requests_per_day: int = 0, burst: int = 1, max_wait: float = None):
+        self.buckets = [TokenBucket(requests_per_minute / 60.0, burst)]
+        if requests_per_day:
+            self.buckets.append(TokenBucket(requests_per_day / 86400.0, requests_per_day))
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delays = [bucket.delay(now) for bucket in self.buckets]
+            if len(delays) > 1 and self.max_wait is not None and delays[1] > self.max_wait:
+                raise QuotaExhausted(f"The daily request quota allows the next call in {delays[1]:.0f}s")
+            delay = max(delays)
+            for bucket in self.buckets:
+                bucket.take()
+        if delay > 0:
+            time.sleep(delay)
+
+
+rate_limiter = RateLimiter(
+    settings.ALPHA_VANTAGE_REQUESTS_PER_MINUTE,
+    settings.ALPHA_VANTAGE_REQUESTS_PER_DAY,
+    settings.ALPHA_VANTAGE_BURST,
+    settings.ALPHA_VANTAGE_MAX_WAIT,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the session shared by all the calls, which keeps a pool of
+    connections to the provider as large as the fetch thread pool
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.ALPHA_VANTAGE_MAX_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def get_backoff_delay(attempt: int, response=None) -> float:
+    """
+    Returns how long to wait before the retry following the given attempt:
+    the Retry-After seconds of the response when it has them, otherwise an
+    exponential delay with jitter so that threads do not retry in step
+    """
+    retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+    if retry_after.isdigit():
+        return min(float(retry_after), settings.ALPHA_VANTAGE_BACKOFF_MAX)
+    delay = settings.ALPHA_VANTAGE_BACKOFF * 2 ** attempt
+    return min(delay * (1 + random.random()), settings.ALPHA_VANTAGE_BACKOFF_MAX)
+
+
+def is_throttled(response) -> bool:
+    if response.status_code != 200:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and TIME_SERIES_KEY not in body and any(key in body for key in THROTTLE_KEYS)
+
+
+def request_market_data(params: dict, headers: dict = None) -> requests.Response:
+    """
+    Sends the request within the rate limit, retrying connection errors,
+    timeouts, overloaded statuses and throttled answers with a backoff.
+    Returns the last response, or raises the last error when no attempt got one.
+    """
+    retries = settings.ALPHA_VANTAGE_RETRIES
+    for attempt in range(retries + 1):
+        rate_limiter.wait()
+        response = None
+        try:
+            response = get_session().get(
+                ALPHA_VANTAGE_URL,
+                params=params,
+                headers=headers,
+                timeout=(settings.ALPHA_VANTAGE_CONNECT_TIMEOUT, settings.ALPHA_VANTAGE_READ_TIMEOUT),
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            logging.info(f"Request for {params.get('symbol')} failed with error: {e}, retrying")
+        else:
+            if attempt == retries or (response.status_code not in RETRY_STATUSES and not is_throttled(response)):
+                return response
+            logging.info(f"Request for {params.get('symbol')} answered {response.status_code} or was throttled, retrying")
+        time.sleep(get_backoff_delay(attempt, response))
+
+
+def get_cache_filepath(symbol: str, outputsize: str) -> str:
+    return os.path.join(get_market_data_cache_dirpath(), symbol, f"{outputsize}.json")
+
+
+def load_cached_response(symbol: str, outputsize: str):
+    """
+    Returns the cached response of the symbol, or None when there is none
+    """
+    try:
+        with open(get_cache_filepath(symbol, outputsize)) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_cached_response(symbol: str, outputsize: str, cached: dict):
+    filepath = get_cache_filepath(symbol, outputsize)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temporary_filepath = f"{filepath}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(temporary_filepath, 'w') as file:
+        json.dump(cached, file)
+    os.replace(temporary_filepath, filepath)
+
+
+def is_fresh(cached) -> bool:
+    return cached is not None and time.time() - cached['fetched_at'] < settings.ALPHA_VANTAGE_CACHE_SECONDS
+
+
+def fetch_daily_time_series(symbol: str, outputsize: str = 'compact'):
+    """
+    Fetches the daily time series of the symbol from Alpha Vantage and returns
+    its 'Time Series (Daily)' payload, or None when the request failed.
+
+    Answers are cached on disk. A fresh cached answer is returned without a
+    call, and a full history also serves compact requests since it holds
+    their days. A stale one is revalidated with its ETag or Last-Modified, and
+    kept when the provider answers 304 Not Modified.
+    """
+    cached = load_cached_response(symbol, outputsize)
+    if is_fresh(cached):
+        return cached['payload']
+    if outputsize == 'compact':
+        full = load_cached_response(symbol, 'full')
+        if is_fresh(full):
+            return full['payload']
+
+    params = {
+        'function': 'TIME_SERIES_DAILY',
+        'symbol': symbol,
+        'outputsize': outputsize,
+        'apikey': os.getenv('ALPHA_VANTAGE_API_KEY'),
+    }
+    headers = {}
+    if cached is not None and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached is not None and cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    response = request_market_data(params, headers)
+    logging.info(f"Alpha vantage api response status code for {symbol}: {response.status_code}")
+
+    if response.status_code == 304 and cached is not None:
+        cached['fetched_at'] = time.time()
+        save_cached_response(symbol, outputsize, cached)
+        return cached['payload']
+
+    if response.status_code != 200:
+        logging.info(f'Error fetching data for {symbol} from Alpha vantage api. Response status code: {response.status_code}')
+        return None
+
+    body = response.json()
+    if TIME_SERIES_KEY not in body:
+        # an error message or a throttled answer, nothing worth caching
+        logging.info(f"No daily time series for {symbol} from Alpha vantage api: {body}")
+        return {}
+
+    save_cached_response(symbol, outputsize, {
+        'fetched_at': time.time(),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'payload': body[TIME_SERIES_KEY],
+    })
+    return body[TIME_SERIES_KEY]
+
+
+def fetch_many(requests_by_symbol: dict, max_workers: int = None):
+    """
+    Fetches many symbols at once on a thread pool while obeying the rate limit.
+
+    requests_by_symbol maps every symbol to the outputsize to ask for. Returns a
+    dict of symbol to payload, with None for the symbols that failed.
+    """
+    max_workers = max_workers or settings.ALPHA_VANTAGE_MAX_WORKERS
+
+    def fetch(item):
+        symbol, outputsize = item
+        try:
+            return symbol, fetch_daily_time_series(symbol, outputsize)
+        except requests.RequestException as e:
+            logging.error(f"Failed to fetch {symbol} with error: {e}")
+            return symbol, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(fetch, requests_by_symbol.items()))
@@ -7,7 +7,8 @@ from django.db import migrations
 
 def create_hypertable(apps, schema_editor):
     from django.db import connection
-    if 'test' not in sys.argv:
+    # hypertables only exist on postgres, sqlite is used for local runs and benchmarks
+    if 'test' not in sys.argv and connection.vendor == 'postgresql':
         with connection.cursor() as cursor:
             cursor.execute("SELECT create_hypertable('aapl_stock_data', 'time');")
 
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+import sys
+
+
+def copy_aapl_stock_data(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO stock_data (symbol, time, open_price, close_price, high_price, low_price, volume)
+            SELECT 'AAPL', time, open_price, close_price, high_price, low_price, volume
+            FROM aapl_stock_data
+        """)
+
+
+def create_hypertable(apps, schema_editor):
+    connection = schema_editor.connection
+    if 'test' in sys.argv or connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+        if cursor.fetchone() is None:
+            return
+
+        # timescale needs the partitioning column in every unique index
+        cursor.execute("ALTER TABLE stock_data DROP CONSTRAINT stock_data_pkey")
+        cursor.execute("ALTER TABLE stock_data ADD PRIMARY KEY (id, time)")
+        cursor.execute("SELECT create_hypertable('stock_data', 'time', migrate_data => true)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_rename_timestamp_aaplstockdata_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockData',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=16)),
+                ('time', models.DateTimeField()),
+                ('open_price', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('close_price', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('high_price', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('low_price', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('volume', models.DecimalField(decimal_places=4, max_digits=20)),
+            ],
+            options={
+                'db_table': 'stock_data',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockdata',
+            constraint=models.UniqueConstraint(fields=('symbol', 'time'), name='stock_data_symbol_time_key'),
+        ),
+        migrations.RunPython(copy_aapl_stock_data, migrations.RunPython.noop),
+        migrations.RunPython(create_hypertable, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='AaplStockData',
+        ),
+    ]
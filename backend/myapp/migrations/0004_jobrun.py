@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_stockdata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('succeeded', 'Succeeded'), ('failed', 'Failed'), ('skipped', 'Skipped')], max_length=16)),
+                ('started_at', models.DateTimeField()),
+                ('seconds', models.FloatField()),
+                ('error', models.TextField(blank=True)),
+                ('details', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'job_run',
+                'indexes': [models.Index(fields=['name', '-started_at'], name='job_run_name_started_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,178 @@
+from datetime import datetime, timezone
+from myapp.apps import get_linear_regression_model_filepath, get_symbol_model_dirpath
+from myapp.models import DEFAULT_SYMBOL
+import joblib
+import logging
+import os
+import threading
+import time
+
+# number of model versions kept on disk after a new one is saved
+KEEP_VERSIONS = 5
+
+
+def get_versioned_filepath(filepath: str, version: str) -> str:
+    root, extension = os.path.splitext(filepath)
+    return f"{root}.{version}{extension}"
+
+
+def list_model_versions(filepath: str):
+    """
+    Returns the versions of the model saved next to filepath, oldest first
+    """
+    directory = os.path.dirname(filepath) or '.'
+    root, extension = os.path.splitext(os.path.basename(filepath))
+    prefix = f"{root}."
+
+    versions = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(prefix) and name.endswith(extension) and name != os.path.basename(filepath):
+                    versions.append(name[len(prefix):-len(extension)])
+    except FileNotFoundError:
+        return []
+
+    # versions are utc timestamps, so they sort in the order they were written
+    return sorted(versions)
+
+
+def save_model(model, filepath: str = None) -> str:
+    """
+    Saves the model under a new version and returns that version.
+
+    The pickle is written to a temporary file first and then renamed, so a
+    reader never sees a half written file under a versioned name.
+    """
+    filepath = filepath or get_linear_regression_model_filepath()
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    versioned_filepath = get_versioned_filepath(filepath, version)
+    while os.path.exists(versioned_filepath):
+        # two saves within the same microsecond, wait for the clock to move
+        time.sleep(0.000001)
+        version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        versioned_filepath = get_versioned_filepath(filepath, version)
+    os.makedirs(os.path.dirname(versioned_filepath) or '.', exist_ok=True)
+
+    temporary_filepath = f"{versioned_filepath}.tmp-{os.getpid()}"
+    joblib.dump(model, temporary_filepath)
+    os.replace(temporary_filepath, versioned_filepath)
+    logging.info(f"Saved model version {version} to {versioned_filepath}")
+
+    # remove the versions that are too old to still be served
+    for old_version in list_model_versions(filepath)[:-KEEP_VERSIONS]:
+        try:
+            os.remove(get_versioned_filepath(filepath, old_version))
+        except FileNotFoundError:
+            pass
+
+    return version
+
+
+class ModelRegistry:
+    """
+    Keeps the latest version of a model in memory.
+
+    The directory is checked for a newer version at most once per
+    check_interval seconds and a new version is swapped in atomically, so
+    requests never load the pickle on the hot path. A model saved at the
+    unversioned filepath by an older release is served as version 'initial'.
+    When nothing was saved at all, the model of the fallback registry is served.
+    """
+
+    def __init__(self, filepath: str = None, check_interval: float = 5.0, fallback=None):
+        self.filepath = filepath
+        self.check_interval = check_interval
+        self.fallback = fallback
+        self.current = None
+        self.last_check = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the (version, model) pair of the latest saved model
+        """
+        now = time.monotonic()
+        current = self.current
+        if self.last_check is not None and now - self.last_check < self.check_interval:
+            if current is not None:
+                return current
+            if self.fallback is not None:
+                return self.fallback.get()
+
+        with self.lock:
+            self.last_check = now
+            filepath = self.filepath or get_linear_regression_model_filepath()
+            versions = list_model_versions(filepath)
+            if versions:
+                version = versions[-1]
+                versioned_filepath = get_versioned_filepath(filepath, version)
+            elif self.fallback is not None and not os.path.exists(filepath):
+                self.current = None
+                return self.fallback.get()
+            else:
+                version = 'initial'
+                versioned_filepath = filepath
+
+            if self.current is None or self.current[0] != version:
+                model = joblib.load(versioned_filepath)
+                self.current = (version, model)
+                logging.info(f"Loaded model version {version} from {versioned_filepath}")
+
+            return self.current
+
+
+def has_model(filepath: str) -> bool:
+    """
+    Tells whether a model was saved at filepath, under a version or not
+    """
+    return bool(list_model_versions(filepath)) or os.path.exists(filepath)
+
+
+def get_symbol_model_filepath(symbol: str) -> str:
+    """
+    Returns the unversioned filepath of the model of the symbol, its versions
+    are saved next to it in a directory of their own
+    """
+    return os.path.join(get_symbol_model_dirpath(), symbol, os.path.basename(get_linear_regression_model_filepath()))
+
+
+model_registry = ModelRegistry()
+
+# the registries of the models trained per symbol, created on first use
+symbol_registries = {}
+symbol_registries_lock = threading.Lock()
+
+
+def get_symbol_registry(symbol: str):
+    """
+    Returns the registry of the model of the symbol, or None when no model was
+    trained for it. Registries are only kept for the symbols with a model, so
+    requests for any other symbol leave nothing behind.
+    """
+    registry = symbol_registries.get(symbol)
+    if registry is not None:
+        return registry
+
+    # the default symbol is also served the model shared by all the symbols of older releases
+    filepath = get_symbol_model_filepath(symbol)
+    fallback = model_registry if symbol == DEFAULT_SYMBOL else None
+    if not has_model(filepath) and (fallback is None or not has_model(fallback.filepath or get_linear_regression_model_filepath())):
+        return None
+
+    with symbol_registries_lock:
+        registry = symbol_registries.get(symbol)
+        if registry is None:
+            registry = ModelRegistry(filepath, fallback=fallback)
+            symbol_registries[symbol] = registry
+    return registry
+
+
+def get_model(symbol: str = DEFAULT_SYMBOL):
+    """
+    Returns the (version, model) pair of the latest linear regression model of
+    the symbol, or None when no model was trained for it
+    """
+    registry = get_symbol_registry(symbol)
+    return None if registry is None else registry.get()
@@ -2,8 +2,13 @@ from django.db import models
 
 # Create your models here.
 
-class AaplStockData(models.Model):
-    time = models.DateTimeField(primary_key=True)  # Maps to TIMESTAMPTZ
+# the symbol used when a request or a task does not ask for one
+DEFAULT_SYMBOL = 'AAPL'
+
+
+class StockData(models.Model):
+    symbol = models.CharField(max_length=16)
+    time = models.DateTimeField()  # Maps to TIMESTAMPTZ
     open_price = models.DecimalField(max_digits=20, decimal_places=4)  # Maps to DECIMAL
     close_price = models.DecimalField(max_digits=20, decimal_places=4)  # Maps to DECIMAL
     high_price = models.DecimalField(max_digits=20, decimal_places=4)  # Maps to DECIMAL
@@ -11,38 +16,30 @@ class AaplStockData(models.Model):
     volume = models.DecimalField(max_digits=20, decimal_places=4)
 
     class Meta:
-        db_table = 'aapl_stock_data'
-        
-    @staticmethod
-    def get_data_with_moving_average(selling_period: int, buying_period: int):
-        query = f"""
-            SELECT 
-                time,
-                open_price,
-                close_price,
-                high_price,
-                low_price,
-                volume,
-                AVG(close_price) OVER (
-                    ORDER BY time 
-                    ROWS BETWEEN {selling_period} PRECEDING AND CURRENT ROW
-                ) AS selling_moving_average,
-                AVG(close_price) OVER (
-                    ORDER BY time 
-                    ROWS BETWEEN {buying_period} PRECEDING AND CURRENT ROW
-                ) AS buying_moving_average
-            FROM 
-                aapl_stock_data
-            ORDER BY 
-                time;
-        """
-        
-        stock_data = AaplStockData.objects.raw(query)
-        
-        # read the selling and buying moving average from the stock_data and set them to the stock_data object
-        for stock in stock_data:
-            stock.moving_average_selling = stock.__dict__.get('selling_moving_average')
-            stock.moving_average_buying = stock.__dict__.get('buying_moving_average')
-
-        return stock_data
+        db_table = 'stock_data'
+        constraints = [
+            # one row per symbol and day, the index behind it serves the range scans of a symbol
+            models.UniqueConstraint(fields=['symbol', 'time'], name='stock_data_symbol_time_key'),
+        ]
+
 
+class JobRun(models.Model):
+    """
+    One run of a scheduled job, with its outcome and duration
+    """
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    name = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=[(SUCCEEDED, 'Succeeded'), (FAILED, 'Failed'), (SKIPPED, 'Skipped')])
+    started_at = models.DateTimeField()
+    seconds = models.FloatField()
+    error = models.TextField(blank=True)
+    details = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'job_run'
+        indexes = [
+            models.Index(fields=['name', '-started_at'], name='job_run_name_started_at_idx'),
+        ]
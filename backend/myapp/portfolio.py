@@ -0,0 +1,110 @@
+from myapp.price_series import EPOCH
+from datetime import timedelta
+import numpy as np
+
+# number of trading days between two rebalancings by default, about a month
+DEFAULT_REBALANCE_PERIOD = 21
+
+
+def align_closes(series_by_symbol: dict):
+    """
+    Aligns the close prices of the symbols on the union of their dates, from
+    the first date all of them have a price. A symbol without a bar on a date
+    keeps its last close. Returns the times, as epoch microseconds, and a
+    (dates, symbols) matrix of closes in the order of the dict.
+    """
+    series_list = list(series_by_symbol.values())
+    if any(len(series) == 0 for series in series_list):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(series_list)), dtype=np.float64)
+
+    times = np.unique(np.concatenate([series.time for series in series_list]))
+    times = times[times >= max(int(series.time[0]) for series in series_list)]
+
+    # the row of every symbol holding its last close at every date
+    rows = np.column_stack([np.searchsorted(series.time, times, side='right') - 1 for series in series_list])
+    closes = np.column_stack([series.close_price[rows[:, column]] for column, series in enumerate(series_list)])
+    return times, closes
+
+
+def simulate_portfolio(closes: np.ndarray, weights: np.ndarray, investing_amount: float, rebalance_period: int = DEFAULT_REBALANCE_PERIOD):
+    """
+    Simulates a portfolio that invests the weight of every symbol of the
+    amount at the first close and rebalances back to the weights at the close
+    of every rebalance_period-th date, or never when it is 0. What the weights
+    leave out is kept as cash. Shares may be fractional.
+
+    Every stretch between two rebalancings holds fixed shares, so its growth
+    is a ratio of closes. The value at every rebalancing is the cumulative
+    product of these growths, and the whole history is valued in one pass over
+    the matrix. Returns the value of the portfolio at every date, the profit of
+    every symbol and the rows at which it was rebalanced.
+    """
+    dates = closes.shape[0]
+    cash_weight = 1.0 - weights.sum()
+
+    # the rows starting a stretch, and the stretch of every row
+    step = rebalance_period if rebalance_period > 0 else dates
+    starts = np.arange(0, dates, step)
+    ends = np.append(starts[1:], dates - 1)
+    stretch = np.arange(dates) // step
+
+    # growth of every symbol over every stretch, and the value at the start of every stretch
+    growth = closes[ends] / closes[starts]
+    stretch_growth = cash_weight + growth @ weights
+    start_values = investing_amount * np.concatenate([[1.0], np.cumprod(stretch_growth)[:-1]])
+
+    values = start_values[stretch] * (cash_weight + (closes / closes[starts[stretch]]) @ weights)
+    profits = (start_values[:, np.newaxis] * weights * (growth - 1.0)).sum(axis=0)
+    return values, profits, starts[1:]
+
+
+def max_drawdown(values: np.ndarray) -> float:
+    """
+    Largest fall of the values from a previous peak, as a fraction of the peak
+    """
+    if len(values) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(values)
+    return float(np.max((peaks - values) / peaks))
+
+
+def run_portfolio_backtest(series_by_symbol: dict, weights, investing_amount: int, rebalance_period: int = DEFAULT_REBALANCE_PERIOD) -> dict:
+    """
+    Back tests a portfolio of the symbols held at the given weights and returns
+    its aggregate and per symbol profit
+    """
+    symbols = list(series_by_symbol)
+    weights = np.asarray(weights, dtype=np.float64)
+    times, closes = align_closes(series_by_symbol)
+    if len(times) == 0 or investing_amount == 0:
+        return {
+            'dates': 0,
+            'final_value': float(investing_amount),
+            'profit': 0.0,
+            'return': 0.0,
+            'max_drawdown': 0.0,
+            'rebalances': 0,
+            'symbols': {symbol: {'weight': float(weight), 'profit': 0.0} for symbol, weight in zip(symbols, weights)},
+        }
+
+    values, profits, rebalance_rows = simulate_portfolio(closes, weights, investing_amount, rebalance_period)
+    final_value = float(values[-1])
+    return {
+        'start': (EPOCH + timedelta(microseconds=int(times[0]))).isoformat(),
+        'end': (EPOCH + timedelta(microseconds=int(times[-1]))).isoformat(),
+        'dates': len(times),
+        'final_value': round(final_value, 2),
+        'profit': round(final_value - investing_amount, 2),
+        'return': final_value / investing_amount - 1,
+        'max_drawdown': max_drawdown(values),
+        'rebalances': len(rebalance_rows),
+        'symbols': {
+            symbol: {
+                'weight': float(weight),
+                'first_close': float(closes[0, column]),
+                'last_close': float(closes[-1, column]),
+                'profit': round(float(profits[column]), 2),
+            }
+            for column, (symbol, weight) in enumerate(zip(symbols, weights))
+        },
+    }
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from datetime import datetime
+from django.conf import settings
+from myapp.data_version import bump_data_version, get_data_version
+from myapp.models import DEFAULT_SYMBOL
+from myapp.price_series import PriceSeries, load_latest_price_series, load_price_series, load_warmup_start, to_epoch_microseconds
+from myapp.snapshot import get_snapshot_warmup_start, load_latest_snapshot_series, load_snapshot_series
+import logging
+import numpy as np
+import threading
+
+
+class CachedSeries:
+
+    def __init__(self, series: PriceSeries, version: int):
+        self.series = series
+        self.version = version
+
+
+class PriceSeriesCache:
+    """
+    In-process LRU cache of price series keyed by (symbol, start, end).
+
+    Every entry remembers the data version of its symbol when it was loaded and
+    is dropped as soon as that version moves, so the database is only queried
+    again after an ingest wrote new rows. The least recently used entries are
+    evicted once the arrays use more than the memory budget.
+    """
+
+    def __init__(self, memory_budget: int):
+        self.memory_budget = memory_budget
+        self.entries = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, symbol: str = DEFAULT_SYMBOL, start: datetime = None, end: datetime = None) -> PriceSeries:
+        key = (symbol, start, end)
+        version = get_data_version(symbol)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.series
+            self.misses += 1
+
+        if settings.PRICE_SOURCE == 'snapshot':
+            series = load_snapshot_series(symbol, start, end)
+        else:
+            series = load_price_series(symbol, start, end)
+        self.put(key, series, version)
+        return series
+
+    def put(self, key, series: PriceSeries, version: int):
+        with self.lock:
+            self._remove(key)
+            if series.nbytes > self.memory_budget:
+                logging.info(f"Not caching price series {key}, it is larger than the memory budget")
+                return
+
+            self.entries[key] = CachedSeries(series, version)
+            self.bytes_used += series.nbytes
+            self._evict()
+
+    def extend(self, symbol: str, new_rows: PriceSeries):
+        """
+        Records that new rows were written for the symbol. Open ended entries
+        are extended in place when the rows come after their last row, every
+        other entry of the symbol is dropped.
+        """
+        version = bump_data_version(symbol)
+        if len(new_rows) == 0:
+            return
+
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == symbol]:
+                entry = self.entries[key]
+                _, start, end = key
+                series = entry.series
+                if end is not None or len(series) == 0 or new_rows.time[0] <= series.time[-1]:
+                    self._remove(key)
+                    continue
+
+                extended = series.append(new_rows)
+                self.bytes_used += extended.nbytes - series.nbytes
+                entry.series = extended
+                entry.version = version
+
+            # the extended entries may have grown the cache past its budget
+            self._evict()
+
+    def invalidate(self, symbol: str):
+        """
+        Records that rows of the symbol changed and drops all of its entries
+        """
+        bump_data_version(symbol)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == symbol]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes_used = 0
+
+    def _evict(self):
+        while self.bytes_used > self.memory_budget:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry.series.nbytes
+
+
+price_cache = PriceSeriesCache(settings.PRICE_CACHE_MEMORY_BUDGET)
+
+
+def get_price_series(symbol: str = DEFAULT_SYMBOL, start: datetime = None, end: datetime = None) -> PriceSeries:
+    """
+    Returns the price series of the symbol, served from memory when the data
+    did not change since it was last loaded
+    """
+    return price_cache.get(symbol, start, end)
+
+
+def get_price_series_with_warmup(symbol: str, start: datetime = None, end: datetime = None, lookback: int = 0):
+    """
+    Returns the price series of the symbol between start and end preceded by
+    up to lookback earlier rows to warm up the indicators, and the row of the
+    series at which start begins. Only the index entries of the lookback and
+    the rows of the range are read.
+    """
+    warmup_start = start
+    if start is not None and lookback > 0:
+        if settings.PRICE_SOURCE == 'snapshot':
+            warmup_start = get_snapshot_warmup_start(symbol, start, lookback)
+        else:
+            warmup_start = load_warmup_start(symbol, start, lookback)
+
+    series = price_cache.get(symbol, warmup_start, end)
+    first_row = 0 if start is None else int(np.searchsorted(series.time, to_epoch_microseconds(start)))
+    return series, first_row
+
+
+def get_latest_price_series(symbol: str, count: int) -> PriceSeries:
+    """
+    Returns the last count rows of the symbol from the configured price source
+    """
+    if settings.PRICE_SOURCE == 'snapshot':
+        return load_latest_snapshot_series(symbol, count)
+    return load_latest_price_series(symbol, count)
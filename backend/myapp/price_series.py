@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from django.db.models import BigIntegerField, FloatField
+from django.db.models.functions import Cast
+from myapp.models import StockData
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+class PriceSeries:
+    """
+    Column oriented view of the OHLCV history of a stock, ordered by time.
+
+    Times are stored as int64 microseconds since the epoch, prices as float64
+    and volume as int64 so that analytics can work on contiguous arrays
+    instead of model instances holding Decimal objects.
+    """
+
+    def __init__(self, time, open_price, high_price, low_price, close_price, volume):
+        self.time = np.ascontiguousarray(time, dtype=np.int64)
+        self.open_price = np.ascontiguousarray(open_price, dtype=np.float64)
+        self.high_price = np.ascontiguousarray(high_price, dtype=np.float64)
+        self.low_price = np.ascontiguousarray(low_price, dtype=np.float64)
+        self.close_price = np.ascontiguousarray(close_price, dtype=np.float64)
+        self.volume = np.ascontiguousarray(volume, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns())
+
+    def columns(self):
+        return [self.time, self.open_price, self.high_price, self.low_price, self.close_price, self.volume]
+
+    @staticmethod
+    def from_rows(rows):
+        """
+        Builds a PriceSeries from (time, open, high, low, close, volume) rows ordered by time
+        """
+        if not rows:
+            return PriceSeries([], [], [], [], [], [])
+
+        times, opens, highs, lows, closes, volumes = zip(*rows)
+        return PriceSeries(
+            time=[to_epoch_microseconds(time) for time in times],
+            open_price=np.array(opens, dtype=np.float64),
+            high_price=np.array(highs, dtype=np.float64),
+            low_price=np.array(lows, dtype=np.float64),
+            close_price=np.array(closes, dtype=np.float64),
+            volume=np.array(volumes, dtype=np.float64).astype(np.int64),
+        )
+
+    def append(self, other):
+        """
+        Returns a new PriceSeries with the rows of other added at the end
+        """
+        return PriceSeries(*[np.concatenate([mine, theirs]) for mine, theirs in zip(self.columns(), other.columns())])
+
+    def datetime_at(self, index: int) -> datetime:
+        """
+        Returns the timezone aware datetime of the row at the given index
+        """
+        return EPOCH + timedelta(microseconds=int(self.time[index]))
+
+
+def to_epoch_microseconds(value: datetime) -> int:
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def values_rows(queryset):
+    """
+    Returns the (time, open, high, low, close, volume) rows of the queryset
+    with the prices cast to floats and the volume to an integer by the
+    database, so no Decimal is built and converted per value
+    """
+    return queryset.annotate(
+        float_open=Cast('open_price', FloatField()),
+        float_high=Cast('high_price', FloatField()),
+        float_low=Cast('low_price', FloatField()),
+        float_close=Cast('close_price', FloatField()),
+        integer_volume=Cast('volume', BigIntegerField()),
+    ).values_list('time', 'float_open', 'float_high', 'float_low', 'float_close', 'integer_volume')
+
+
+def load_price_series(symbol: str, start: datetime = None, end: datetime = None) -> PriceSeries:
+    """
+    Loads the stock history of the symbol between start and end (both inclusive
+    and optional) from the database into a PriceSeries
+    """
+    queryset = StockData.objects.filter(symbol=symbol).order_by('time')
+    if start is not None:
+        queryset = queryset.filter(time__gte=start)
+    if end is not None:
+        queryset = queryset.filter(time__lte=end)
+
+    return PriceSeries.from_rows(list(values_rows(queryset)))
+
+
+def load_latest_price_series(symbol: str, count: int) -> PriceSeries:
+    """
+    Loads the last count rows of the symbol into a PriceSeries ordered by time.
+
+    The rows are read newest first with a LIMIT, which walks the (symbol, time)
+    index backwards, so the cost depends on count and not on the history size.
+    """
+    queryset = StockData.objects.filter(symbol=symbol).order_by('-time')[:count]
+    rows = list(values_rows(queryset))
+    rows.reverse()
+    return PriceSeries.from_rows(rows)
+
+
+def load_warmup_start(symbol: str, start: datetime, lookback: int) -> datetime:
+    """
+    Returns the time of the row lookback rows before start, or of the first
+    row when there are fewer, so that a series loaded from it holds the
+    history the indicators need at start. Only lookback index entries are read.
+    """
+    times = list(StockData.objects.filter(symbol=symbol, time__lt=start).order_by('-time').values_list('time', flat=True)[:lookback])
+    return times[-1] if times else start
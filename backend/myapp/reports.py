@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from myapp.apps import get_report_cache_dirpath
+from myapp.data_version import get_data_version
+from myapp.forecasting import Forecast, forecast
+from myapp.model_registry import get_model
+from myapp.price_cache import get_latest_price_series
+from myapp.price_series import PriceSeries
+import hashlib
+import io
+import logging
+import os
+import threading
+
+# number of rendered reports kept in memory, the rest are read back from disk
+MEMORY_ENTRIES = 64
+
+# number of days of actual prices and of trading days of forecast drawn
+PREDICTION_DAYS = 30
+
+
+def get_report_etag(symbol: str, data_version: int, model_version: str) -> str:
+    """
+    Returns the quoted etag of the report of the symbol rendered from the given
+    data and model versions
+    """
+    digest = hashlib.sha1(f"{symbol}:{data_version}:{model_version}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def render_prediction_report(symbol: str, series: PriceSeries, result: Forecast) -> bytes:
+    """
+    Draws the actual prices of the last days in series and the forecast of the
+    following trading days, and returns the PNG bytes.
+
+    The figure is created without pyplot, so it is not registered in any global
+    state and is freed as soon as it goes out of scope.
+    """
+    actual_times = [series.datetime_at(i).date() for i in range(len(series))]
+    actual_prices = series.close_price
+    prediction_dates = result.dates
+    predictions = result.prices
+
+    figure = Figure(figsize=(12, 6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+
+    # Plot actual prices for the last days
+    axes.plot(actual_times, actual_prices, label='Actual Price', color='blue', marker='o')
+
+    # Plot predicted prices for the next days
+    axes.plot(prediction_dates, predictions, label='Predicted Price', color='green', linestyle='--', marker='x')
+
+    # Improve x-axis formatting
+    figure.autofmt_xdate()
+
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Stock Price')
+    axes.set_title(f'Actual vs Predicted Stock Prices of {symbol}')
+    axes.legend()
+
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+class ReportCache:
+    """
+    Cache of rendered reports keyed by etag.
+
+    The most recent reports are kept in memory and every report is also written
+    to the cache directory, so a report pre-rendered by the scheduler is served
+    by every web worker. Only the latest report of a symbol is kept on disk.
+    """
+
+    def __init__(self, max_entries: int, dirpath: str = None):
+        self.max_entries = max_entries
+        self.dirpath = dirpath
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_filepath(self, symbol: str, etag: str) -> str:
+        digest = etag.strip('"')
+        return os.path.join(self.dirpath or get_report_cache_dirpath(), symbol, f"{digest}.png")
+
+    def get(self, symbol: str, etag: str):
+        """
+        Returns the PNG bytes of the report, or None when it was never rendered
+        """
+        with self.lock:
+            png = self.entries.get(etag)
+            if png is not None:
+                self.entries.move_to_end(etag)
+                self.hits += 1
+                return png
+
+        try:
+            with open(self.get_filepath(symbol, etag), 'rb') as file:
+                png = file.read()
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        self._remember(etag, png)
+        return png
+
+    def put(self, symbol: str, etag: str, png: bytes):
+        self._remember(etag, png)
+
+        # write to a temporary file first, so other workers never read a partial png
+        filepath = self.get_filepath(symbol, etag)
+        directory = os.path.dirname(filepath)
+        os.makedirs(directory, exist_ok=True)
+        temporary_filepath = f"{filepath}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(temporary_filepath, 'wb') as file:
+            file.write(png)
+        os.replace(temporary_filepath, filepath)
+
+        # the reports of older data or model versions are never asked for again
+        for name in os.listdir(directory):
+            if name.endswith('.png') and name != os.path.basename(filepath):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _remember(self, etag: str, png: bytes):
+        with self.lock:
+            self.entries[etag] = png
+            self.entries.move_to_end(etag)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+report_cache = ReportCache(MEMORY_ENTRIES)
+
+
+def get_prediction_report(symbol: str, model_version: str = None, model=None):
+    """
+    Returns the (etag, png) pair of the prediction report of the symbol, the
+    png is None when there is no data or no model for the symbol.
+
+    The report is only rendered when the data or the model changed since it
+    was last rendered.
+    """
+    if model is None:
+        found = get_model(symbol)
+        if found is None:
+            return None, None
+        model_version, model = found
+
+    etag = get_report_etag(symbol, get_data_version(symbol), model_version)
+    png = report_cache.get(symbol, etag)
+    if png is not None:
+        return etag, png
+
+    series = get_latest_price_series(symbol, PREDICTION_DAYS)
+    if len(series) == 0:
+        return etag, None
+
+    result = forecast([symbol], PREDICTION_DAYS, model_version, model)[symbol]
+    png = render_prediction_report(symbol, series, result)
+    report_cache.put(symbol, etag, png)
+    logging.info(f"Rendered prediction report of {symbol} for model version {model_version}")
+    return etag, png
+
+
+def prerender_reports(symbols, model_version: str, model):
+    """
+    Renders the reports of the symbols for a freshly trained model, so the
+    first requests after a retrain are served from the cache
+    """
+    for symbol in symbols:
+        try:
+            get_prediction_report(symbol, model_version, model)
+        except Exception as e:
+            logging.error(f"Failed to render the prediction report of {symbol} with error: {e}")
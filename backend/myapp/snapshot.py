@@ -0,0 +1,148 @@
+from datetime import datetime
+from myapp.apps import get_snapshot_dirpath
+from myapp.data_version import bump_data_version
+from myapp.price_series import PriceSeries, load_price_series, to_epoch_microseconds
+import json
+import logging
+import numpy as np
+import os
+import shutil
+import time
+
+# A snapshot of a symbol is a directory holding one .npy file per column of its
+# PriceSeries and a meta.json with the row count and an index of the first row
+# of every year. Snapshots are written to a new generation directory and
+# published by replacing the `current` pointer file, so readers never see a
+# half written snapshot, and the columns are memory mapped when opened.
+
+COLUMNS = ['time', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+
+def get_symbol_snapshot_dirpath(symbol: str, dirpath: str = None) -> str:
+    return os.path.join(dirpath or get_snapshot_dirpath(), symbol)
+
+
+def export_snapshot(symbol: str, dirpath: str = None) -> dict:
+    """
+    Writes the whole history of the symbol from the database to a new snapshot
+    and returns its meta data
+    """
+    series = load_price_series(symbol)
+    directory = get_symbol_snapshot_dirpath(symbol, dirpath)
+    generation = str(time.time_ns())
+    generation_dirpath = os.path.join(directory, generation)
+    os.makedirs(generation_dirpath)
+
+    for column, values in zip(COLUMNS, series.columns()):
+        np.save(os.path.join(generation_dirpath, f"{column}.npy"), values)
+
+    # the first row of every year, to narrow down the search of a date
+    years = (series.time.astype('datetime64[us]').astype('datetime64[Y]').astype(np.int64) + 1970) if len(series) else np.empty(0, dtype=np.int64)
+    first_rows = np.flatnonzero(np.r_[True, years[1:] != years[:-1]]) if len(series) else []
+    meta = {
+        'symbol': symbol,
+        'rows': len(series),
+        'exported_at': datetime.now().astimezone().isoformat(),
+        'index': {str(int(years[row])): int(row) for row in first_rows},
+    }
+    with open(os.path.join(generation_dirpath, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+
+    # publish the new generation and drop the previous ones, mapped files stay readable until unmapped
+    temporary_filepath = os.path.join(directory, f"current.tmp-{os.getpid()}")
+    with open(temporary_filepath, 'w') as file:
+        file.write(generation)
+    os.replace(temporary_filepath, os.path.join(directory, 'current'))
+    for name in os.listdir(directory):
+        if name != generation and os.path.isdir(os.path.join(directory, name)):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    # the cached series of every process were loaded from the previous snapshot
+    bump_data_version(symbol)
+    logging.info(f"Exported a snapshot of {len(series)} rows of {symbol} to {generation_dirpath}")
+    return meta
+
+
+def open_snapshot(symbol: str, dirpath: str = None):
+    """
+    Returns the memory mapped PriceSeries of the latest snapshot of the symbol
+    and its meta data, or None when the symbol was never exported
+    """
+    directory = get_symbol_snapshot_dirpath(symbol, dirpath)
+    try:
+        with open(os.path.join(directory, 'current')) as file:
+            generation_dirpath = os.path.join(directory, file.read().strip())
+        with open(os.path.join(generation_dirpath, 'meta.json')) as file:
+            meta = json.load(file)
+        columns = [np.load(os.path.join(generation_dirpath, f"{column}.npy"), mmap_mode='r') for column in COLUMNS]
+    except FileNotFoundError:
+        return None
+
+    return PriceSeries(*columns), meta
+
+
+def load_snapshot_series(symbol: str, start: datetime = None, end: datetime = None, dirpath: str = None) -> PriceSeries:
+    """
+    Returns the rows of the snapshot of the symbol between start and end (both
+    inclusive and optional) without copying them, an empty series when there
+    is no snapshot
+    """
+    snapshot = open_snapshot(symbol, dirpath)
+    if snapshot is None:
+        return PriceSeries.from_rows([])
+    series, meta = snapshot
+
+    first, last = 0, len(series)
+    if start is not None:
+        first = search_time(series, meta, start)
+    if end is not None:
+        last = search_time(series, meta, end, side='right')
+    return slice_series(series, first, last)
+
+
+def load_latest_snapshot_series(symbol: str, count: int, dirpath: str = None) -> PriceSeries:
+    """
+    Returns the last count rows of the snapshot of the symbol without copying them
+    """
+    snapshot = open_snapshot(symbol, dirpath)
+    if snapshot is None:
+        return PriceSeries.from_rows([])
+    series, meta = snapshot
+    return slice_series(series, max(len(series) - count, 0), len(series))
+
+
+def get_snapshot_warmup_start(symbol: str, start: datetime, lookback: int, dirpath: str = None) -> datetime:
+    """
+    Same as price_series.load_warmup_start, read from the snapshot of the symbol
+    """
+    snapshot = open_snapshot(symbol, dirpath)
+    if snapshot is None:
+        return start
+    series, meta = snapshot
+
+    row = search_time(series, meta, start)
+    if row == 0:
+        return start
+    return series.datetime_at(max(row - lookback, 0))
+
+
+def search_time(series: PriceSeries, meta: dict, value: datetime, side: str = 'left') -> int:
+    """
+    Returns the row of the value in the time column, only the rows of the year
+    of the value are searched
+    """
+    microseconds = to_epoch_microseconds(value)
+    value_year = int(np.datetime64(microseconds, 'us').astype('datetime64[Y]').astype(np.int64)) + 1970
+
+    index = meta['index']
+    lower, upper = 0, len(series)
+    for year in sorted(int(year) for year in index):
+        if year > value_year:
+            upper = index[str(year)]
+            break
+        lower = index[str(year)]
+    return lower + int(np.searchsorted(series.time[lower:upper], microseconds, side=side))
+
+
+def slice_series(series: PriceSeries, first: int, last: int) -> PriceSeries:
+    return PriceSeries(*[column[first:last] for column in series.columns()])
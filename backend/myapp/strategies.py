@@ -0,0 +1,62 @@
+from myapp.indicators import Indicators
+import numpy as np
+
+# A strategy turns the indicators of a series into a buy and a sell signal per
+# row. The engine buys at the open of the first buy signal and sells at the
+# close of the first sell signal after it, so a strategy only decides on the
+# rows and never loops over them. Both periods come from the back test request.
+
+
+def sma_signals(indicators: Indicators, buy_period: int, sell_period: int):
+    """
+    Buys when the open is below the simple moving average of buy_period and
+    sells when the close is above the one of sell_period. The averages are
+    compared as `price * count < sum` to stay in integers.
+    """
+    buy_signal = indicators.open_ticks * indicators.count(buy_period) < indicators.close_sum(buy_period)
+    sell_signal = indicators.close_ticks * indicators.count(sell_period) > indicators.close_sum(sell_period)
+    return buy_signal, sell_signal
+
+
+def ema_signals(indicators: Indicators, buy_period: int, sell_period: int):
+    """
+    Same rule as sma_signals on exponential moving averages
+    """
+    buy_signal = indicators.open_ticks < indicators.ema(buy_period)
+    sell_signal = indicators.close_ticks > indicators.ema(sell_period)
+    return buy_signal, sell_signal
+
+
+def crossover_signals(indicators: Indicators, buy_period: int, sell_period: int):
+    """
+    Buys while the fast simple moving average of buy_period is above the slow
+    one of sell_period and sells once it falls below. The buy decision is
+    taken at the open, on the averages of the previous day.
+    """
+    fast = indicators.sma(buy_period)
+    slow = indicators.sma(sell_period)
+    buy_signal = np.zeros(len(indicators), dtype=bool)
+    buy_signal[1:] = fast[:-1] > slow[:-1]
+    sell_signal = fast < slow
+    return buy_signal, sell_signal
+
+
+def breakout_signals(indicators: Indicators, buy_period: int, sell_period: int):
+    """
+    Buys when the open breaks above the highest high of the previous buy_period
+    days and sells when the close breaks below the lowest low of the previous
+    sell_period days
+    """
+    buy_signal = indicators.open_ticks > indicators.highest_high(buy_period)
+    sell_signal = indicators.close_ticks < indicators.lowest_low(sell_period)
+    return buy_signal, sell_signal
+
+
+STRATEGIES = {
+    'sma': sma_signals,
+    'ema': ema_signals,
+    'crossover': crossover_signals,
+    'breakout': breakout_signals,
+}
+
+DEFAULT_STRATEGY = 'sma'
@@ -1,16 +1,76 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.utils import timezone
-from myapp.models import AaplStockData
+from asgiref.sync import sync_to_async
+from myapp.models import JobRun, StockData
+from myapp.backtest_cache import get_backtest_cache, get_backtest_result
+from myapp.backtest_engine import iter_backtest_events, run_backtest
+from myapp.indicators import Indicators
+from myapp.strategies import STRATEGIES
+from myapp.portfolio import align_closes, run_portfolio_backtest, simulate_portfolio
+from myapp.walk_forward import iter_train_statistics, make_folds, run_walk_forward, segment_statistics
+from myapp.benchmark import PATHS, generate_bars, run_benchmarks, temporary_state
+from myapp.backtest_sweep import run_parameter_sweep
+from myapp.price_cache import PriceSeriesCache, get_price_series_with_warmup, price_cache
+from myapp.price_series import PriceSeries, load_latest_price_series, load_price_series
+from myapp.data_version import bump_data_version, get_data_version
+from myapp.snapshot import export_snapshot, load_latest_snapshot_series, load_snapshot_series, slice_series
+from myapp.forecasting import forecast, forecast_cache, next_trading_days, roll_forecast
+from myapp.ingest import ingest_stock_data, parse_daily_time_series
+from myapp.market_data import QuotaExhausted, RateLimiter, fetch_daily_time_series, fetch_many
+from myapp.tasks import train_linear_regression_model, update_latest_stock_data
+from myapp.background_task import create_scheduler, cron_trigger, job_lock, run_daily_jobs, run_job
+from myapp.training import RegressionStatistics, iter_close_chunks, load_statistics, refit_statistics, train_models, update_statistics
+from myapp.reports import ReportCache, get_prediction_report, prerender_reports
+from myapp.model_registry import KEEP_VERSIONS, ModelRegistry, get_model, get_versioned_filepath, list_model_versions, save_model
+from myapp.views import parse_int_range
+from sklearn.linear_model import LinearRegression
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management import call_command
+from django.db import connections
+import requests
+from contextlib import ExitStack
+from unittest import mock
+import os
 import decimal
+import io
 import datetime
+import json
+import myapp.backtest_sweep
+import myapp.model_registry
+import myapp.reports
+import numpy
 
 # Create your tests here.
 
+def clear_caches():
+    # the tests write rows without bumping the data version, start from empty caches
+    price_cache.clear()
+    get_backtest_cache().clear()
+
+
+class TemporaryStateMixin:
+    """
+    Points the files the app writes (models, statistics, snapshots, reports,
+    data versions, locks, market data) to a temporary directory,
+    self.directory, for the duration of every test
+    """
+
+    def setUp(self):
+        super().setUp()
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        self.directory = stack.enter_context(temporary_state())
+
+
 class BackTestAPITestCase(APITestCase):
 
+    def setUp(self):
+        # the tests write rows without going through the ingest, so start from an empty cache
+        clear_caches()
+
     def test_missing_parameters(self):
         """
         Test that the API returns 400 Bad Request when any parameters are missing.
@@ -52,7 +112,8 @@ class BackTestAPITestCase(APITestCase):
         # Create sample stock data
         dates = [timezone.now() - datetime.timedelta(days=i) for i in range(30)]
         for date in dates:
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal('100.00'),
                 close_price=decimal.Decimal('105.00'),
@@ -79,7 +140,8 @@ class BackTestAPITestCase(APITestCase):
         # Create sample stock data
         dates = [timezone.now() - datetime.timedelta(days=i) for i in range(30)]
         for date in dates:
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal('100.00'),
                 close_price=decimal.Decimal('105.00'),
@@ -106,7 +168,8 @@ class BackTestAPITestCase(APITestCase):
         # Create sample stock data
         dates = [timezone.now() - datetime.timedelta(days=i) for i in range(365)]
         for date in dates:
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal('150.00'),
                 close_price=decimal.Decimal('155.00'),
@@ -134,7 +197,8 @@ class BackTestAPITestCase(APITestCase):
         dates = [timezone.now() - datetime.timedelta(days=i) for i in range(2)]
         prices = ['100.00', '101.00']
         for i, date in enumerate(dates):
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal(prices[i]),
                 close_price=decimal.Decimal(prices[i]),
@@ -161,7 +225,8 @@ class BackTestAPITestCase(APITestCase):
         # Create sample stock data
         dates = [timezone.now() - datetime.timedelta(days=i) for i in range(30)]
         for date in dates:
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal('120.00'),
                 close_price=decimal.Decimal('125.00'),
@@ -188,7 +253,8 @@ class BackTestAPITestCase(APITestCase):
         # Create sample stock data
         dates = [timezone.now() - datetime.timedelta(days=i) for i in range(60)]
         for date in dates:
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal('80.00'),
                 close_price=decimal.Decimal('85.00'),
@@ -230,7 +296,8 @@ class BackTestAPITestCase(APITestCase):
         # Create sample stock data with future dates
         dates = [timezone.now() + datetime.timedelta(days=i) for i in range(30)]
         for date in dates:
-            AaplStockData.objects.create(
+            StockData.objects.create(
+                symbol='AAPL',
                 time=date,
                 open_price=decimal.Decimal('90.00'),
                 close_price=decimal.Decimal('95.00'),
@@ -276,3 +343,1796 @@ class BackTestAPITestCase(APITestCase):
         }
         response = self.client.get(url, params)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def reference_back_test(investing_amount, buy_period, sell_period):
+    """
+    The original row by row implementation of the backtest, used to check that
+    the vectorized engine produces the same output.
+    """
+    stock_data = list(StockData.objects.filter(symbol='AAPL').order_by('time'))
+    # the averages of the close over the current row and the period preceding rows
+    closes = [stock.close_price for stock in stock_data]
+    for index, stock in enumerate(stock_data):
+        selling = closes[max(0, index - sell_period):index + 1]
+        buying = closes[max(0, index - buy_period):index + 1]
+        stock.selling_moving_average = sum(selling) / len(selling)
+        stock.buying_moving_average = sum(buying) / len(buying)
+    buy = True
+    amount_remaining = investing_amount
+    stocks_held = 0
+    events = []
+    for stock in stock_data:
+        if investing_amount == 0:
+            break
+
+        if buy and stock.open_price < stock.buying_moving_average:
+            stocks_held = int(amount_remaining) // stock.open_price
+            amount_remaining = int(amount_remaining) % stock.open_price
+            events.append(f"Bought {stocks_held} stocks on {stock.time} for {stock.open_price}")
+            buy = False
+        elif not buy and stock.close_price > stock.selling_moving_average:
+            amount_remaining += int(stocks_held * stock.close_price)
+            events.append(f"Sold {stocks_held} stocks on {stock.time} for {stock.close_price}")
+            stocks_held = 0
+            buy = True
+
+    if stocks_held > 0:
+        amount_remaining += int(stocks_held * stock_data[-1].close_price)
+        events.append(f"Sold {stocks_held} stocks on {stock_data[-1].time} for {stock_data[-1].close_price}")
+
+    return {'profit': amount_remaining - investing_amount, 'events': events}
+
+
+class BackTestEngineTestCase(TestCase):
+
+    def setUp(self):
+        # a deterministic zig zag price history so that the strategy trades often
+        start = timezone.now() - datetime.timedelta(days=200)
+        for i in range(200):
+            base = decimal.Decimal(100 + (i * 37) % 23) + decimal.Decimal(i % 7) / 4
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=base + decimal.Decimal('0.1234'),
+                close_price=base + decimal.Decimal((i * 13) % 5) - 2,
+                high_price=base + 5,
+                low_price=base - 5,
+                volume=decimal.Decimal(1000 + i)
+            )
+
+    def test_engine_matches_reference_implementation(self):
+        """
+        Test that the engine returns the same profit and events as the row by row loop.
+        """
+        series = load_price_series('AAPL')
+        for investing_amount, buy_period, sell_period in [(10000, 5, 10), (1, 1, 1), (5000, 10, 10), (123456, 30, 3), (99, 2, 50)]:
+            expected = reference_back_test(investing_amount, buy_period, sell_period)
+            result = run_backtest(series, investing_amount, buy_period, sell_period)
+            self.assertEqual(result['events'], expected['events'])
+            self.assertEqual(result['profit'], expected['profit'])
+
+    def test_price_series_is_ordered_by_time(self):
+        """
+        Test that the price series is loaded into contiguous arrays ordered by time.
+        """
+        series = load_price_series('AAPL')
+        self.assertEqual(len(series), 200)
+        self.assertTrue((series.time[1:] > series.time[:-1]).all())
+        self.assertEqual(series.volume.dtype, numpy.int64)
+        self.assertTrue(series.close_price.flags['C_CONTIGUOUS'])
+
+    def test_latest_price_series_is_the_tail(self):
+        """
+        Test that only the last rows are loaded, still ordered by time.
+        """
+        series = load_price_series('AAPL')
+        latest = load_latest_price_series('AAPL', 30)
+        self.assertEqual(len(latest), 30)
+        numpy.testing.assert_array_equal(latest.time, series.time[-30:])
+        numpy.testing.assert_array_equal(latest.close_price, series.close_price[-30:])
+        self.assertEqual(len(load_latest_price_series('AAPL', 500)), 200)
+
+
+class BackTestSweepTestCase(APITestCase):
+
+    def setUp(self):
+        clear_caches()
+        start = timezone.now() - datetime.timedelta(days=120)
+        for i in range(120):
+            base = decimal.Decimal(100 + (i * 37) % 23)
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=base + decimal.Decimal('0.5000'),
+                close_price=base + decimal.Decimal((i * 13) % 5) - 2,
+                high_price=base + 5,
+                low_price=base - 5,
+                volume=decimal.Decimal('1000')
+            )
+
+    def test_sweep_matches_single_backtests(self):
+        """
+        Test that every combination of the sweep has the same profit as a single backtest.
+        """
+        series = load_price_series('AAPL')
+        results = run_parameter_sweep(series, [1000, 5000], [2, 5, 10], [3, 7], max_workers=1)
+        self.assertEqual(len(results), 12)
+        for result in results:
+            expected = run_backtest(series, result['investing_amount'], result['buy_period'], result['sell_period'])
+            self.assertEqual(result['profit'], expected['profit'])
+            self.assertEqual(result['trades'], len(expected['events']))
+
+    def test_sweep_with_process_pool(self):
+        """
+        Test that spreading the sweep across a process pool gives the same ranking.
+        """
+        series = load_price_series('AAPL')
+        periods = list(range(1, 11))
+        inline = run_parameter_sweep(series, [10000], periods, periods, max_workers=1)
+        pooled = run_parameter_sweep(series, [10000], periods, periods, max_workers=2)
+        self.assertEqual(inline, pooled)
+
+    def test_concurrent_sweeps_share_one_pool(self):
+        """
+        Test that a sweep started while another one holds the pool is scored in its own process.
+        """
+        series = load_price_series('AAPL')
+        periods = list(range(1, 11))
+        expected = run_parameter_sweep(series, [10000], periods, periods, max_workers=1)
+        with myapp.backtest_sweep._pool_slot, mock.patch('myapp.backtest_sweep.ProcessPoolExecutor') as executor:
+            self.assertEqual(run_parameter_sweep(series, [10000], periods, periods, max_workers=2), expected)
+        executor.assert_not_called()
+
+    def test_oversized_ranges_are_refused_before_expanding(self):
+        """
+        Test that a range longer than the largest grid is refused without building it.
+        """
+        self.assertEqual(parse_int_range('1,5:9:2,20'), [1, 5, 7, 9, 20])
+        self.assertIsNone(parse_int_range('1:1000000000'))
+        self.assertIsNone(parse_int_range('1,2', max_values=1))
+
+        url = reverse('back_test_sweep')
+        response = self.client.get(url, {'investing_amounts': '10000', 'buy_periods': '1:1000000000', 'sell_periods': '5'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sweep_uses_the_strategy(self):
+        """
+        Test that every strategy of the sweep has the same profit as a single backtest with it.
+        """
+        series = load_price_series('AAPL')
+        for strategy in STRATEGIES:
+            results = run_parameter_sweep(series, [5000], [2, 5, 10], [3, 7], max_workers=1, strategy=strategy)
+            for result in results:
+                expected = run_backtest(series, 5000, result['buy_period'], result['sell_period'], strategy=strategy)
+                self.assertEqual(result['profit'], expected['profit'])
+                self.assertEqual(result['trades'], len(expected['events']))
+
+        url = reverse('back_test_sweep')
+        params = {'investing_amounts': '10000', 'buy_periods': '2:10:4', 'sell_periods': '3,5'}
+        response = self.client.get(url, {**params, 'strategy': 'breakout'})
+        self.assertEqual(response.data['strategy'], 'breakout')
+        self.assertEqual(response.data['results'], run_parameter_sweep(series, [10000], [2, 6, 10], [3, 5], max_workers=1, strategy='breakout'))
+        response = self.client.get(url, {**params, 'strategy': 'momentum'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sweep_endpoint_ranks_results(self):
+        """
+        Test that the endpoint returns the results ranked by profit.
+        """
+        url = reverse('back_test_sweep')
+        params = {
+            'investing_amounts': '10000',
+            'buy_periods': '2:10:4',
+            'sell_periods': '3,5',
+            'top': '4',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['combinations'], 6)
+        results = response.data['results']
+        self.assertEqual(len(results), 4)
+        self.assertEqual([result['rank'] for result in results], [1, 2, 3, 4])
+        profits = [result['profit'] for result in results]
+        self.assertEqual(profits, sorted(profits, reverse=True))
+
+    def test_sweep_invalid_parameters(self):
+        """
+        Test that the endpoint returns 400 Bad Request for missing or invalid ranges.
+        """
+        url = reverse('back_test_sweep')
+        for params in [
+            {},
+            {'investing_amounts': '1000', 'buy_periods': '0:5', 'sell_periods': '5'},
+            {'investing_amounts': '1000', 'buy_periods': '5:1', 'sell_periods': '5'},
+            {'investing_amounts': 'abc', 'buy_periods': '5', 'sell_periods': '5'},
+            {'investing_amounts': '1000', 'buy_periods': '1:1000', 'sell_periods': '1:1000'},
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PriceSeriesCacheTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.start = timezone.now() - datetime.timedelta(days=10)
+        for i in range(10):
+            self.create_row(i)
+
+    def create_row(self, day):
+        return StockData.objects.create(
+            symbol='AAPL',
+            time=self.start + datetime.timedelta(days=day),
+            open_price=decimal.Decimal('100.00') + day,
+            close_price=decimal.Decimal('101.00') + day,
+            high_price=decimal.Decimal('102.00') + day,
+            low_price=decimal.Decimal('99.00') + day,
+            volume=decimal.Decimal('1000')
+        )
+
+    def test_repeated_reads_are_served_from_memory(self):
+        """
+        Test that the database is only queried on the first read.
+        """
+        cache = PriceSeriesCache(memory_budget=1024 * 1024)
+        first = cache.get('AAPL')
+        with self.assertNumQueries(0):
+            second = cache.get('AAPL')
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_extend_appends_new_rows(self):
+        """
+        Test that rows written by the ingest are appended to the cached series.
+        """
+        cache = PriceSeriesCache(memory_budget=1024 * 1024)
+        cache.get('AAPL')
+        version = get_data_version('AAPL')
+
+        row = self.create_row(10)
+        cache.extend('AAPL', PriceSeries.from_rows([
+            (row.time, row.open_price, row.high_price, row.low_price, row.close_price, row.volume)
+        ]))
+
+        self.assertGreater(get_data_version('AAPL'), version)
+        with self.assertNumQueries(0):
+            series = cache.get('AAPL')
+        self.assertEqual(len(series), 11)
+        self.assertEqual(series.close_price[-1], 111.0)
+
+    def test_invalidate_reloads_from_database(self):
+        """
+        Test that an invalidated series is read again from the database.
+        """
+        cache = PriceSeriesCache(memory_budget=1024 * 1024)
+        cache.get('AAPL')
+        self.create_row(10)
+        cache.invalidate('AAPL')
+        self.assertEqual(len(cache.get('AAPL')), 11)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """
+        Test that the cache stays within its memory budget.
+        """
+        series_size = load_price_series('AAPL').nbytes
+        cache = PriceSeriesCache(memory_budget=series_size * 2)
+        cache.get('AAPL', start=self.start)
+        cache.get('AAPL', start=self.start + datetime.timedelta(days=1))
+        cache.get('AAPL')
+
+        self.assertLessEqual(cache.bytes_used, series_size * 2)
+
+    def test_extend_stays_within_budget(self):
+        """
+        Test that extending the cached series evicts entries once they outgrow the memory budget.
+        """
+        series_size = load_price_series('AAPL').nbytes
+        cache = PriceSeriesCache(memory_budget=series_size * 2)
+        cache.get('AAPL', start=self.start + datetime.timedelta(days=1))
+        cache.get('AAPL')
+
+        rows = [self.create_row(day) for day in range(10, 20)]
+        cache.extend('AAPL', PriceSeries.from_rows([
+            (row.time, row.open_price, row.high_price, row.low_price, row.close_price, row.volume) for row in rows
+        ]))
+
+        self.assertLessEqual(cache.bytes_used, series_size * 2)
+        self.assertEqual(cache.bytes_used, sum(entry.series.nbytes for entry in cache.entries.values()))
+        self.assertEqual(list(cache.entries), [('AAPL', None, None)])
+        self.assertNotIn(('AAPL', self.start, None), cache.entries)
+        self.assertIn(('AAPL', None, None), cache.entries)
+
+
+class ModelRegistryTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.filepath = os.path.join(self.directory, 'linear_regression_model.pkl')
+        clear_caches()
+
+    def fit_model(self, slope):
+        model = LinearRegression()
+        model.fit(numpy.array([[1.0], [2.0], [3.0]]), numpy.array([1.0, 2.0, 3.0]) * slope)
+        return model
+
+    def test_registry_swaps_in_the_latest_version(self):
+        """
+        Test that the registry keeps the model in memory and picks up a new version.
+        """
+        registry = ModelRegistry(self.filepath, check_interval=0)
+        first_version = save_model(self.fit_model(1), self.filepath)
+        version, model = registry.get()
+        self.assertEqual(version, first_version)
+        self.assertIs(registry.get()[1], model)
+
+        second_version = save_model(self.fit_model(2), self.filepath)
+        version, model = registry.get()
+        self.assertEqual(version, second_version)
+        self.assertAlmostEqual(model.coef_[0], 2.0)
+
+    def test_half_written_models_are_ignored(self):
+        """
+        Test that a pickle still being written is never read.
+        """
+        version = save_model(self.fit_model(1), self.filepath)
+        with open(f"{get_versioned_filepath(self.filepath, '99999999T999999999999Z')}.tmp-1", 'wb') as partial:
+            partial.write(b'partial')
+
+        self.assertEqual(list_model_versions(self.filepath), [version])
+        self.assertEqual(ModelRegistry(self.filepath).get()[0], version)
+
+    def test_old_versions_are_pruned(self):
+        """
+        Test that only the most recent versions are kept on disk.
+        """
+        versions = [save_model(self.fit_model(1), self.filepath) for _ in range(KEEP_VERSIONS + 2)]
+        self.assertEqual(list_model_versions(self.filepath), versions[-KEEP_VERSIONS:])
+
+    def test_prediction_reports_model_version(self):
+        """
+        Test that the prediction response includes the version of the model used.
+        """
+        start = timezone.now() - datetime.timedelta(days=40)
+        for i in range(40):
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=decimal.Decimal('100.00'),
+                close_price=decimal.Decimal('100.00') + i,
+                high_price=decimal.Decimal('110.00'),
+                low_price=decimal.Decimal('90.00'),
+                volume=decimal.Decimal('1000')
+            )
+        version = save_model(self.fit_model(1), self.filepath)
+
+        registry = ModelRegistry(self.filepath)
+        with mock.patch('myapp.forecasting.get_model', lambda symbol: registry.get()):
+            response = self.client.get(reverse('predict_data'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['model_version'], version)
+        self.assertEqual(len(response.json()['predictions']), 30)
+
+        # the model maps a close to itself, so the forecast carries the last close forward
+        predicted_prices = [prediction['predicted_price'] for prediction in response.json()['predictions']]
+        numpy.testing.assert_allclose(predicted_prices, numpy.full(30, 139.0))
+
+
+
+class PredictionReportTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.filepath = os.path.join(self.directory, 'linear_regression_model.pkl')
+        self.registry = ModelRegistry(self.filepath, check_interval=0)
+
+        self.report_cache = ReportCache(4, os.path.join(self.directory, 'reports'))
+        for target, value in [
+            ('myapp.reports.report_cache', self.report_cache),
+            ('myapp.reports.get_model', lambda symbol: self.registry.get()),
+            ('myapp.views.get_model', lambda symbol: self.registry.get()),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        clear_caches()
+
+        start = timezone.now() - datetime.timedelta(days=40)
+        for i in range(40):
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=decimal.Decimal('100.00'),
+                close_price=decimal.Decimal('100.00') + i,
+                high_price=decimal.Decimal('110.00'),
+                low_price=decimal.Decimal('90.00'),
+                volume=decimal.Decimal('1000')
+            )
+
+    def fit_model(self, slope):
+        model = LinearRegression()
+        model.fit(numpy.array([[1.0], [2.0], [3.0]]), numpy.array([1.0, 2.0, 3.0]) * slope)
+        return model
+
+    def test_report_is_rendered_once(self):
+        """
+        Test that the report is drawn once and then served from the cache with an etag.
+        """
+        save_model(self.fit_model(1), self.filepath)
+        with mock.patch('myapp.reports.render_prediction_report', wraps=myapp.reports.render_prediction_report) as render:
+            first = self.client.get(reverse('get_report_for_prediction'))
+            second = self.client.get(reverse('get_report_for_prediction'))
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertTrue(first.content.startswith(b'\x89PNG'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(render.call_count, 1)
+
+    def test_if_none_match_returns_not_modified(self):
+        """
+        Test that a client holding the current report gets a 304 until the model changes.
+        """
+        save_model(self.fit_model(1), self.filepath)
+        etag = self.client.get(reverse('get_report_for_prediction'))['ETag']
+
+        response = self.client.get(reverse('get_report_for_prediction'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        save_model(self.fit_model(2), self.filepath)
+        response = self.client.get(reverse('get_report_for_prediction'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_prerendered_reports_are_read_from_disk(self):
+        """
+        Test that a report pre-rendered after training is served by another worker without drawing.
+        """
+        model = self.fit_model(1)
+        version = save_model(model, self.filepath)
+        prerender_reports(['AAPL', 'MSFT'], version, model)
+
+        # a fresh cache stands for the memory of another worker
+        other_worker = ReportCache(4, self.report_cache.dirpath)
+        with mock.patch('myapp.reports.report_cache', other_worker), \
+                mock.patch('myapp.reports.render_prediction_report') as render:
+            etag, png = get_prediction_report('AAPL')
+            self.assertEqual(get_prediction_report('MSFT')[1], None)
+
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        render.assert_not_called()
+        self.assertEqual(len(os.listdir(os.path.join(self.report_cache.dirpath, 'AAPL'))), 1)
+
+    def test_report_without_data(self):
+        """
+        Test that the report of a symbol without data is not found.
+        """
+        save_model(self.fit_model(1), self.filepath)
+        response = self.client.get(reverse('get_report_for_prediction'), {'symbol': 'MSFT'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_wildcard_only_matches_existing_report(self):
+        """
+        Test that If-None-Match: * returns a 304 for an existing report and a 404 for a symbol without data.
+        """
+        save_model(self.fit_model(1), self.filepath)
+        response = self.client.get(reverse('get_report_for_prediction'), {'symbol': 'MSFT'}, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('get_report_for_prediction'), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], self.client.get(reverse('get_report_for_prediction'))['ETag'])
+
+
+class ForecastingTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        forecast_cache.clear()
+
+        # the last day of AAPL is a friday and the last day of MSFT is the wednesday before good friday
+        for symbol, last_day, first_close in [('AAPL', datetime.datetime(2024, 12, 20, tzinfo=datetime.timezone.utc), 100), ('MSFT', datetime.datetime(2024, 3, 27, tzinfo=datetime.timezone.utc), 200)]:
+            for i in range(5):
+                StockData.objects.create(
+                    symbol=symbol,
+                    time=last_day - datetime.timedelta(days=4 - i),
+                    open_price=decimal.Decimal(first_close),
+                    close_price=decimal.Decimal(first_close + i),
+                    high_price=decimal.Decimal(first_close + 10),
+                    low_price=decimal.Decimal(first_close - 10),
+                    volume=decimal.Decimal('1000')
+                )
+
+        # a model that adds one to the previous close
+        self.model = LinearRegression()
+        self.model.fit(numpy.array([[1.0], [2.0], [3.0]]), numpy.array([2.0, 3.0, 4.0]))
+
+    def test_next_trading_days_skip_weekends_and_holidays(self):
+        """
+        Test that the forecast dates follow the trading calendar of the exchange.
+        """
+        self.assertEqual(next_trading_days(datetime.datetime(2024, 12, 20), 4), [datetime.date(2024, 12, 23), datetime.date(2024, 12, 24), datetime.date(2024, 12, 26), datetime.date(2024, 12, 27)])
+        self.assertEqual(next_trading_days(datetime.datetime(2024, 3, 27), 2), [datetime.date(2024, 3, 28), datetime.date(2024, 4, 1)])
+
+    def test_roll_forecast_feeds_predictions_back(self):
+        """
+        Test that every step predicts from the previous predictions of all the series at once.
+        """
+        forecasts = roll_forecast(numpy.array([[1.0, 2.0], [10.0, 20.0]]), numpy.array([[0.5, 0.5], [0.0, 1.0]]), numpy.array([0.0, 1.0]), 3)
+        numpy.testing.assert_allclose(forecasts, [[1.5, 1.75, 1.625], [21.0, 22.0, 23.0]])
+
+    def test_forecast_many_symbols(self):
+        """
+        Test that the forecast of many symbols rolls every symbol from its own last close.
+        """
+        forecasts = forecast(['AAPL', 'MSFT', 'NVDA'], 3, 'v1', self.model)
+        numpy.testing.assert_allclose(forecasts['AAPL'].prices, [105.0, 106.0, 107.0])
+        numpy.testing.assert_allclose(forecasts['MSFT'].prices, [205.0, 206.0, 207.0])
+        self.assertEqual(forecasts['MSFT'].dates[1], datetime.date(2024, 4, 1))
+        self.assertIsNone(forecasts['NVDA'])
+
+        # a second request is served from the cache until the data or the model changes
+        with mock.patch('myapp.forecasting.get_latest_price_series') as load:
+            self.assertIs(forecast(['AAPL'], 3, 'v1', self.model)['AAPL'], forecasts['AAPL'])
+            load.assert_not_called()
+        bump_data_version('AAPL')
+        self.assertIsNot(forecast(['AAPL'], 3, 'v1', self.model)['AAPL'], forecasts['AAPL'])
+
+    def test_predict_endpoint_takes_symbols_and_horizon(self):
+        """
+        Test that the prediction endpoint forecasts a portfolio over the asked horizon.
+        """
+        with mock.patch('myapp.forecasting.get_model', return_value=('v1', self.model)):
+            response = self.client.get(reverse('predict_data'), {'symbols': 'aapl,MSFT', 'horizon': '5'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['horizon'], 5)
+            self.assertEqual(response.json()['forecasts']['MSFT'][0]['date'], '2024-03-28')
+            self.assertAlmostEqual(response.json()['forecasts']['MSFT'][0]['predicted_price'], 205.0)
+            self.assertEqual(len(response.json()['forecasts']['AAPL']), 5)
+
+            for params in [{'horizon': '0'}, {'horizon': 'abc'}, {'horizon': '1000'}, {'symbols': 'AAPL,$$$'}]:
+                response = self.client.get(reverse('predict_data'), params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IncrementalTrainingTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.start = timezone.now() - datetime.timedelta(days=200)
+        for i in range(100, 150):
+            self.create_row(i)
+
+    def create_row(self, day):
+        return StockData.objects.create(
+            symbol='AAPL',
+            time=self.start + datetime.timedelta(days=day),
+            open_price=decimal.Decimal('100.00'),
+            close_price=decimal.Decimal(100 + (day * 17) % 13) + decimal.Decimal(day) / 8,
+            high_price=decimal.Decimal('110.00'),
+            low_price=decimal.Decimal('90.00'),
+            volume=decimal.Decimal('1000')
+        )
+
+    def assert_matches_full_fit(self, model):
+        closes = numpy.array(StockData.objects.filter(symbol='AAPL').order_by('time').values_list('close_price', flat=True), dtype=float)
+        expected = LinearRegression().fit(closes[:-1].reshape(-1, 1), closes[1:])
+        self.assertAlmostEqual(model.intercept_, expected.intercept_, places=6)
+        numpy.testing.assert_allclose(model.coef_, expected.coef_)
+        numpy.testing.assert_allclose(model.predict([[105.0]]), expected.predict([[105.0]]))
+
+    def test_statistics_match_least_squares(self):
+        """
+        Test that the model solved from the statistics is the least squares fit, whatever the chunking.
+        """
+        statistics = refit_statistics('AAPL')
+        self.assertEqual(statistics.count, 49)
+        self.assert_matches_full_fit(statistics.to_model())
+
+        chunked = RegressionStatistics()
+        for times, closes in iter_close_chunks('AAPL', chunk_size=7):
+            chunked.update(times, closes)
+        numpy.testing.assert_allclose(chunked.xtx, statistics.xtx)
+        numpy.testing.assert_allclose(chunked.xty, statistics.xty)
+
+    def test_update_only_reads_new_rows(self):
+        """
+        Test that an update adds the new rows to the saved statistics without rescanning the history.
+        """
+        statistics = update_statistics('AAPL')
+        for i in range(150, 155):
+            self.create_row(i)
+
+        with mock.patch('myapp.training.iter_close_chunks', wraps=iter_close_chunks) as chunks:
+            statistics = update_statistics('AAPL')
+        chunks.assert_called_once_with('AAPL', since=statistics.last_time - datetime.timedelta(days=5))
+        self.assertEqual(statistics.count, 54)
+        self.assert_matches_full_fit(load_statistics('AAPL').to_model())
+
+    def test_backfilled_rows_trigger_a_refit(self):
+        """
+        Test that rows older than the statistics cause a full refit.
+        """
+        update_statistics('AAPL')
+        for i in range(90, 100):
+            self.create_row(i)
+
+        statistics = update_statistics('AAPL')
+        self.assertEqual(statistics.count, 59)
+        self.assert_matches_full_fit(statistics.to_model())
+
+    def test_rewritten_rows_trigger_a_refit(self):
+        """
+        Test that days the ingest fills into a gap or rewrites with another close cause a full refit.
+        """
+        StockData.objects.filter(symbol='AAPL', time=self.start + datetime.timedelta(days=120)).delete()
+        update_statistics('AAPL')
+
+        # a missing day filled in by the upsert
+        row = self.create_row(120)
+        row.delete()
+        ingest_stock_data('AAPL', [(row.time, row.open_price, row.high_price, row.low_price, row.close_price, row.volume)])
+        statistics = update_statistics('AAPL')
+        self.assertEqual(statistics.count, 49)
+        self.assert_matches_full_fit(statistics.to_model())
+
+        # a close corrected in place
+        row = StockData.objects.get(symbol='AAPL', time=self.start + datetime.timedelta(days=130))
+        ingest_stock_data('AAPL', [(row.time, row.open_price, row.high_price, row.low_price, row.close_price + decimal.Decimal('0.0001'), row.volume)])
+        with mock.patch('myapp.training.refit_statistics', wraps=refit_statistics) as refit:
+            statistics = update_statistics('AAPL')
+        refit.assert_called_once_with('AAPL')
+        self.assert_matches_full_fit(statistics.to_model())
+
+        # appended days and nothing at all are added without a refit, each update
+        # only looks up backfilled rows and reads the new ones
+        ingest_stock_data('AAPL', [(self.start + datetime.timedelta(days=150), '100', '110', '90', '104.5', '1000')])
+        with mock.patch('myapp.training.refit_statistics') as refit, self.assertNumQueries(4):
+            self.assertEqual(update_statistics('AAPL').count, 50)
+            update_statistics('AAPL')
+        refit.assert_not_called()
+
+    def test_train_task_saves_the_solved_model(self):
+        """
+        Test that the nightly training saves the model solved from the statistics.
+        """
+        with mock.patch('myapp.training.save_model', return_value='v1') as save, \
+                mock.patch('myapp.tasks.prerender_reports') as prerender:
+            self.assertEqual(train_linear_regression_model()['trained'], 1)
+            self.assertEqual(train_linear_regression_model(full=True)['trained'], 1)
+
+        self.assert_matches_full_fit(save.call_args[0][0])
+        prerender.assert_called_with(['AAPL'], 'v1', save.call_args[0][0])
+
+
+class TrainingPipelineTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('myapp.model_registry.symbol_registries', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        start = timezone.now() - datetime.timedelta(days=60)
+        for symbol, slope in [('AAPL', 1), ('MSFT', 3)]:
+            for i in range(60):
+                StockData.objects.create(
+                    symbol=symbol,
+                    time=start + datetime.timedelta(days=i),
+                    open_price=decimal.Decimal('100.00'),
+                    close_price=decimal.Decimal(100 + slope * i + (i * 7) % 5),
+                    high_price=decimal.Decimal('500.00'),
+                    low_price=decimal.Decimal('90.00'),
+                    volume=decimal.Decimal('1000')
+                )
+
+    def assert_trained(self, summary, models):
+        self.assertEqual((summary['symbols'], summary['trained'], summary['failed']), (3, 2, 1))
+        results = {result['symbol']: result for result in summary['results']}
+        self.assertIn('error', results['NVDA'])
+
+        for symbol in ['AAPL', 'MSFT']:
+            closes = numpy.array(StockData.objects.filter(symbol=symbol).order_by('time').values_list('close_price', flat=True), dtype=float)
+            expected = LinearRegression().fit(closes[:-1].reshape(-1, 1), closes[1:])
+            version, model = models[symbol]
+            self.assertEqual(results[symbol]['version'], version)
+            self.assertEqual(results[symbol]['rows'], 59)
+            self.assertAlmostEqual(results[symbol]['r_squared'], expected.score(closes[:-1].reshape(-1, 1), closes[1:]))
+            numpy.testing.assert_allclose(model.coef_, expected.coef_)
+
+            # every symbol has its own versioned artifact served by its registry
+            self.assertEqual(get_model(symbol)[0], version)
+            numpy.testing.assert_allclose(get_model(symbol)[1].coef_, expected.coef_)
+
+        with open(os.path.join(self.directory, 'symbol_models', 'training_summary.json')) as file:
+            self.assertEqual(json.load(file)['trained'], 2)
+
+    def test_train_models_inline(self):
+        """
+        Test that every symbol gets its own model and the job summary records the metrics.
+        """
+        self.assert_trained(*train_models(['AAPL', 'MSFT', 'NVDA'], max_workers=1))
+
+    def test_train_models_with_process_pool(self):
+        """
+        Test that the models trained on a process pool are the same as the ones trained inline.
+        """
+        self.assert_trained(*train_models(['AAPL', 'MSFT', 'NVDA'], max_workers=2))
+
+    def test_symbols_without_a_model_have_no_forecast(self):
+        """
+        Test that a symbol without a model of its own is not served another model and leaves no registry behind.
+        """
+        train_models(['AAPL'], max_workers=1)
+        self.assertIsNone(get_model('MSFT'))
+        self.assertNotIn('MSFT', myapp.model_registry.symbol_registries)
+
+        forecasts = forecast(['AAPL', 'MSFT'], 5)
+        self.assertEqual(list(forecasts), ['AAPL', 'MSFT'])
+        self.assertIsNotNone(forecasts['AAPL'])
+        self.assertIsNone(forecasts['MSFT'])
+
+        response = self.client.get(reverse('predict_data'), {'symbol': 'MSFT'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('get_report_for_prediction'), {'symbol': 'MSFT'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(list(myapp.model_registry.symbol_registries), ['AAPL'])
+
+        # a model trained later is picked up
+        train_models(['MSFT'], max_workers=1)
+        self.assertIsNotNone(get_model('MSFT'))
+
+
+class IngestTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+    def daily_data(self, days, close):
+        return {
+            f'2024-01-{day:02d}': {
+                '1. open': '100.0000',
+                '2. high': '110.0000',
+                '3. low': '90.0000',
+                '4. close': close,
+                '5. volume': '12345',
+            }
+            for day in days
+        }
+
+    def test_parse_daily_time_series(self):
+        """
+        Test that the Alpha Vantage payload is converted to rows ordered by time.
+        """
+        rows = parse_daily_time_series(self.daily_data([3, 1, 2], '105.0000'), since=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual([row[0].day for row in rows], [2, 3])
+        self.assertEqual(rows[0][4], '105.0000')
+
+    def test_ingest_is_idempotent(self):
+        """
+        Test that ingesting the same days again updates the rows instead of failing.
+        """
+        stats = ingest_stock_data('AAPL', parse_daily_time_series(self.daily_data(range(1, 11), '105.0000')))
+        self.assertEqual(stats['rows'], 10)
+        self.assertIn('rows_per_second', stats)
+
+        ingest_stock_data('AAPL', parse_daily_time_series(self.daily_data(range(5, 16), '106.0000')))
+        self.assertEqual(StockData.objects.filter(symbol='AAPL').count(), 15)
+        self.assertEqual(StockData.objects.get(symbol='AAPL', time=datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)).close_price, decimal.Decimal('106.0000'))
+
+    def test_ingest_updates_cached_series(self):
+        """
+        Test that the cached price series sees the ingested rows.
+        """
+        ingest_stock_data('AAPL', parse_daily_time_series(self.daily_data(range(1, 6), '105.0000')))
+        self.assertEqual(len(price_cache.get('AAPL')), 5)
+
+        ingest_stock_data('AAPL', parse_daily_time_series(self.daily_data(range(6, 8), '105.0000')))
+        with self.assertNumQueries(0):
+            self.assertEqual(len(price_cache.get('AAPL')), 7)
+
+
+class SnapshotTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        forecast_cache.clear()
+
+        # two and a half years of days so the date index has several entries
+        self.start = datetime.datetime(2022, 7, 1, tzinfo=datetime.timezone.utc)
+        for i in range(900):
+            StockData.objects.create(
+                symbol='AAPL',
+                time=self.start + datetime.timedelta(days=i),
+                open_price=decimal.Decimal(100 + (i * 37) % 23),
+                close_price=decimal.Decimal(100 + (i * 13) % 29) + decimal.Decimal('0.2500'),
+                high_price=decimal.Decimal('200.00'),
+                low_price=decimal.Decimal('50.00'),
+                volume=decimal.Decimal(1000 + i)
+            )
+
+    def assert_same_series(self, actual, expected):
+        for actual_column, expected_column in zip(actual.columns(), expected.columns()):
+            numpy.testing.assert_array_equal(actual_column, expected_column)
+
+    def test_snapshot_round_trip(self):
+        """
+        Test that a snapshot holds the same history as the database, memory mapped.
+        """
+        meta = export_snapshot('AAPL')
+        self.assertEqual(meta['rows'], 900)
+        self.assertEqual(meta['index'], {'2022': 0, '2023': 184, '2024': 549})
+
+        series = load_snapshot_series('AAPL')
+        self.assert_same_series(series, load_price_series('AAPL'))
+        self.assertFalse(series.close_price.flags['OWNDATA'])
+        self.assertEqual(len(load_snapshot_series('MSFT')), 0)
+
+    def test_snapshot_ranges(self):
+        """
+        Test that ranges and the latest rows of a snapshot match the database.
+        """
+        export_snapshot('AAPL')
+        for start, end in [(datetime.datetime(2023, 3, 5, 12, tzinfo=datetime.timezone.utc), datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc)), (None, self.start + datetime.timedelta(days=10)), (self.start + datetime.timedelta(days=899), None), (datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc), None)]:
+            self.assert_same_series(load_snapshot_series('AAPL', start, end), load_price_series('AAPL', start, end))
+        self.assert_same_series(load_latest_snapshot_series('AAPL', 30), load_latest_price_series('AAPL', 30))
+
+    def test_endpoints_run_without_database(self):
+        """
+        Test that the backtest and the prediction are served from the snapshot without any query.
+        """
+        export_snapshot('AAPL')
+        expected = self.client.get(reverse('back_test'), {'investing_amount': '10000', 'buy_period': '5', 'sell_period': '10'}).json()
+        model = LinearRegression().fit(numpy.array([[1.0], [2.0]]), numpy.array([1.0, 2.0]))
+
+        clear_caches()
+        with self.settings(PRICE_SOURCE='snapshot'), self.assertNumQueries(0), \
+                mock.patch('myapp.forecasting.get_model', return_value=('v1', model)):
+            response = self.client.get(reverse('back_test'), {'investing_amount': '10000', 'buy_period': '5', 'sell_period': '10'})
+            self.assertEqual(response.json(), expected)
+            response = self.client.get(reverse('predict_data'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_export_replaces_the_previous_snapshot(self):
+        """
+        Test that a new export is picked up by the cache and the old generation is removed.
+        """
+        export_snapshot('AAPL')
+        with self.settings(PRICE_SOURCE='snapshot'):
+            self.assertEqual(len(price_cache.get('AAPL')), 900)
+            StockData.objects.filter(time__gte=self.start + datetime.timedelta(days=800)).delete()
+            export_snapshot('AAPL')
+            self.assertEqual(len(price_cache.get('AAPL')), 800)
+        self.assertEqual(len([name for name in os.listdir(os.path.join(self.directory, 'snapshots', 'AAPL')) if name != 'current']), 1)
+
+
+class MultiSymbolTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        start = timezone.now() - datetime.timedelta(days=30)
+        for symbol, price in [('AAPL', 100), ('MSFT', 300)]:
+            for i in range(30):
+                StockData.objects.create(
+                    symbol=symbol,
+                    time=start + datetime.timedelta(days=i),
+                    open_price=decimal.Decimal(price + i % 3),
+                    close_price=decimal.Decimal(price + (i * 2) % 5),
+                    high_price=decimal.Decimal(price + 10),
+                    low_price=decimal.Decimal(price - 10),
+                    volume=decimal.Decimal('1000')
+                )
+
+    def test_series_are_kept_per_symbol(self):
+        """
+        Test that the price series of a symbol only holds its own rows.
+        """
+        self.assertEqual(len(load_price_series('MSFT')), 30)
+        self.assertTrue((load_price_series('MSFT').close_price >= 300).all())
+        self.assertEqual(len(load_price_series('TSLA')), 0)
+
+    def test_back_test_takes_symbol(self):
+        """
+        Test that the backtest runs on the requested symbol.
+        """
+        url = reverse('back_test')
+        params = {
+            'investing_amount': '10000',
+            'sell_period': '5',
+            'buy_period': '10',
+            'symbol': 'msft',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = run_backtest(load_price_series('MSFT'), 10000, 10, 5)
+        self.assertEqual(response.data['events'], expected['events'])
+
+    def test_invalid_symbol(self):
+        """
+        Test that the API returns 400 Bad Request for a symbol that is not a ticker.
+        """
+        url = reverse('back_test')
+        params = {
+            'investing_amount': '10000',
+            'sell_period': '5',
+            'buy_period': '10',
+            'symbol': 'DROP TABLE',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # symbols become directory names, so they may not walk out of them
+        for symbol in ['.', '..', '-X', '.HIDDEN']:
+            response = self.client.get(url, {**params, 'symbol': symbol})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('predict_data'), {'symbols': 'AAPL,..'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_fetches_every_symbol(self):
+        """
+        Test that the daily update fetches all the symbols at once and only writes new days.
+        """
+        day = (timezone.now() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+        payload = {day: {'1. open': '1.0', '2. high': '1.0', '3. low': '1.0', '4. close': '1.0', '5. volume': '10'}}
+
+        with mock.patch('myapp.tasks.fetch_many', return_value={'AAPL': payload, 'MSFT': payload, 'TSLA': payload}) as fetch_many:
+            update_latest_stock_data(['AAPL', 'MSFT', 'TSLA'])
+
+        fetch_many.assert_called_once_with({'AAPL': 'compact', 'MSFT': 'compact', 'TSLA': 'full'})
+        self.assertEqual(StockData.objects.filter(symbol='AAPL').count(), 31)
+        self.assertEqual(StockData.objects.filter(symbol='TSLA').count(), 1)
+
+    def test_rate_limiter_spaces_calls(self):
+        """
+        Test that the rate limiter never lets calls start faster than the quota.
+        """
+        # a fake clock that only moves when the limiter sleeps, so the test does not depend on the machine
+        clock = mock.Mock()
+        clock.monotonic.side_effect = lambda: clock.now
+        clock.sleep.side_effect = lambda seconds: setattr(clock, 'now', clock.now + seconds)
+        clock.now = 100.0
+        with mock.patch('myapp.market_data.time', clock):
+            limiter = RateLimiter(requests_per_minute=6000)
+            starts = []
+            for _ in range(5):
+                limiter.wait()
+                starts.append(clock.now)
+
+        # the first call starts right away, the next ones 10ms after each other
+        numpy.testing.assert_allclose(numpy.diff([100.0] + starts), [0, 0.01, 0.01, 0.01, 0.01], atol=1e-9)
+
+
+class BackTestStreamingTestCase(APITestCase):
+
+    def setUp(self):
+        clear_caches()
+        start = timezone.now() - datetime.timedelta(days=60)
+        for i in range(60):
+            base = decimal.Decimal(100 + (i * 37) % 23)
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=base + decimal.Decimal('0.5000'),
+                close_price=base + decimal.Decimal((i * 13) % 5) - 2,
+                high_price=base + 5,
+                low_price=base - 5,
+                volume=decimal.Decimal('1000')
+            )
+
+    def test_stream_ndjson_events(self):
+        """
+        Test that the streamed events match the events of the regular response.
+        """
+        url = reverse('back_test')
+        params = {
+            'investing_amount': '10000',
+            'sell_period': '5',
+            'buy_period': '10',
+        }
+        expected = self.client.get(url, params).data
+        response = self.client.get(url, {**params, 'stream': 'ndjson'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(response.streaming)
+        events = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        summary = events.pop()
+        self.assertEqual(summary['type'], 'summary')
+        self.assertAlmostEqual(summary['profit'], float(expected['profit']))
+        self.assertEqual(len(events), len(expected['events']))
+        for event, text in zip(events, expected['events']):
+            self.assertIn(event['type'], ['buy', 'sell'])
+            self.assertTrue(text.startswith(f"{'Bought' if event['type'] == 'buy' else 'Sold'} {event['qty']} stocks"))
+            self.assertGreaterEqual(event['cash'], 0)
+
+    def test_stream_without_trades(self):
+        """
+        Test that a stream without any trade only holds the summary.
+        """
+        events = list(iter_backtest_events(load_price_series('AAPL'), 0, 5, 10))
+        self.assertEqual(events, [{'type': 'summary', 'trades': 0, 'profit': 0.0}])
+
+    def test_unknown_stream_format(self):
+        """
+        Test that the API returns 400 Bad Request for an unknown streaming format.
+        """
+        url = reverse('back_test')
+        params = {
+            'investing_amount': '10000',
+            'sell_period': '5',
+            'buy_period': '10',
+            'stream': 'xml',
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncViewsTestCase(TemporaryStateMixin, TransactionTestCase):
+    # the async views read the database from other threads, which only see committed rows
+
+    def setUp(self):
+        super().setUp()
+        self.filepath = os.path.join(self.directory, 'linear_regression_model.pkl')
+        self.registry = ModelRegistry(self.filepath, check_interval=0)
+        model = LinearRegression()
+        model.fit(numpy.array([[1.0], [2.0], [3.0]]), numpy.array([2.0, 3.0, 4.0]))
+        save_model(model, self.filepath)
+
+        # a single pooled thread, whose connection is closed before the test database goes away
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(lambda: executor.submit(connections.close_all).result())
+        for target, value in [
+            ('myapp.async_db.database_executor', executor),
+            ('myapp.reports.report_cache', ReportCache(4, os.path.join(self.directory, 'reports'))),
+            ('myapp.reports.get_model', lambda symbol: self.registry.get()),
+            ('myapp.views.get_model', lambda symbol: self.registry.get()),
+            ('myapp.forecasting.get_model', lambda symbol: self.registry.get()),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        clear_caches()
+        forecast_cache.clear()
+
+        start = timezone.now() - datetime.timedelta(days=60)
+        for i in range(60):
+            base = decimal.Decimal(100 + (i * 37) % 23)
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=base + decimal.Decimal('0.5000'),
+                close_price=base + decimal.Decimal((i * 13) % 5) - 2,
+                high_price=base + 5,
+                low_price=base - 5,
+                volume=decimal.Decimal('1000')
+            )
+
+    async def test_back_test_matches_sync_view(self):
+        """
+        Test that the async back test returns the same result as the synchronous one.
+        """
+        params = {'investing_amount': '10000', 'sell_period': '5', 'buy_period': '10'}
+        expected = await sync_to_async(self.client.get)(reverse('back_test'), params)
+        response = await self.async_client.get(reverse('back_test_async'), params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    async def test_back_test_stream(self):
+        """
+        Test that the async back test streams the same events as the synchronous one.
+        """
+        params = {'investing_amount': '10000', 'sell_period': '5', 'buy_period': '10', 'stream': 'ndjson'}
+        expected = await sync_to_async(self.client.get)(reverse('back_test'), params)
+        response = await self.async_client.get(reverse('back_test_async'), params)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content, b''.join(expected.streaming_content))
+
+    async def test_predict_matches_sync_view(self):
+        """
+        Test that the async prediction returns the same forecast as the synchronous one.
+        """
+        for params in [{}, {'symbols': 'AAPL,MSFT', 'horizon': '5'}]:
+            expected = await sync_to_async(self.client.get)(reverse('predict_data'), params)
+            response = await self.async_client.get(reverse('predict_data_async'), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+        response = await self.async_client.get(reverse('predict_data_async'), {'symbol': 'MSFT'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_report_etag(self):
+        """
+        Test that the async report is served with an etag and honours If-None-Match.
+        """
+        response = await self.async_client.get(reverse('get_report_for_prediction_async'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+        response = await self.async_client.get(reverse('get_report_for_prediction_async'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_invalid_params(self):
+        """
+        Test that the async endpoints return 400 Bad Request for invalid parameters.
+        """
+        for name, params in [
+            ('back_test_async', {'investing_amount': '10000', 'sell_period': '0', 'buy_period': '10'}),
+            ('back_test_async', {'investing_amount': 'abc', 'sell_period': '5', 'buy_period': '10'}),
+            ('predict_data_async', {'horizon': '0'}),
+            ('get_report_for_prediction_async', {'symbol': 'A$PL'}),
+        ]:
+            response = await self.async_client.get(reverse(name), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobRunnerTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+
+    def patch_jobs(self, **jobs):
+        patcher = mock.patch.dict('myapp.background_task.JOBS', jobs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_is_recorded(self):
+        """
+        Test that the outcome, the duration and the summary of a run are recorded.
+        """
+        self.patch_jobs(train=mock.Mock(return_value={'trained': 1}))
+        run = run_job('train')
+
+        self.assertEqual(run.status, JobRun.SUCCEEDED)
+        self.assertEqual(run.details, {'trained': 1})
+        self.assertGreaterEqual(run.seconds, 0)
+        self.assertEqual(JobRun.objects.filter(name='train').count(), 1)
+
+    def test_failed_ingest_skips_training(self):
+        """
+        Test that a failed ingest is recorded with its error and the models are not retrained.
+        """
+        train = mock.Mock()
+        self.patch_jobs(ingest=mock.Mock(side_effect=RuntimeError('quota exceeded')), train=train)
+        runs = run_daily_jobs()
+
+        self.assertEqual([run.name for run in runs], ['ingest'])
+        self.assertEqual(runs[0].status, JobRun.FAILED)
+        self.assertEqual(runs[0].error, 'quota exceeded')
+        train.assert_not_called()
+
+    def test_training_follows_ingest(self):
+        """
+        Test that the daily jobs ingest first and then retrain.
+        """
+        calls = []
+        self.patch_jobs(ingest=lambda: calls.append('ingest'), train=lambda: calls.append('train'))
+        runs = run_daily_jobs()
+
+        self.assertEqual(calls, ['ingest', 'train'])
+        self.assertEqual([run.status for run in runs], [JobRun.SUCCEEDED, JobRun.SUCCEEDED])
+
+    def test_locked_job_is_skipped(self):
+        """
+        Test that a job already running in another worker is skipped.
+        """
+        train = mock.Mock()
+        self.patch_jobs(train=train)
+        with job_lock('train') as acquired:
+            self.assertTrue(acquired)
+            run = run_job('train')
+
+        self.assertEqual(run.status, JobRun.SKIPPED)
+        train.assert_not_called()
+        self.assertEqual(run_job('train').status, JobRun.SUCCEEDED)
+
+    def test_scheduler_uses_cron_schedule(self):
+        """
+        Test that the daily jobs are scheduled with the configured crontab.
+        """
+        with self.settings(JOB_SCHEDULE='30 18 * * 1-5', JOB_TIMEZONE='America/New_York'):
+            job = create_scheduler().get_jobs()[0]
+
+        self.assertIs(job.func, run_daily_jobs)
+        fire_times = []
+        now = datetime.datetime(2024, 10, 19, tzinfo=datetime.timezone.utc)
+        for i in range(5):
+            now = job.trigger.get_next_fire_time(None, now + datetime.timedelta(minutes=1))
+            fire_times.append(now.strftime('%a %H:%M'))
+        self.assertEqual(fire_times, ['Mon 18:30', 'Tue 18:30', 'Wed 18:30', 'Thu 18:30', 'Fri 18:30'])
+
+    def test_cron_day_of_week_steps_and_ranges(self):
+        """
+        Test that the steps and ranges of the day of week field select the same days as crontab.
+        """
+        def fire_days(expression):
+            trigger = cron_trigger(expression, 'UTC')
+            now = datetime.datetime(2024, 10, 19, tzinfo=datetime.timezone.utc)
+            days = []
+            for i in range(4):
+                now = trigger.get_next_fire_time(None, now + datetime.timedelta(minutes=1))
+                days.append(now.strftime('%a'))
+            return days
+
+        self.assertEqual(fire_days('0 0 * * */2'), ['Sun', 'Tue', 'Thu', 'Sat'])
+        self.assertEqual(fire_days('0 0 * * 1/3'), ['Mon', 'Thu', 'Mon', 'Thu'])
+        self.assertEqual(fire_days('0 0 * * 5-7'), ['Sun', 'Fri', 'Sat', 'Sun'])
+        self.assertEqual(fire_days('0 0 * * 0,3'), ['Sun', 'Wed', 'Sun', 'Wed'])
+        self.assertEqual(fire_days('0 0 * * sat-sun'), ['Sun', 'Sat', 'Sun', 'Sat'])
+        with self.assertRaises(ValueError):
+            cron_trigger('0 0 * * 3-1', 'UTC')
+
+
+class BackTestCacheTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        start = timezone.now() - datetime.timedelta(days=60)
+        for i in range(60):
+            base = decimal.Decimal(100 + (i * 37) % 23)
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=base + decimal.Decimal('0.5000'),
+                close_price=base + decimal.Decimal((i * 13) % 5) - 2,
+                high_price=base + 5,
+                low_price=base - 5,
+                volume=decimal.Decimal('1000')
+            )
+
+    def test_repeated_back_test_is_cached(self):
+        """
+        Test that a repeated back test is answered without loading the series or running the engine.
+        """
+        params = {'investing_amount': '10000', 'sell_period': '5', 'buy_period': '10'}
+        first = self.client.get(reverse('back_test'), params)
+        with mock.patch('myapp.backtest_cache.get_price_series_with_warmup') as get_series, \
+                mock.patch('myapp.backtest_cache.run_backtest') as engine, \
+                self.assertNumQueries(0):
+            second = self.client.get(reverse('back_test'), params)
+
+        self.assertEqual(second.data, first.data)
+        get_series.assert_not_called()
+        engine.assert_not_called()
+
+        stats = self.client.get(reverse('back_test_cache_stats')).data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_cache_is_keyed_by_parameters(self):
+        """
+        Test that back tests with other parameters or symbols are not served each other's result.
+        """
+        result = get_backtest_result('AAPL', 10000, 10, 5)
+        self.assertNotEqual(get_backtest_result('AAPL', 10000, 3, 5), result)
+        self.assertEqual(get_backtest_result('MSFT', 10000, 10, 5), {'profit': 0, 'events': []})
+
+    def test_ingest_invalidates_cached_results(self):
+        """
+        Test that new rows written by an ingest are taken into account by the next back test.
+        """
+        before = get_backtest_result('AAPL', 10000, 10, 5)
+        latest = StockData.objects.order_by('-time').first()
+        ingest_stock_data('AAPL', [
+            (latest.time + datetime.timedelta(days=1 + i), '200.0000', '260.0000', '140.0000', str(250 if i % 3 else 150), '1000')
+            for i in range(20)
+        ])
+
+        after = get_backtest_result('AAPL', 10000, 10, 5)
+        self.assertNotEqual(after, before)
+        self.assertEqual(after, run_backtest(load_price_series('AAPL'), 10000, 10, 5))
+
+
+class BackTestRangeTestCase(TemporaryStateMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+        self.start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        ingest_stock_data('AAPL', [
+            (self.start + datetime.timedelta(days=i), str(100 + (i * 37) % 23), '200', '50', str(100 + (i * 13) % 29), '1000')
+            for i in range(200)
+        ])
+
+    def test_range_matches_full_history(self):
+        """
+        Test that a back test over a range trades like the full history would from the start of the range.
+        """
+        start = self.start + datetime.timedelta(days=100)
+        end = self.start + datetime.timedelta(days=150)
+        series, first_row = get_price_series_with_warmup('AAPL', start, end, 20)
+
+        # only the warm-up and the range are loaded
+        self.assertEqual((len(series), first_row), (71, 20))
+
+        history = load_price_series('AAPL', None, end)
+        expected = run_backtest(history, 10000, 20, 5, first_row=100)
+        self.assertEqual(run_backtest(series, 10000, 20, 5, first_row), expected)
+        self.assertTrue(expected['events'])
+        self.assertTrue(all('2024-04-10' <= event.split(' on ')[1][:10] <= '2024-05-30' for event in expected['events']))
+
+    def test_range_query_parameters(self):
+        """
+        Test that the API back tests the given dates and rejects invalid ranges.
+        """
+        url = reverse('back_test')
+        params = {'investing_amount': '10000', 'sell_period': '5', 'buy_period': '20'}
+        response = self.client.get(url, {**params, 'start': '2024-04-10', 'end': '2024-05-30'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, get_backtest_result(
+            'AAPL', 10000, 20, 5,
+            self.start + datetime.timedelta(days=100),
+            self.start + datetime.timedelta(days=150, hours=12),
+        ))
+        self.assertNotEqual(response.data, self.client.get(url, params).data)
+
+        for invalid in [{'start': '2024-13-01'}, {'end': 'yesterday'}, {'start': '2024-05-30', 'end': '2024-04-10'}]:
+            response = self.client.get(url, {**params, **invalid})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_snapshot_warmup_matches_database(self):
+        """
+        Test that the warm-up read from a snapshot starts at the same row as the one read from the database.
+        """
+        export_snapshot('AAPL')
+        start = self.start + datetime.timedelta(days=100)
+        expected = get_price_series_with_warmup('AAPL', start, None, 30)
+        clear_caches()
+        with self.settings(PRICE_SOURCE='snapshot'), self.assertNumQueries(0):
+            series, first_row = get_price_series_with_warmup('AAPL', start, None, 30)
+
+        self.assertEqual(first_row, expected[1])
+        numpy.testing.assert_array_equal(series.time, expected[0].time)
+
+
+class BenchmarkTestCase(TestCase):
+
+    def test_benchmark_times_every_path(self):
+        """
+        Test that every path is timed per stage and the synthetic rows are removed afterwards.
+        """
+        get_backtest_cache().set('backtest:AAPL:shared', 'result')
+        with self.settings(TRAINING_MAX_WORKERS=1):
+            report = run_benchmarks(rows=300, symbol_count=2, repeat=1)
+
+        self.assertEqual(report['environment']['database'], 'sqlite')
+        self.assertEqual(set(report['results']), set(PATHS) | {'load'})
+        self.assertEqual(set(report['results']['back_test']), {'query', 'compute', 'serialize', 'end_to_end', 'end_to_end_cached'})
+        self.assertIn('render', report['results']['get_report_for_prediction'])
+        self.assertEqual(report['results']['back_test']['end_to_end']['runs'], 2)
+        json.dumps(report)
+        self.assertFalse(StockData.objects.filter(symbol__startswith='BENCH').exists())
+        # the back tests were cached apart, the shared results are still there
+        self.assertEqual(get_backtest_cache().get('backtest:AAPL:shared'), 'result')
+
+    def test_generated_bars_are_consistent(self):
+        """
+        Test that the synthetic bars are ordered in time with the high and the low around the open and the close.
+        """
+        start = datetime.datetime(2000, 1, 3, tzinfo=datetime.timezone.utc)
+        chunks = list(generate_bars(250, 0, start, datetime.timedelta(days=1), chunk_size=100))
+        rows = [row for chunk in chunks for row in chunk]
+
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+        self.assertEqual(rows[-1][0], start + datetime.timedelta(days=249))
+        for bar_time, open_price, high_price, low_price, close_price, volume in rows:
+            self.assertLessEqual(float(low_price), min(float(open_price), float(close_price)))
+            self.assertGreaterEqual(float(high_price), max(float(open_price), float(close_price)))
+
+
+class StrategyTestCase(APITestCase):
+
+    def setUp(self):
+        clear_caches()
+        generator = numpy.random.default_rng(7)
+        self.close = 1000000 + numpy.cumsum(generator.integers(-20000, 20000, 300))
+        self.open = self.close + generator.integers(-5000, 5000, 300)
+        self.high = numpy.maximum(self.open, self.close) + generator.integers(0, 5000, 300)
+        self.low = numpy.minimum(self.open, self.close) - generator.integers(0, 5000, 300)
+
+    def indicators(self):
+        return Indicators(self.open, self.high, self.low, self.close)
+
+    def sma(self, row, period):
+        window = self.close[max(0, row - period):row + 1]
+        return sum(window) / len(window)
+
+    def test_sma_signals(self):
+        """
+        Test that the moving average strategy compares the prices with the average of the window.
+        """
+        buy_signal, sell_signal = STRATEGIES['sma'](self.indicators(), 10, 3)
+        for row in range(300):
+            self.assertEqual(buy_signal[row], self.open[row] < self.sma(row, 10))
+            self.assertEqual(sell_signal[row], self.close[row] > self.sma(row, 3))
+
+    def test_ema_signals(self):
+        """
+        Test that the exponential strategy compares the prices with the recursive average.
+        """
+        alpha = 2 / 12
+        ema = [float(self.close[0])]
+        for close in self.close[1:]:
+            ema.append(alpha * close + (1 - alpha) * ema[-1])
+
+        buy_signal, sell_signal = STRATEGIES['ema'](self.indicators(), 10, 10)
+        numpy.testing.assert_array_equal(buy_signal, self.open < numpy.array(ema))
+        numpy.testing.assert_array_equal(sell_signal, self.close > numpy.array(ema))
+
+    def test_crossover_signals(self):
+        """
+        Test that the crossover strategy buys on the averages of the previous day.
+        """
+        buy_signal, sell_signal = STRATEGIES['crossover'](self.indicators(), 5, 20)
+        self.assertFalse(buy_signal[0])
+        for row in range(1, 300):
+            self.assertEqual(buy_signal[row], self.sma(row - 1, 5) > self.sma(row - 1, 20))
+            self.assertEqual(sell_signal[row], self.sma(row, 5) < self.sma(row, 20))
+
+    def test_breakout_signals(self):
+        """
+        Test that the breakout strategy compares with the extremes of the previous days only.
+        """
+        buy_signal, sell_signal = STRATEGIES['breakout'](self.indicators(), 20, 10)
+        self.assertFalse(buy_signal[0] or sell_signal[0])
+        for row in range(1, 300):
+            self.assertEqual(buy_signal[row], self.open[row] > max(self.high[max(0, row - 20):row]))
+            self.assertEqual(sell_signal[row], self.close[row] < min(self.low[max(0, row - 10):row]))
+
+    def test_indicators_are_shared(self):
+        """
+        Test that the strategies reuse the indicators already computed on the same series.
+        """
+        indicators = self.indicators()
+        with mock.patch('myapp.indicators.np.cumsum', wraps=numpy.cumsum) as cumsum:
+            STRATEGIES['sma'](indicators, 10, 5)
+            STRATEGIES['crossover'](indicators, 5, 10)
+        self.assertEqual(cumsum.call_count, 1)
+
+    def test_strategy_parameter(self):
+        """
+        Test that the API back tests the requested strategy and rejects unknown ones.
+        """
+        start = timezone.now() - datetime.timedelta(days=300)
+        for i in range(300):
+            StockData.objects.create(
+                symbol='AAPL',
+                time=start + datetime.timedelta(days=i),
+                open_price=decimal.Decimal(int(self.open[i])) / 10000,
+                close_price=decimal.Decimal(int(self.close[i])) / 10000,
+                high_price=decimal.Decimal(int(self.high[i])) / 10000,
+                low_price=decimal.Decimal(int(self.low[i])) / 10000,
+                volume=decimal.Decimal('1000')
+            )
+
+        url = reverse('back_test')
+        params = {'investing_amount': '10000', 'sell_period': '10', 'buy_period': '20'}
+        series = load_price_series('AAPL')
+        self.assertEqual(self.client.get(url, params).data, self.client.get(url, {**params, 'strategy': 'sma'}).data)
+        for strategy in STRATEGIES:
+            response = self.client.get(url, {**params, 'strategy': strategy})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, run_backtest(series, 10000, 20, 10, strategy=strategy))
+
+        response = self.client.get(url, {**params, 'strategy': 'martingale'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PortfolioBackTestTestCase(APITestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for symbol, days, offset in [('AAPL', range(60), 100), ('MSFT', range(5, 60, 1), 300)]:
+            for i in days:
+                StockData.objects.create(
+                    symbol=symbol,
+                    time=self.start + datetime.timedelta(days=i),
+                    open_price=decimal.Decimal(offset + i),
+                    close_price=decimal.Decimal(offset + (i * 7) % 13 + i),
+                    high_price=decimal.Decimal(offset + 50),
+                    low_price=decimal.Decimal(offset - 50),
+                    volume=decimal.Decimal('1000')
+                )
+
+    def simulate_loop(self, closes, weights, amount, period):
+        # reference simulation, one date at a time
+        cash = amount * (1 - sum(weights))
+        shares = [amount * weight / close for weight, close in zip(weights, closes[0])]
+        values = []
+        for row in range(len(closes)):
+            value = cash + sum(share * close for share, close in zip(shares, closes[row]))
+            values.append(value)
+            if period and row > 0 and row % period == 0:
+                cash = value * (1 - sum(weights))
+                shares = [value * weight / close for weight, close in zip(weights, closes[row])]
+        return values
+
+    def test_simulation_matches_loop(self):
+        """
+        Test that the array based simulation values the portfolio like a loop over the dates.
+        """
+        generator = numpy.random.default_rng(3)
+        closes = 100 * numpy.exp(numpy.cumsum(generator.normal(0, 0.02, (250, 3)), axis=0))
+        weights = numpy.array([0.5, 0.3, 0.1])
+        for period in [0, 1, 21]:
+            values, profits, rebalances = simulate_portfolio(closes, weights, 10000, period)
+            numpy.testing.assert_allclose(values, self.simulate_loop(closes, weights, 10000, period))
+            self.assertAlmostEqual(profits.sum(), values[-1] - 10000)
+        self.assertEqual(len(simulate_portfolio(closes, weights, 10000, 21)[2]), 11)
+
+    def test_series_are_aligned(self):
+        """
+        Test that the series are aligned from the first common date and missing closes are carried forward.
+        """
+        series = {'AAPL': load_price_series('AAPL'), 'MSFT': load_price_series('MSFT')}
+        series['MSFT'] = PriceSeries(*[column[numpy.arange(len(series['MSFT'])) != 10] for column in series['MSFT'].columns()])
+        times, closes = align_closes(series)
+
+        self.assertEqual(len(times), 55)
+        self.assertEqual(times[0], series['MSFT'].time[0])
+        # the close of the missing day is the one of the day before
+        self.assertEqual(closes[10, 1], closes[9, 1])
+        self.assertEqual(closes[10, 0], series['AAPL'].close_price[15])
+
+    def test_portfolio_endpoint(self):
+        """
+        Test that the portfolio back test returns the aggregate and per symbol profit.
+        """
+        url = reverse('back_test_portfolio')
+        response = self.client.get(url, {'symbols': 'AAPL,MSFT', 'weights': '0.6,0.4', 'investing_amount': '10000', 'rebalance': '10'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = response.data
+        self.assertEqual(data['dates'], 55)
+        self.assertEqual(data['rebalances'], 5)
+        self.assertEqual(set(data['symbols']), {'AAPL', 'MSFT'})
+        self.assertAlmostEqual(sum(result['profit'] for result in data['symbols'].values()), data['profit'], places=1)
+        self.assertAlmostEqual(data['final_value'], 10000 + data['profit'], places=1)
+
+        # the cash is split equally by default
+        response = self.client.get(url, {'symbols': 'AAPL,MSFT', 'investing_amount': '10000'})
+        self.assertEqual(response.data['symbols']['AAPL']['weight'], 0.5)
+
+    def test_invalid_portfolio(self):
+        """
+        Test that the portfolio back test returns 400 Bad Request for invalid parameters.
+        """
+        url = reverse('back_test_portfolio')
+        for params in [
+            {'investing_amount': '10000'},
+            {'symbols': 'AAPL,MSFT', 'investing_amount': '10000', 'weights': '0.8,0.4'},
+            {'symbols': 'AAPL,MSFT', 'investing_amount': '10000', 'weights': '1'},
+            {'symbols': 'AAPL,MSFT', 'investing_amount': '10000', 'weights': 'a,b'},
+            {'symbols': 'AAPL,AAPL', 'investing_amount': '10000'},
+            {'symbols': 'AAPL,MSFT', 'investing_amount': '10000', 'rebalance': '-1'},
+            {'symbols': 'AAPL,MSFT', 'investing_amount': '10000', 'start': '2024-02-01', 'end': '2024-01-01'},
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_symbol_without_data(self):
+        """
+        Test that a portfolio holding a symbol without data does not trade.
+        """
+        result = run_portfolio_backtest({'AAPL': load_price_series('AAPL'), 'NVDA': load_price_series('NVDA')}, [0.5, 0.5], 10000)
+        self.assertEqual((result['dates'], result['profit']), (0, 0.0))
+
+
+class WalkForwardTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        generator = numpy.random.default_rng(5)
+        closes = 100 * numpy.exp(numpy.cumsum(generator.normal(0.001, 0.02, 300)))
+        start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.series = PriceSeries(
+            time=[int((start + datetime.timedelta(days=i)).timestamp() * 1000000) for i in range(300)],
+            open_price=numpy.round(closes * (1 + generator.normal(0, 0.005, 300)), 2),
+            high_price=numpy.round(closes * 1.01, 2),
+            low_price=numpy.round(closes * 0.99, 2),
+            close_price=numpy.round(closes, 2),
+            volume=numpy.full(300, 1000),
+        )
+
+    def test_folds(self):
+        """
+        Test that the test windows follow each other and the train window rolls or expands before them.
+        """
+        self.assertEqual(make_folds(20, 10, 3), [(1, 11, 14), (4, 14, 17), (7, 17, 20)])
+        self.assertEqual(make_folds(20, 10, 3, expanding=True), [(1, 11, 14), (1, 14, 17), (1, 17, 20)])
+        self.assertEqual(make_folds(10, 10, 3), [])
+
+    def test_train_statistics_match_refit(self):
+        """
+        Test that the statistics kept while the windows slide match a refit on every train window.
+        """
+        closes = self.series.close_price
+        for train_size, test_size, expanding in [(100, 20, False), (100, 20, True), (30, 45, False), (64, 64, False)]:
+            folds = make_folds(len(closes), train_size, test_size, expanding)
+            for (train_start, test_start, test_end), statistics in zip(folds, iter_train_statistics(closes, folds)):
+                refit = segment_statistics(closes, train_start, test_start)
+                self.assertEqual(statistics.count, test_start - train_start)
+                numpy.testing.assert_allclose(statistics.xtx, refit.xtx)
+                numpy.testing.assert_allclose(statistics.xty, refit.xty)
+                numpy.testing.assert_allclose(statistics.solve(), refit.solve(), rtol=1e-6)
+
+    def test_fold_metrics_and_profits(self):
+        """
+        Test that every fold reports the error of a model fitted on its train window and the profit of the strategy on its test window.
+        """
+        result = run_walk_forward(self.series, 10000, 10, 5, train_size=100, test_size=50, max_workers=1)
+        self.assertEqual(result['summary']['folds'], 3)
+        closes = self.series.close_price
+
+        fold = result['folds'][1]
+        self.assertEqual((fold['train_rows'], fold['test_rows']), (100, 50))
+        self.assertEqual(fold['test_start'], self.series.datetime_at(151).isoformat())
+
+        model = LinearRegression().fit(closes[50:150].reshape(-1, 1), closes[51:151])
+        errors = closes[151:201] - model.predict(closes[150:200].reshape(-1, 1))
+        self.assertAlmostEqual(fold['test']['rmse'], float(numpy.sqrt(numpy.mean(errors ** 2))), places=6)
+        self.assertAlmostEqual(fold['test']['mae'], float(numpy.mean(numpy.abs(errors))), places=6)
+
+        # the strategy trades the test rows only, after warming up on the rows before them
+        backtest = run_backtest(slice_series(self.series, 141, 201), 10000, 10, 5, 10)
+        self.assertEqual(fold['profit']['sma'], float(backtest['profit']))
+        self.assertAlmostEqual(fold['profit']['buy_and_hold'], 10000 * (closes[200] / closes[150] - 1), places=1)
+        self.assertAlmostEqual(result['summary']['profit']['model'], sum(fold['profit']['model'] for fold in result['folds']), places=1)
+
+    def test_parallel_folds_match(self):
+        """
+        Test that the folds evaluated on a process pool match the ones evaluated inline.
+        """
+        kwargs = {'train_size': 60, 'test_size': 20, 'expanding': True, 'strategy': 'ema'}
+        inline = run_walk_forward(self.series, 10000, 10, 5, max_workers=1, **kwargs)
+        with mock.patch('myapp.walk_forward.PARALLEL_THRESHOLD', 2):
+            pooled = run_walk_forward(self.series, 10000, 10, 5, max_workers=2, **kwargs)
+        self.assertEqual(len(inline['folds']), 11)
+        self.assertEqual(pooled, inline)
+
+    def test_command(self):
+        """
+        Test that the walk forward command evaluates the history of a symbol from the database.
+        """
+        rows = [
+            (self.series.datetime_at(i), self.series.open_price[i], self.series.high_price[i], self.series.low_price[i], self.series.close_price[i], 1000)
+            for i in range(len(self.series))
+        ]
+        ingest_stock_data('AAPL', rows)
+        output = os.path.join(self.directory, 'walk_forward.json')
+        stdout = io.StringIO()
+        call_command('walk_forward', 'aapl', '--train-size', '100', '--test-size', '50', '--workers', '1', '--output', output, stdout=stdout)
+        with open(output) as file:
+            result = json.load(file)
+
+        self.assertEqual(result['symbol'], 'AAPL')
+        self.assertEqual(result['summary']['folds'], 3)
+        self.assertIn('3 folds', stdout.getvalue())
+
+
+def market_data_response(status_code=200, body=None, headers=None):
+    response = mock.Mock(status_code=status_code, headers=headers or {})
+    response.json.return_value = body
+    return response
+
+
+class MarketDataClientTestCase(TemporaryStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.payload = {'2024-10-18': {'1. open': '100', '2. high': '101', '3. low': '99', '4. close': '100.5', '5. volume': '1000'}}
+        self.body = {'Meta Data': {}, 'Time Series (Daily)': self.payload}
+
+        self.session = mock.Mock()
+        patcher = mock.patch('myapp.market_data.get_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('myapp.market_data.rate_limiter')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('myapp.market_data.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_with_backoff(self):
+        """
+        Test that errors, overloaded statuses and throttled answers are retried with a growing backoff.
+        """
+        self.session.get.side_effect = [
+            requests.ConnectionError('reset'),
+            market_data_response(503),
+            market_data_response(200, {'Note': 'Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day.'}),
+            market_data_response(200, self.body),
+        ]
+        with self.settings(ALPHA_VANTAGE_RETRIES=3, ALPHA_VANTAGE_BACKOFF=1, ALPHA_VANTAGE_BACKOFF_MAX=60):
+            self.assertEqual(fetch_daily_time_series('AAPL'), self.payload)
+
+        self.assertEqual(self.session.get.call_count, 4)
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        for attempt, delay in enumerate(delays):
+            self.assertTrue(2 ** attempt <= delay <= 2 ** (attempt + 1))
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], (5, 30))
+
+    def test_gives_up_after_retries(self):
+        """
+        Test that the symbol fails once every retry failed, without failing the other symbols.
+        """
+        self.session.get.side_effect = lambda url, params, **kwargs: market_data_response(200, self.body) if params['symbol'] == 'MSFT' else market_data_response(503, headers={'Retry-After': '7'})
+        with self.settings(ALPHA_VANTAGE_RETRIES=2):
+            data = fetch_many({'AAPL': 'compact', 'MSFT': 'compact'}, max_workers=1)
+
+        self.assertEqual(data, {'AAPL': None, 'MSFT': self.payload})
+        self.assertEqual(self.session.get.call_count, 4)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [7.0, 7.0])
+
+    def test_responses_are_cached(self):
+        """
+        Test that a fresh answer is served from disk, and a full history also serves compact requests.
+        """
+        self.session.get.return_value = market_data_response(200, self.body)
+        self.assertEqual(fetch_daily_time_series('AAPL', 'full'), self.payload)
+        self.assertEqual(fetch_daily_time_series('AAPL', 'full'), self.payload)
+        self.assertEqual(fetch_daily_time_series('AAPL', 'compact'), self.payload)
+        self.assertEqual(self.session.get.call_count, 1)
+
+        # an error answer is not cached
+        self.session.get.return_value = market_data_response(200, {'Error Message': 'Invalid API call.'})
+        self.assertEqual(fetch_daily_time_series('NOPE'), {})
+        self.assertEqual(fetch_daily_time_series('NOPE'), {})
+        self.assertEqual(self.session.get.call_count, 3)
+
+    def test_stale_responses_are_revalidated(self):
+        """
+        Test that a stale answer is refetched conditionally and kept when it was not modified.
+        """
+        self.session.get.return_value = market_data_response(200, self.body, {'ETag': '"v1"', 'Last-Modified': 'Fri, 18 Oct 2024 20:00:00 GMT'})
+        fetch_daily_time_series('AAPL')
+
+        self.session.get.return_value = market_data_response(304)
+        with self.settings(ALPHA_VANTAGE_CACHE_SECONDS=0):
+            self.assertEqual(fetch_daily_time_series('AAPL'), self.payload)
+        headers = self.session.get.call_args.kwargs['headers']
+        self.assertEqual(headers, {'If-None-Match': '"v1"', 'If-Modified-Since': 'Fri, 18 Oct 2024 20:00:00 GMT'})
+
+        # the revalidation made the answer fresh again
+        self.assertEqual(fetch_daily_time_series('AAPL'), self.payload)
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_token_bucket_allows_bursts(self):
+        """
+        Test that the burst starts at once and the calls after it are spaced by the quota.
+        """
+        limiter = RateLimiter(requests_per_minute=600, burst=3)
+        for _ in range(4):
+            limiter.wait()
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(len(delays), 1)
+        self.assertAlmostEqual(delays[0], 0.1, places=2)
+
+    def test_daily_quota(self):
+        """
+        Test that a call that would wait too long for the daily quota fails instead.
+        """
+        limiter = RateLimiter(requests_per_minute=600000, requests_per_day=2, max_wait=60)
+        limiter.wait()
+        limiter.wait()
+        with self.assertRaises(QuotaExhausted):
+            limiter.wait()
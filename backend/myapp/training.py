@@ -0,0 +1,300 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from myapp.apps import get_regression_statistics_dirpath, get_symbol_model_dirpath
+from myapp.models import StockData
+from myapp.model_registry import get_symbol_model_filepath, save_model
+from sklearn.linear_model import LinearRegression
+from time import perf_counter
+import joblib
+import json
+import logging
+import numpy as np
+import os
+
+# number of rows read from the database at a time during a full refit
+CHUNK_SIZE = 10000
+
+# the model predicts a close from the closes of this many previous days
+LAGS = 1
+
+
+class RegressionStatistics:
+    """
+    Sufficient statistics of the least squares fit of a close on the closes of
+    the previous days.
+
+    Only XᵀX and Xᵀy of the design matrix (with a column of ones for the
+    intercept) are kept, together with the last closes needed to build the
+    lags of the next rows. Adding rows costs O(new rows) and the model is
+    solved from the statistics, so training never rescans the history.
+    """
+
+    def __init__(self, lags: int = LAGS):
+        self.lags = lags
+        self.xtx = np.zeros((lags + 1, lags + 1), dtype=np.float64)
+        self.xty = np.zeros(lags + 1, dtype=np.float64)
+        self.yty = 0.0
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.window = np.empty(0, dtype=np.float64)
+
+    def update(self, times, closes):
+        """
+        Adds the rows given as times and closes, ordered by time and all after
+        the last row already added
+        """
+        if len(times) == 0:
+            return
+
+        closes = np.concatenate([self.window, np.asarray(closes, dtype=np.float64)])
+        if len(closes) > self.lags:
+            # row i of the lag matrix holds the closes of the days before target i, oldest first
+            targets = closes[self.lags:]
+            design = np.empty((len(targets), self.lags + 1), dtype=np.float64)
+            design[:, 0] = 1.0
+            for lag in range(self.lags):
+                design[:, lag + 1] = closes[lag:lag + len(targets)]
+
+            self.xtx += design.T @ design
+            self.xty += design.T @ targets
+            self.yty += float(targets @ targets)
+            self.count += len(targets)
+
+        self.window = closes[-self.lags:].copy()
+        if self.first_time is None:
+            self.first_time = times[0]
+        self.last_time = times[-1]
+
+    def merge(self, other, sign: int = 1):
+        """
+        Adds the sums of other, which holds the statistics of other rows, or
+        removes them with sign -1. The times and the last closes are left as
+        they are, the caller knows which rows the merged sums cover.
+        """
+        self.xtx += sign * other.xtx
+        self.xty += sign * other.xty
+        self.yty += sign * other.yty
+        self.count += sign * other.count
+
+    def solve(self) -> np.ndarray:
+        """
+        Returns the intercept followed by the coefficients of the fit
+        """
+        # lstsq also copes with a singular XᵀX, e.g. while there is a single row
+        return np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+
+    def metrics(self) -> dict:
+        """
+        Returns the in-sample error of the fit, computed from the statistics alone
+        """
+        solution = self.solve()
+        squared_error = max(self.yty - 2 * solution @ self.xty + solution @ self.xtx @ solution, 0.0)
+        total_variance = self.yty - self.xty[0] ** 2 / self.count
+        return {
+            'rows': self.count,
+            'rmse': float(np.sqrt(squared_error / self.count)),
+            'r_squared': float(1 - squared_error / total_variance) if total_variance > 0 else None,
+        }
+
+    def to_model(self) -> LinearRegression:
+        """
+        Solves the normal equations and returns them as a fitted LinearRegression
+        """
+        if self.count == 0:
+            raise ValueError("No rows to fit the model on")
+
+        solution = self.solve()
+        model = LinearRegression()
+        model.intercept_ = float(solution[0])
+        model.coef_ = solution[1:]
+        model.n_features_in_ = self.lags
+        return model
+
+
+def get_statistics_filepath(symbol: str) -> str:
+    return os.path.join(get_regression_statistics_dirpath(), f"{symbol}.pkl")
+
+
+def load_statistics(symbol: str):
+    """
+    Returns the saved statistics of the symbol, or None when there are none
+    """
+    try:
+        return joblib.load(get_statistics_filepath(symbol))
+    except FileNotFoundError:
+        return None
+
+
+def save_statistics(symbol: str, statistics: RegressionStatistics):
+    filepath = get_statistics_filepath(symbol)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temporary_filepath = f"{filepath}.tmp-{os.getpid()}"
+    joblib.dump(statistics, temporary_filepath)
+    os.replace(temporary_filepath, filepath)
+
+
+def iter_close_chunks(symbol: str, since=None, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the (times, closes) of the symbol after since in chunks of at most
+    chunk_size rows ordered by time, so memory stays flat whatever the history
+    """
+    queryset = StockData.objects.filter(symbol=symbol).order_by('time')
+    if since is not None:
+        queryset = queryset.filter(time__gt=since)
+
+    times, closes = [], []
+    closes_queryset = queryset.annotate(float_close=Cast('close_price', FloatField())).values_list('time', 'float_close')
+    for time, close in closes_queryset.iterator(chunk_size=chunk_size):
+        times.append(time)
+        closes.append(close)
+        if len(times) == chunk_size:
+            yield times, np.array(closes, dtype=np.float64)
+            times, closes = [], []
+    if times:
+        yield times, np.array(closes, dtype=np.float64)
+
+
+def refit_statistics(symbol: str) -> RegressionStatistics:
+    """
+    Rebuilds the statistics of the symbol from its whole history
+    """
+    # cleared before the rows are read, rows rewritten meanwhile mark the statistics again
+    try:
+        os.remove(get_stale_marker_filepath(symbol))
+    except FileNotFoundError:
+        pass
+
+    statistics = RegressionStatistics()
+    for times, closes in iter_close_chunks(symbol):
+        statistics.update(times, closes)
+    save_statistics(symbol, statistics)
+    logging.info(f"Refitted the regression statistics of {symbol} on {statistics.count} rows")
+    return statistics
+
+
+def get_stale_marker_filepath(symbol: str) -> str:
+    return os.path.join(get_regression_statistics_dirpath(), f"{symbol}.stale")
+
+
+def mark_statistics_stale(symbol: str, since):
+    """
+    Records that the rows of the symbol from since onwards were written. When
+    they reach back to rows the statistics already cover, days were filled
+    into a gap, backfilled or rewritten, and the next update refits the
+    statistics instead of adding to them. Rows appended after the statistics
+    are left to the update.
+    """
+    statistics = load_statistics(symbol)
+    if statistics is None or statistics.last_time is None or since > statistics.last_time:
+        return
+
+    filepath = get_stale_marker_filepath(symbol)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'w') as file:
+        file.write(since.isoformat())
+    logging.info(f"Rows of {symbol} covered by the regression statistics were written from {since}, marked for a refit")
+
+
+def update_statistics(symbol: str) -> RegressionStatistics:
+    """
+    Adds the rows written since the last update to the statistics of the
+    symbol. Falls back to a full refit when there are no statistics yet, when
+    older rows were backfilled before the first row they cover, or when the
+    ingest marked them stale because it wrote rows they cover.
+    """
+    statistics = load_statistics(symbol)
+    if statistics is None or statistics.first_time is None:
+        return refit_statistics(symbol)
+
+    if StockData.objects.filter(symbol=symbol, time__lt=statistics.first_time).exists():
+        logging.info(f"Rows of {symbol} were backfilled before {statistics.first_time}, refitting")
+        return refit_statistics(symbol)
+
+    if os.path.exists(get_stale_marker_filepath(symbol)):
+        logging.info(f"Rows of {symbol} covered by the regression statistics were rewritten, refitting")
+        return refit_statistics(symbol)
+
+    count = statistics.count
+    for times, closes in iter_close_chunks(symbol, since=statistics.last_time):
+        statistics.update(times, closes)
+    save_statistics(symbol, statistics)
+    logging.info(f"Added {statistics.count - count} rows to the regression statistics of {symbol}")
+    return statistics
+
+
+def train_symbol(symbol: str, full: bool = False):
+    """
+    Trains a new version of the model of the symbol and returns its metrics
+    together with the model
+    """
+    started = perf_counter()
+    statistics = refit_statistics(symbol) if full else update_statistics(symbol)
+    model = statistics.to_model()
+    version = save_model(model, get_symbol_model_filepath(symbol))
+
+    metrics = {'symbol': symbol, 'version': version}
+    metrics.update(statistics.metrics())
+    metrics['seconds'] = perf_counter() - started
+    return metrics, model
+
+
+def _train_worker(task):
+    symbol, full = task
+    try:
+        return train_symbol(symbol, full)
+    except Exception as e:
+        logging.error(f"Failed to train the model of {symbol} with error: {e}")
+        return {'symbol': symbol, 'error': str(e)}, None
+
+
+def get_training_summary_filepath() -> str:
+    return os.path.join(get_symbol_model_dirpath(), 'training_summary.json')
+
+
+def train_models(symbols, full: bool = False, max_workers: int = None):
+    """
+    Trains the model of every symbol, on a process pool when there are several
+    of them, so a full retrain scales with the number of cores.
+
+    Returns the summary of the job, which is also saved as json next to the
+    models, and a dict of symbol to the (version, model) pair of every model
+    trained.
+    """
+    max_workers = max_workers or settings.TRAINING_MAX_WORKERS
+    started_at = datetime.now(timezone.utc)
+    started = perf_counter()
+    tasks = [(symbol, full) for symbol in symbols]
+
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [_train_worker(task) for task in tasks]
+    else:
+        # every worker opens its own database connection, none may be inherited
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+            results = list(executor.map(_train_worker, tasks))
+
+    models = {metrics['symbol']: (metrics['version'], model) for metrics, model in results if model is not None}
+    summary = {
+        'started_at': started_at.isoformat(),
+        'full': full,
+        'symbols': len(tasks),
+        'trained': len(models),
+        'failed': len(tasks) - len(models),
+        'seconds': perf_counter() - started,
+        'results': [metrics for metrics, model in results],
+    }
+
+    filepath = get_training_summary_filepath()
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temporary_filepath = f"{filepath}.tmp-{os.getpid()}"
+    with open(temporary_filepath, 'w') as file:
+        json.dump(summary, file, indent=2)
+    os.replace(temporary_filepath, filepath)
+
+    logging.info(f"Trained {summary['trained']} of {summary['symbols']} models in {summary['seconds']:.2f}s")
+    return summary, models
@@ -1,8 +1,16 @@
 from django.urls import path
-from .views import back_test, predict_data, get_report_for_prediction
+from .views import back_test, back_test_cache_stats, back_test_portfolio, back_test_sweep, predict_data, get_report_for_prediction
+from . import async_views
 
 urlpatterns = [
     path('api/backtest/', back_test, name='back_test'),
+    path('api/backtest/sweep/', back_test_sweep, name='back_test_sweep'),
+    path('api/backtest/cache/', back_test_cache_stats, name='back_test_cache_stats'),
+    path('api/backtest/portfolio/', back_test_portfolio, name='back_test_portfolio'),
     path('api/predict-data', predict_data, name='predict_data'),
     path('api/reports/prediction-data', get_report_for_prediction, name='get_report_for_prediction'),
-]
\ No newline at end of file
+    # async variants of the read endpoints, for ASGI servers
+    path('api/async/backtest/', async_views.back_test, name='back_test_async'),
+    path('api/async/predict-data', async_views.predict_data, name='predict_data_async'),
+    path('api/async/reports/prediction-data', async_views.get_report_for_prediction, name='get_report_for_prediction_async'),
+]
@@ -1,165 +1,447 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework import status
-from myapp.models import AaplStockData
-from myapp.apps import get_linear_regression_model_filepath
-import joblib
-import pandas as pd
-from datetime import timedelta
-from django.http import JsonResponse, HttpResponse
-import matplotlib.pyplot as plt
-import io
-
-# Set the Matplotlib backend to 'Agg'
-import matplotlib
-matplotlib.use('Agg')
+from myapp.backtest_cache import get_backtest_cache_stats, get_backtest_result
+from myapp.backtest_engine import iter_backtest_events
+from myapp.backtest_sweep import run_parameter_sweep
+from myapp.model_registry import get_model
+from myapp.portfolio import DEFAULT_REBALANCE_PERIOD, run_portfolio_backtest
+from myapp.models import DEFAULT_SYMBOL
+from myapp.price_cache import get_price_series, get_price_series_with_warmup
+from myapp.data_version import get_data_version
+from myapp.forecasting import DEFAULT_HORIZON, MAX_HORIZON, forecast
+from myapp.reports import get_prediction_report, get_report_etag
+from myapp.strategies import DEFAULT_STRATEGY, STRATEGIES
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+from datetime import datetime, time, timezone
+import json
+import re
 
 # Create your views here.
 
-@api_view(['GET'])
-def back_test(request):
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9.\-]{0,15}$')
+
+# upper bound on the number of symbols forecast in one request
+MAX_FORECAST_SYMBOLS = 100
+
+
+def get_symbol(request):
     """
-    This function is used to back test the trading strategy
+    Returns the upper cased `symbol` query parameter, the default symbol when it
+    is missing and None when it is not a valid ticker
     """
-    investing_amount = request.query_params.get('investing_amount', None)
-    sell_period = request.query_params.get('sell_period', None)
-    buy_period = request.query_params.get('buy_period', None)
+    return parse_symbol(request.query_params)
+
+
+def parse_symbol(params):
+    symbol = params.get('symbol', DEFAULT_SYMBOL).upper()
+    if not SYMBOL_PATTERN.match(symbol):
+        return None
+    return symbol
+
+
+def parse_time(value: str, end: bool = False):
+    """
+    Parses an ISO date or date time, a date stands for its first moment or for
+    its last one with end. Times without a zone are in UTC. Returns None when
+    the value is not valid.
+    """
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.max if end else time.min)
+    except ValueError:
+        return None
+
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def parse_time_range(params):
+    """
+    Returns the (start, end) of the optional `start` and `end` parameters, or
+    None when they are not valid
+    """
+    start = params.get('start', None)
+    end = params.get('end', None)
+    if start is not None:
+        start = parse_time(start)
+        if start is None:
+            return None
+    if end is not None:
+        end = parse_time(end, end=True)
+        if end is None:
+            return None
+    if start is not None and end is not None and start > end:
+        return None
+    return start, end
+
+
+def parse_back_test_params(params):
+    """
+    Returns the (symbol, investing_amount, buy_period, sell_period, start, end,
+    strategy, stream) of a back test request, or None when any of them is not valid
+    """
+    investing_amount = params.get('investing_amount', None)
+    sell_period = params.get('sell_period', None)
+    buy_period = params.get('buy_period', None)
     
     # if any of the parameters are missing, return a bad request response
     if investing_amount is None or sell_period is None or buy_period is None:
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return None
     
     # if any of the parameters are not a number, return a bad request response
     if not investing_amount.isnumeric() or not sell_period.isnumeric() or not buy_period.isnumeric():
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return None
     
     # if any of the selling or buying prices are less than or equal to zero, return a bad request response
     if int(sell_period) <= 0 or int(buy_period) <= 0:
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return None
     
     # if the investment amount is less than 0, return a bad request
     if int(investing_amount) < 0:
+        return None
+
+    # if the symbol is not a valid ticker, return a bad request
+    symbol = parse_symbol(params)
+    if symbol is None:
+        return None
+
+    # the optional date range of the back test, both ends are inclusive
+    time_range = parse_time_range(params)
+    if time_range is None:
+        return None
+    start, end = time_range
+
+    # the trading rule, the moving average one by default
+    strategy = params.get('strategy', DEFAULT_STRATEGY)
+    if strategy not in STRATEGIES:
+        return None
+
+    # ndjson is the only streaming format
+    stream = params.get('stream', None)
+    if stream is not None and stream != 'ndjson':
+        return None
+
+    return symbol, int(investing_amount), int(buy_period), int(sell_period), start, end, strategy, stream
+
+
+def iter_ndjson(events):
+    return (json.dumps(event) + '\n' for event in events)
+
+
+@api_view(['GET'])
+def back_test(request):
+    """
+    This function is used to back test the trading strategy
+    """
+    params = parse_back_test_params(request.query_params)
+    if params is None:
         return Response(status=status.HTTP_400_BAD_REQUEST)
+    symbol, investing_amount, buy_period, sell_period, start, end, strategy, stream = params
     
-    stock_data = AaplStockData.get_data_with_moving_average(int(sell_period), int(buy_period))
-    
-    # sort the stock data by time
-    stock_data = sorted(stock_data, key=lambda x: x.time)
-    
-    # iterate over the stock data and calculate the profit
-    profit = 0
-    buy = True
-    amount_remaining = int(investing_amount)
-    stocks_held = 0
-    events = []
-    for stock in stock_data:
-        if int(investing_amount) == 0:
-            break
-
-        if buy and stock.open_price < stock.buying_moving_average:
-            stocks_held = int(amount_remaining) // stock.open_price
-            amount_remaining = int(amount_remaining) % stock.open_price
-            events.append(f"Bought {stocks_held} stocks on {stock.time} for {stock.open_price}")
-            buy = False
-        elif not buy and stock.close_price > stock.selling_moving_average:
-            amount_remaining += int(stocks_held * stock.close_price)
-            events.append(f"Sold {stocks_held} stocks on {stock.time} for {stock.close_price}")
-            stocks_held = 0
-            buy = True
-
-    if stocks_held > 0:
-        # sell the stocks at the last price
-        amount_remaining += int(stocks_held * stock_data[-1].close_price)
-        events.append(f"Sold {stocks_held} stocks on {stock_data[-1].time} for {stock_data[-1].close_price}")
-        
-    profit = amount_remaining - int(investing_amount)
-    response_data = {
-        'profit': profit,
-        'events': events
-    }    
+    if stream == 'ndjson':
+        # load the price history of the range and its warm-up into arrays and send every event as soon as the engine produces it, one json document per line
+        series, first_row = get_price_series_with_warmup(symbol, start, end, max(buy_period, sell_period))
+        events = iter_backtest_events(series, investing_amount, buy_period, sell_period, first_row, strategy)
+        return StreamingHttpResponse(iter_ndjson(events), content_type='application/x-ndjson')
+
+    # answer repeated back tests on the same data from the cache, run the vectorized engine otherwise
+    response_data = get_backtest_result(symbol, investing_amount, buy_period, sell_period, start, end, strategy)
 
     return Response(status=status.HTTP_200_OK, data=response_data)
 
+
 @api_view(['GET'])
-def predict_data(request):
+def back_test_cache_stats(request):
     """
-    This function is used to predict the stock data for the next 30 days
+    This function is used to get the hit and miss counters of the back test cache
     """
+    return Response(status=status.HTTP_200_OK, data=get_backtest_cache_stats())
 
-    # load the linear regression model
-    model = joblib.load(get_linear_regression_model_filepath())
+# upper bound on the number of symbols of a portfolio back test
+MAX_PORTFOLIO_SYMBOLS = 50
 
-    # get the latest stock data
-    latest_stock_data = AaplStockData.objects.all().order_by('-time').values('close_price', 'time')
-    data_df = pd.DataFrame(latest_stock_data)
 
-    # prepare the data for the model
-    X_input = data_df['close_price'].values.reshape(-1, 1)
-    
-    # predict the stock data
-    predictions = model.predict(X_input[-30:])
-    
-    # generate data for the next 30 days
-    last_date = data_df['time'].max()
-    prediction_dates = [last_date + timedelta(days=i) for i in range(1, 31)]
-    
-    prediction_response = {
-        'symbol': 'AAPL',
-        'predictions': [{'date': date.strftime('%Y-%m-%d'), 'predicted_price': price} for date, price in zip(prediction_dates, predictions)]
+def parse_weights(value: str, count: int):
+    """
+    Parses a comma separated list of count non negative weights summing to at
+    most 1. Returns None when the value is not valid.
+    """
+    try:
+        weights = [float(weight) for weight in value.split(',')]
+    except ValueError:
+        return None
+    if len(weights) != count or not all(0 <= weight <= 1 for weight in weights) or sum(weights) > 1 + 1e-9:
+        return None
+    return weights
+
+
+@api_view(['GET'])
+def back_test_portfolio(request):
+    """
+    This function is used to back test a portfolio of symbols held at the given
+    weights and rebalanced periodically
+    """
+    symbols = request.query_params.get('symbols', None)
+    investing_amount = request.query_params.get('investing_amount', None)
+    rebalance = request.query_params.get('rebalance', str(DEFAULT_REBALANCE_PERIOD))
+
+    # if any of the parameters are missing or not numbers, return a bad request response
+    if symbols is None or investing_amount is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    if not investing_amount.isnumeric() or not rebalance.isnumeric():
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    symbols = [symbol.strip().upper() for symbol in symbols.split(',')]
+    if len(symbols) > MAX_PORTFOLIO_SYMBOLS or len(set(symbols)) != len(symbols):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    if not all(SYMBOL_PATTERN.match(symbol) for symbol in symbols):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # the cash is split equally by default
+    weights = request.query_params.get('weights', None)
+    weights = [1 / len(symbols)] * len(symbols) if weights is None else parse_weights(weights, len(symbols))
+    if weights is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    time_range = parse_time_range(request.query_params)
+    if time_range is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    start, end = time_range
+
+    # every series comes from the price cache, then the portfolio is simulated on the aligned matrix at once
+    series_by_symbol = {symbol: get_price_series(symbol, start, end) for symbol in symbols}
+    response_data = run_portfolio_backtest(series_by_symbol, weights, int(investing_amount), int(rebalance))
+
+    return Response(status=status.HTTP_200_OK, data=response_data)
+
+# the largest grid a single sweep request may ask for
+MAX_SWEEP_COMBINATIONS = 20000
+
+
+def parse_int_range(value: str, max_values: int = MAX_SWEEP_COMBINATIONS):
+    """
+    Parses a comma separated list of integers where every item is either a
+    number or an inclusive `start:stop:step` range, e.g. `5,10,20:50:10`.
+    Returns None when the value is not valid or holds more than max_values
+    numbers, which is checked before any range is expanded.
+    """
+    values = []
+    for item in value.split(','):
+        parts = item.strip().split(':')
+        if len(parts) > 3 or not all(part.isnumeric() for part in parts):
+            return None
+        numbers = [int(part) for part in parts]
+        if len(numbers) == 1:
+            numbers = range(numbers[0], numbers[0] + 1)
+        else:
+            step = numbers[2] if len(numbers) == 3 else 1
+            if step <= 0 or numbers[1] < numbers[0]:
+                return None
+            numbers = range(numbers[0], numbers[1] + 1, step)
+        # the length of a range is known without building it
+        if len(values) + len(numbers) > max_values:
+            return None
+        values.extend(numbers)
+    return values
+
+
+@api_view(['GET'])
+def back_test_sweep(request):
+    """
+    This function is used to back test every combination of the given ranges of
+    investing amounts, buy periods and sell periods and rank them by profit
+    """
+    investing_amounts = request.query_params.get('investing_amounts', None)
+    buy_periods = request.query_params.get('buy_periods', None)
+    sell_periods = request.query_params.get('sell_periods', None)
+    top = request.query_params.get('top', None)
+
+    # if any of the parameters are missing, return a bad request response
+    if investing_amounts is None or buy_periods is None or sell_periods is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    investing_amounts = parse_int_range(investing_amounts)
+    buy_periods = parse_int_range(buy_periods)
+    sell_periods = parse_int_range(sell_periods)
+
+    # if any of the ranges could not be parsed, return a bad request response
+    if investing_amounts is None or buy_periods is None or sell_periods is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # the periods have to be greater than zero
+    if min(buy_periods) <= 0 or min(sell_periods) <= 0:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    if top is not None and (not top.isnumeric() or int(top) <= 0):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # the trading rule, the moving average one by default
+    strategy = request.query_params.get('strategy', DEFAULT_STRATEGY)
+    if strategy not in STRATEGIES:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    symbol = get_symbol(request)
+    if symbol is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # refuse grids that are too large to be scored in a single request
+    combinations = len(set(investing_amounts)) * len(set(buy_periods)) * len(set(sell_periods))
+    if combinations > MAX_SWEEP_COMBINATIONS:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # fetch the price series once and score the whole grid on it
+    series = get_price_series(symbol)
+    results = run_parameter_sweep(series, investing_amounts, buy_periods, sell_periods, strategy=strategy)
+    if top is not None:
+        results = results[:int(top)]
+
+    response_data = {
+        'symbol': symbol,
+        'strategy': strategy,
+        'combinations': combinations,
+        'results': results,
+    }
+
+    return Response(status=status.HTTP_200_OK, data=response_data)
+
+def format_forecast(result):
+    return [{'date': date.strftime('%Y-%m-%d'), 'predicted_price': float(price)} for date, price in zip(result.dates, result.prices)]
+
+
+def parse_predict_params(params):
+    """
+    Returns the (symbols, many, horizon) of a prediction request, where many
+    tells that a list of symbols was asked for, or None when they are not valid
+    """
+    # a portfolio can be forecast at once with a comma separated list of symbols
+    symbols = params.get('symbols', None)
+    many = symbols is not None
+    if many:
+        symbols = [symbol.strip().upper() for symbol in symbols.split(',')]
+        if len(symbols) > MAX_FORECAST_SYMBOLS or not all(SYMBOL_PATTERN.match(symbol) for symbol in symbols):
+            return None
+    else:
+        symbol = parse_symbol(params)
+        if symbol is None:
+            return None
+        symbols = [symbol]
+
+    # number of trading days to forecast
+    horizon = params.get('horizon', str(DEFAULT_HORIZON))
+    if not horizon.isnumeric() or not 1 <= int(horizon) <= MAX_HORIZON:
+        return None
+
+    return symbols, many, int(horizon)
+
+
+def get_prediction_response_data(symbols, many: bool, horizon: int):
+    """
+    Forecasts the symbols and returns the response body, None when the single
+    symbol asked for has no data or no model
+    """
+    # roll the model of every symbol, kept in memory by the registry, over its next trading days
+    forecasts = forecast(symbols, horizon)
+
+    if many:
+        return {
+            'horizon': horizon,
+            'model_versions': {
+                symbol: None if result is None else result.model_version
+                for symbol, result in forecasts.items()
+            },
+            'forecasts': {
+                symbol: None if result is None else format_forecast(result)
+                for symbol, result in forecasts.items()
+            },
+        }
+
+    symbol = symbols[0]
+    if forecasts[symbol] is None:
+        return None
+
+    return {
+        'symbol': symbol,
+        'model_version': forecasts[symbol].model_version,
+        'horizon': horizon,
+        'predictions': format_forecast(forecasts[symbol]),
     }
 
+
+@api_view(['GET'])
+def predict_data(request):
+    """
+    This function is used to predict the stock data for the next trading days
+    """
+    params = parse_predict_params(request.query_params)
+    if params is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    prediction_response = get_prediction_response_data(*params)
+    if prediction_response is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
     return JsonResponse(prediction_response)
 
+
 @api_view(['GET'])
 def get_report_for_prediction(request):
     """
     This function is used to get the report for the prediction
     """
+    symbol = get_symbol(request)
+    if symbol is None:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
     
-    model = joblib.load(get_linear_regression_model_filepath())
-    
-    # Get the latest stock data
-    latest_stock_data = AaplStockData.objects.all().order_by('-time').values('close_price', 'time')
-    data_df = pd.DataFrame(list(latest_stock_data))
-
-    # Prepare the data for the model
-    X_input = data_df['close_price'].values.reshape(-1, 1)
-
-    # Predict the stock data for the last 30 days
-    predictions = model.predict(X_input[-30:])
+    response = get_report_response(symbol, request.headers.get('If-None-Match'))
+    if response is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
 
-    # Generate dates for the next 30 days
-    last_date = data_df['time'].max()
-    prediction_dates = [last_date + timedelta(days=i) for i in range(1, 31)]
+    return response
 
-    # Filter the last 30 days of actual data
-    actual_data = data_df[:30]
 
-    # Prepare the plot
-    plt.figure(figsize=(12, 6))
+def get_not_modified_response(etag: str, model_version):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['X-Model-Version'] = model_version
+    return response
 
-    # Plot actual prices for the last 30 days
-    plt.plot(actual_data['time'], actual_data['close_price'], label='Actual Price', color='blue', marker='o')
 
-    # Plot predicted prices for the next 30 days
-    plt.plot(prediction_dates, predictions, label='Predicted Price', color='green', linestyle='--', marker='x')
+def get_report_response(symbol: str, if_none_match: str = None):
+    """
+    Returns the response with the prediction report of the symbol, a 304 when
+    the client already holds it, or None when the symbol has no data or no model
+    """
+    found = get_model(symbol)
+    if found is None:
+        return None
+    model_version, model = found
 
-    # Improve x-axis formatting
-    plt.gcf().autofmt_xdate()
+    # the report only changes with the data or the model, let the client keep its copy
+    etag = get_report_etag(symbol, get_data_version(symbol), model_version)
+    if if_none_match and etag in parse_etags(if_none_match):
+        return get_not_modified_response(etag, model_version)
 
-    plt.xlabel('Date')
-    plt.ylabel('Stock Price')
-    plt.title('Actual vs Predicted Stock Prices')
-    plt.legend()
+    # read the rendered report from the cache, it is only drawn once per version
+    etag, png = get_prediction_report(symbol, model_version, model)
+    if png is None:
+        return None
 
-    # Save the plot to a bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
+    # a wildcard only matches when there is a report to match
+    if if_none_match and if_none_match.strip() == '*':
+        return get_not_modified_response(etag, model_version)
 
     # Return the image as an HTTP response
-    response = HttpResponse(buf, content_type='image/png')
+    response = HttpResponse(png, content_type='image/png')
     response['Content-Disposition'] = 'inline; filename="stock_predictions.png"'
+    response['ETag'] = etag
+    response['X-Model-Version'] = model_version
 
     return response
-    
\ No newline at end of file
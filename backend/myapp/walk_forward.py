@@ -0,0 +1,201 @@
+from concurrent.futures import ProcessPoolExecutor
+from myapp.backtest_engine import run_backtest
+from myapp.price_cache import get_price_series
+from myapp.price_series import PriceSeries
+from myapp.snapshot import slice_series
+from myapp.strategies import DEFAULT_STRATEGY
+from myapp.training import LAGS, RegressionStatistics
+import logging
+import numpy as np
+import os
+
+# rows the model is trained on and evaluated on in every fold by default,
+# about two years and a quarter of trading days
+DEFAULT_TRAIN_SIZE = 504
+DEFAULT_TEST_SIZE = 63
+
+# fewer folds than this are evaluated in the calling process, the pool start
+# up costs more than it saves for them
+PARALLEL_THRESHOLD = 8
+
+# the series and the parameters shared with every worker of the pool, set once by the initializer
+_worker_state = {}
+
+
+def make_folds(rows: int, train_size: int, test_size: int, expanding: bool = False, lags: int = LAGS):
+    """
+    Returns the (train_start, test_start, test_end) rows of every fold. The
+    test windows follow each other without overlap, and the train window
+    ends where the test window starts: it keeps its size when rolling and
+    starts at the first row with enough lags when expanding. Rows at the end
+    of the history not filling a whole test window are left out.
+    """
+    folds = []
+    test_start = lags + train_size
+    while test_start + test_size <= rows:
+        train_start = lags if expanding else test_start - train_size
+        folds.append((train_start, test_start, test_start + test_size))
+        test_start += test_size
+    return folds
+
+
+def segment_statistics(closes: np.ndarray, first: int, last: int, lags: int = LAGS) -> RegressionStatistics:
+    """
+    Returns the statistics of the targets at rows first to last, the closes
+    before first only serve as their lags
+    """
+    statistics = RegressionStatistics(lags)
+    statistics.update(np.arange(first - lags, last), closes[first - lags:last])
+    return statistics
+
+
+def iter_train_statistics(closes: np.ndarray, folds, lags: int = LAGS):
+    """
+    Yields the statistics of the train window of every fold. The history is
+    cut into segments at the edges of the windows and every segment is added
+    once and, when the window rolls past it, removed once, so the statistics
+    of all the folds cost a single pass over the history instead of a refit
+    per fold.
+    """
+    edges = sorted({edge for train_start, test_start, test_end in folds for edge in (train_start, test_start)})
+    statistics = RegressionStatistics(lags)
+    # the statistics of the segments in the window, by their first row
+    segments = {}
+    for train_start, test_start, test_end in folds:
+        for first, last in zip(edges, edges[1:]):
+            inside = train_start <= first and last <= test_start
+            if inside and first not in segments:
+                segments[first] = segment_statistics(closes, first, last, lags)
+                statistics.merge(segments[first])
+            elif not inside and first in segments:
+                statistics.merge(segments.pop(first), -1)
+        yield statistics
+
+
+def _init_worker(series: PriceSeries, lags: int, investing_amount: int, buy_period: int, sell_period: int, strategy: str):
+    _worker_state['series'] = series
+    _worker_state['lags'] = lags
+    _worker_state['backtest'] = (investing_amount, buy_period, sell_period, strategy)
+
+
+def _evaluate_fold(task):
+    index, (train_start, test_start, test_end), solution, train_metrics = task
+    series = _worker_state['series']
+    lags = _worker_state['lags']
+    investing_amount, buy_period, sell_period, strategy = _worker_state['backtest']
+    closes = series.close_price
+
+    # one step ahead predictions of the test rows from the closes before them
+    actual = closes[test_start:test_end]
+    previous = closes[test_start - 1:test_end - 1]
+    predicted = np.full(len(actual), solution[0])
+    for lag in range(lags):
+        predicted += solution[lag + 1] * closes[test_start - lags + lag:test_end - lags + lag]
+
+    errors = actual - predicted
+    total_variance = float(np.sum((actual - actual.mean()) ** 2))
+    squared_error = float(errors @ errors)
+
+    # the moving average strategy trades the test rows only, the rows before them warm its averages up
+    first = max(0, test_start - max(buy_period, sell_period))
+    backtest = run_backtest(slice_series(series, first, test_end), investing_amount, buy_period, sell_period, test_start - first, strategy)
+
+    # the model holds the stock over a day when it predicts a rise from the previous close
+    returns = actual / previous
+    held = predicted > previous
+    model_value = investing_amount * float(np.prod(np.where(held, returns, 1.0)))
+
+    return {
+        'fold': index,
+        'train_start': series.datetime_at(train_start).isoformat(),
+        'test_start': series.datetime_at(test_start).isoformat(),
+        'test_end': series.datetime_at(test_end - 1).isoformat(),
+        'train_rows': test_start - train_start,
+        'test_rows': test_end - test_start,
+        'train': train_metrics,
+        'test': {
+            'rmse': float(np.sqrt(squared_error / len(actual))),
+            'mae': float(np.mean(np.abs(errors))),
+            'r_squared': 1 - squared_error / total_variance if total_variance > 0 else None,
+            'direction_accuracy': float(np.mean((predicted > previous) == (actual > previous))),
+        },
+        'profit': {
+            strategy: float(backtest['profit']),
+            'model': round(model_value - investing_amount, 2),
+            'buy_and_hold': round(investing_amount * (float(actual[-1] / previous[0]) - 1), 2),
+        },
+    }
+
+
+def summarize_folds(results) -> dict:
+    if not results:
+        return {'folds': 0}
+
+    def mean(values):
+        values = [value for value in values if value is not None]
+        return float(np.mean(values)) if values else None
+
+    return {
+        'folds': len(results),
+        'test_rmse': mean(result['test']['rmse'] for result in results),
+        'test_mae': mean(result['test']['mae'] for result in results),
+        'test_r_squared': mean(result['test']['r_squared'] for result in results),
+        'direction_accuracy': mean(result['test']['direction_accuracy'] for result in results),
+        'profit': {
+            name: round(sum(result['profit'][name] for result in results), 2)
+            for name in results[0]['profit']
+        },
+    }
+
+
+def run_walk_forward(series: PriceSeries, investing_amount: int, buy_period: int, sell_period: int,
+                     train_size: int = DEFAULT_TRAIN_SIZE, test_size: int = DEFAULT_TEST_SIZE, expanding: bool = False,
+                     strategy: str = DEFAULT_STRATEGY, lags: int = LAGS, max_workers: int = None) -> dict:
+    """
+    Slides train and test windows over the series. In every fold the model is
+    solved from the statistics of the train window and predicts the test rows
+    one day ahead, and the strategy, the model and buying and holding trade
+    the test rows. Returns the error metrics and the profits of every fold and
+    their summary.
+
+    The folds are evaluated on a process pool when there are enough of them
+    and max_workers is not 1.
+    """
+    folds = make_folds(len(series), train_size, test_size, expanding, lags)
+    tasks = [
+        (index, fold, statistics.solve(), statistics.metrics())
+        for index, (fold, statistics) in enumerate(zip(folds, iter_train_statistics(series.close_price, folds, lags)))
+    ]
+    initargs = (series, lags, investing_amount, buy_period, sell_period, strategy)
+
+    if max_workers == 1 or len(tasks) < PARALLEL_THRESHOLD:
+        _init_worker(*initargs)
+        results = [_evaluate_fold(task) for task in tasks]
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            results = list(executor.map(_evaluate_fold, tasks))
+
+    logging.info(f"Evaluated {len(results)} walk forward folds over {len(series)} rows")
+    return {
+        'config': {
+            'train_size': train_size,
+            'test_size': test_size,
+            'expanding': expanding,
+            'investing_amount': investing_amount,
+            'buy_period': buy_period,
+            'sell_period': sell_period,
+            'strategy': strategy,
+        },
+        'summary': summarize_folds(results),
+        'folds': results,
+    }
+
+
+def walk_forward(symbol: str, investing_amount: int, buy_period: int, sell_period: int, **kwargs) -> dict:
+    """
+    Runs the walk forward evaluation over the whole history of the symbol
+    """
+    result = run_walk_forward(get_price_series(symbol), investing_amount, buy_period, sell_period, **kwargs)
+    result['symbol'] = symbol
+    return result
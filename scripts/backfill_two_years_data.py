@@ -1,110 +1,47 @@
 import os
-import pg8000
-import requests
+import sys
+import django
 import logging
+from datetime import datetime, timezone
 
-START_DATE = '2022-01-01'
-logging.basicConfig(level=logging.INFO)
-
-
-def get_stock_data():
-    logging.info("Fetching data from Alpha vantage api")
-
-    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-    url = 'https://www.alphavantage.co/query'
-
-    params = {
-        'function': 'TIME_SERIES_DAILY',
-        'symbol': 'AAPL',
-        'outputsize': 'full',
-        'apikey': api_key
-    }
-
-    response = requests.get(url, params=params)
-    logging.info(f"Alpha vantage api response status code: {response.status_code}")
-
-    if response.status_code == 200:
-        data = response.json()
-        return data
-
-    return None
-
+# the backfill shares the ingest pipeline of the django app, make it importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
 
-def get_db_connection():
-    logging.info("Establishing database connection")
+from django.conf import settings
+from myapp.ingest import ingest_stock_data, parse_daily_time_series
+from myapp.market_data import fetch_many
 
-    user = os.getenv('POSTGRES_USER')
-    password = os.getenv('POSTGRES_PASSWORD')
-    host = os.getenv('POSTGRES_HOST')
-    port = os.getenv('POSTGRES_PORT')
-    database = os.getenv('POSTGRES_DB')
-
-    logging.info(f"User: {user}, Password: {password}, Host: {host}, Port: {port}, Database: {database}")
-
-    connection = pg8000.connect(
-        user=os.getenv('POSTGRES_USER'),
-        password=os.getenv('POSTGRES_PASSWORD'),
-        host=os.getenv('POSTGRES_HOST'),
-        port=os.getenv('POSTGRES_PORT'),
-        database=os.getenv('POSTGRES_DB')
-    )
-
-    logging.info("Database connection established")
-    return connection
-
-
-def backfill_two_years_data():
-    # iterate over the data and insert it into the database
-    db_conn = get_db_connection()
-    cursor = db_conn.cursor()
-
-    try:
-        data = get_stock_data()
-
-        # if no data is returned, exit the function
-        if data is None:
-            return
-
-        # now we have the data, iterate over the data and insert it into the database
-        daily_data = data.get('Time Series (Daily)', {})
+START_DATE = '2022-01-01'
+logging.basicConfig(level=logging.INFO)
 
-        logging.info(f'Trying to insert all data {data}')
 
-        # filter all the data that is after the start date
-        data_since_start_date = {}
-        for date, values in daily_data.items():
-            if date >= START_DATE:
-                data_since_start_date[date] = values
+def backfill_two_years_data(symbols):
+    start_date = datetime.strptime(START_DATE, "%Y-%m-%d").replace(tzinfo=timezone.utc)
 
+    # fetch the full history of all the symbols concurrently, within the api rate limit
+    data_by_symbol = fetch_many({symbol: 'full' for symbol in symbols})
 
-        # prepare the insert query
-        insert_query = '''
-            INSERT INTO aapl_stock_data (time, open_price, close_price, high_price, low_price, volume)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        '''
+    for symbol, daily_data in data_by_symbol.items():
+        # if no data is returned, skip the symbol
+        if daily_data is None:
+            logging.error(f"No data returned for {symbol}")
+            continue
 
-        for date, values in data_since_start_date.items():
-            # extract the required fields
-            open_price = float(values.get('1. open', 0))
-            high_price = float(values.get('2. high', 0))
-            low_price = float(values.get('3. low', 0))
-            close_price = float(values.get('4. close', 0))
-            volume = int(values.get('5. volume', 0))
+        try:
+            logging.info(f'Received {len(daily_data)} days of data for {symbol}')
 
-            # insert the data into the table
-            cursor.execute(insert_query, (date, open_price,
-                        close_price, high_price, low_price, volume))
-            logging.info(f"Inserted data for date: {date}, open_price: {open_price}, close_price: {close_price}, high_price: {high_price}, low_price: {low_price}, volume: {volume}")
+            # keep all the days since the start date
+            rows = [row for row in parse_daily_time_series(daily_data) if row[0] >= start_date]
 
-        # Commit the transaction to save the data
-        db_conn.commit()
-    except Exception as e:
-        logging.error(f"Failed to insert data with error: {e}")
-    finally:
-        # Close the cursor and connection
-        cursor.close()
-        print("PostgreSQL connection closed.")
+            # write everything with the shared bulk upsert, re-running the backfill is safe
+            stats = ingest_stock_data(symbol, rows)
+            logging.info(f"Backfilled {stats['rows']} rows of {symbol} at {stats['rows_per_second']:.0f} rows/sec")
+        except Exception as e:
+            logging.error(f"Failed to insert data for {symbol} with error: {e}")
 
 
 if __name__ == '__main__':
-    backfill_two_years_data()
+    # the symbols can be given on the command line, by default all the tracked symbols are backfilled
+    backfill_two_years_data([symbol.upper() for symbol in sys.argv[1:]] or settings.STOCK_SYMBOLS)
@@ -1,5 +1,14 @@
 import pg8000
-import requests
+import os
+import sys
+import django
+
+# the market data client of the django app holds the api key, the rate limit and the cache
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from myapp.market_data import fetch_daily_time_series
 
 def connect_to_db():
     try:
@@ -26,23 +35,9 @@ def connect_to_db():
         print(f"Error: {e}")
 
 def import_daily_stock_data():
-    API_KEY = '4QWSOQKY36QC47K9'
-    url = 'https://www.alphavantage.co/query'
-
-    params = {
-        'function': 'TIME_SERIES_DAILY',
-        'symbol': 'AAPl',
-        'outputsize': 'compact',
-        'apikey': API_KEY
-    }
-
-    response = requests.get(url, params=params)
-
-    if response.status_code == 200:
-        data = response.json()
-
-        time_series = data.get("Time Series (Daily)", {})
+    time_series = fetch_daily_time_series('AAPL', 'compact')
 
+    if time_series:
         # extract the current date's data
         date = next(iter(time_series))
         first_entry_data = time_series[date]
@@ -1,26 +1,22 @@
-import requests
 import pandas as pd
 import pg8000
 from datetime import datetime, timedelta
+import os
+import sys
+import django
 
-def import_data():
-    API_KEY = '4QWSOQKY36QC47K9'
-    url = 'https://www.alphavantage.co/query'
+# the market data client of the django app holds the api key, the rate limit and the cache
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
 
-    params = {
-        'function': 'TIME_SERIES_DAILY',
-        'symbol': 'AAPl',
-        'outputsize': 'full',
-        'apikey': API_KEY
-    }
+from myapp.market_data import fetch_daily_time_series
 
-    response = requests.get(url, params=params)
+def import_data():
+    time_series = fetch_daily_time_series('AAPL', 'full')
 
-    if response.status_code == 200:
+    if time_series:
         create_table()
-        data = response.json()
-
-        time_series = data.get('Time Series (Daily)', {})
         df = pd.DataFrame.from_dict(time_series, orient='index')
             
 